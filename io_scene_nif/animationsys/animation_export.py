@@ -40,9 +40,12 @@
 import bpy
 import mathutils
 
+import numpy as np
+
 from pyffi.formats.nif import NifFormat
 
 from io_scene_nif.utility import nif_utils
+from io_scene_nif.utility import anim_utils
 
 class AnimationHelper():
     
@@ -53,6 +56,9 @@ class AnimationHelper():
         self.object_animation = ObjectAnimation(parent)
         self.material_animation = MaterialAnimation(parent)
         self.texture_animation = TextureAnimation(parent)
+        # number of keys before and after key reduction, and largest
+        # error, by track and channel
+        self.key_reduction_stats = {}
     
     # Export the animation of blender Ipo as keyframe controller and
     # keyframe data. Extra quaternion is multiplied prior to keyframe
@@ -99,17 +105,89 @@ class AnimationHelper():
     # so having inverse(X) around saves on calculations
     
     def get_flags_from_extend(self, extend):
-        if extend == bpy.types.IpoCurve.ExtendTypes.CONST:
+        if extend == 'CONSTANT':
             return 4 # 0b100
-        elif extend == bpy.types.IpoCurve.ExtendTypes.CYCLIC:
+        elif extend == 'CYCLIC':
             return 0
 
         self.nif_export.warning(
             "Unsupported extend type in blend, using clamped.")
         return 4
     
-    def export_keyframes(self, ipo, space, parent_block, bind_matrix = None,
-                     extra_mat_inv = None):
+    #: Transform channels of objects and pose bones, with their number
+    #: of components.
+    KEYFRAME_CHANNELS = {"location": 3,
+                         "rotation_quaternion": 4,
+                         "rotation_euler": 3,
+                         "scale": 3}
+
+    def get_keyframe_fcurves(self, b_action, bone_name=None):
+        """Return the transform F-curves of an object, or of one of its
+        pose bones.
+
+        :param b_action: The action of the object.
+        :param bone_name: The name of the pose bone, or ``None`` for the
+            object itself.
+        :return: Dictionary mapping channel names, such as
+            ``"location"``, to their F-curves in component order.
+        """
+        if bone_name is None:
+            prefix = ""
+        else:
+            prefix = 'pose.bones["%s"].' % bone_name
+        channels = {}
+        for fcurve in b_action.fcurves:
+            if not fcurve.data_path.startswith(prefix):
+                continue
+            channel = fcurve.data_path[len(prefix):]
+            if channel in self.KEYFRAME_CHANNELS:
+                channels.setdefault(channel, {})[fcurve.array_index] = fcurve
+        # check that if any curve is defined in a channel
+        # then all curves are defined in the channel
+        for channel, fcurves in channels.items():
+            num_components = self.KEYFRAME_CHANNELS[channel]
+            if sorted(fcurves) != list(range(num_components)):
+                keytype = {"location": "LOC",
+                           "rotation_quaternion": "ROT",
+                           "rotation_euler": "ROT",
+                           "scale": "SCALE"}
+                raise nif_utils.NifError(
+                    "missing curves in %s; insert %s key at frame 1"
+                    " and try again"
+                    % (b_action.name, keytype[channel]))
+            channels[channel] = [fcurves[index]
+                                 for index in range(num_components)]
+        return channels
+
+    def reduce_keys(self, track_name, channel, frames, values, tolerance,
+                    rotation=False):
+        """Find the keys of a channel that interpolation reproduces
+        within tolerance, if key reduction is enabled, and report the
+        result.
+
+        :param track_name: Name of the bone, object or material.
+        :param channel: Name of the channel, for instance ``"rotation"``.
+        :param frames: Sorted unique key frames, of shape (n,).
+        :param values: The key values, of shape (n,) or (n, k).
+        :param tolerance: The largest allowed error.
+        :param rotation: Whether the values are quaternions, which are
+            interpolated spherically.
+        :return: The mask of the keys to keep.
+        """
+        if not self.properties.reduce_keys or len(frames) <= 2:
+            return np.ones(len(frames), dtype=bool)
+        keep, error = anim_utils.reduce_keys(
+            frames, values, tolerance, rotation=rotation)
+        num_kept = int(np.count_nonzero(keep))
+        self.key_reduction_stats.setdefault(track_name, {})[channel] = (
+            len(frames), num_kept, error)
+        self.nif_export.info(
+            "Reduced %s keys of %s from %i to %i, largest error %g"
+            % (channel, track_name, len(frames), num_kept, error))
+        return keep
+
+    def export_keyframes(self, b_action, space, parent_block, bind_matrix = None,
+                     extra_mat_inv = None, bone_name = None):
     
     
         if self.properties.animation == 'GEOM_NIF' and self.nif_export.version < 0x0A020000:
@@ -127,10 +205,10 @@ class AnimationHelper():
         # add a keyframecontroller block, and refer to this block in the
         # parent's time controller
         if self.nif_export.version < 0x0A020000:
-            kfc = self.nif_export.objecthelper.create_block("NiKeyframeController", ipo)
+            kfc = self.nif_export.objecthelper.create_block("NiKeyframeController", b_action)
         else:
-            kfc = self.nif_export.objecthelper.create_block("NiTransformController", ipo)
-            kfi = self.nif_export.objecthelper.create_block("NiTransformInterpolator", ipo)
+            kfc = self.nif_export.objecthelper.create_block("NiTransformController", b_action)
+            kfi = self.nif_export.objecthelper.create_block("NiTransformInterpolator", b_action)
             # link interpolator from the controller
             kfc.interpolator = kfi
             # set interpolator default data
@@ -146,44 +224,50 @@ class AnimationHelper():
             kfi.scale = scale
     
         parent_block.add_controller(kfc)
+
+        # sometimes we need to export an empty keyframe... this will take care of that
+        if b_action:
+            channels = self.get_keyframe_fcurves(b_action, bone_name)
+        else:
+            channels = {}
+        fcurves = [fcurve for channel_fcurves in channels.values()
+                   for fcurve in channel_fcurves]
     
         # determine cycle mode for this controller
-        # this is stored in the blender ipo curves
+        # this is stored in the blender F-curves
         # while we're at it, we also determine the
         # start and stop frames
-        extend = None
-        if ipo:
-            start_frame = +1000000
-            stop_frame = -1000000
-            for curve in ipo:
+        if fcurves:
+            extend = None
+            for fcurve in fcurves:
                 # get cycle mode
+                fcurve_extend = anim_utils.get_fcurve_extend(fcurve)
                 if extend is None:
-                    extend = curve.extend
-                elif extend != curve.extend:
+                    extend = fcurve_extend
+                elif extend != fcurve_extend:
                     self.nif_export.warning(
                         "Inconsistent extend type in %s, will use %s."
-                        % (ipo, extend))
-                # get start and stop frames
-                start_frame = min(
-                    start_frame,
-                    min(btriple.pt[0] for btriple in curve.bezierPoints))
-                stop_frame = max(
-                    stop_frame,
-                    max(btriple.pt[0] for btriple in curve.bezierPoints))
+                        % (b_action.name, extend))
+            # get start and stop frames
+            key_frames = anim_utils.get_fcurve_frames(fcurves)
+            start_frame = key_frames[0]
+            stop_frame = key_frames[-1]
         else:
-            # dummy ipo
+            # dummy animation
             # default extend, start, and end
-            extend = bpy.IpoCurve.ExtendTypes.CYCLIC
+            extend = 'CYCLIC'
+            key_frames = np.empty(0)
             start_frame = self.context.scene.frame_start
             stop_frame = self.context.scene.frame_end
     
         # fill in the non-trivial values
+        fps = self.context.scene.render.fps
         kfc.flags = 8 # active
         kfc.flags |= self.get_flags_from_extend(extend)
         kfc.frequency = 1.0
         kfc.phase = 0.0
-        kfc.start_time = (start_frame - 1) * self.context.scene.render.fps
-        kfc.stop_time = (stop_frame - 1) * self.context.scene.render.fps
+        kfc.start_time, kfc.stop_time = anim_utils.get_times(
+            [start_frame, stop_frame], fps).tolist()
     
         if self.properties.animation == 'GEOM_NIF':
             # keyframe data is not present in geometry files
@@ -192,166 +276,115 @@ class AnimationHelper():
         # -> get keyframe information
     
         # some calculations
-        if bind_matrix:
+        if bind_matrix is not None:
             bind_scale, bind_rot, bind_trans = nif_utils.decompose_srt(bind_matrix)
-            bind_quat = bind_rot.toQuat()
+            bind_quat = bind_rot.to_quaternion()
         else:
             bind_scale = 1.0
-            bind_rot = mathutils.Matrix([[1,0,0],[0,1,0],[0,0,1]])
-            bind_quat = mathutils.Quaternion(1,0,0,0)
+            bind_rot = mathutils.Matrix.Identity(3)
+            bind_quat = mathutils.Quaternion((1, 0, 0, 0))
             bind_trans = mathutils.Vector()
-        if extra_mat_inv:
+        if extra_mat_inv is not None:
             extra_scale_inv, extra_rot_inv, extra_trans_inv = \
                 nif_utils.decompose_srt(extra_mat_inv)
-            extra_quat_inv = extra_rot_inv.toQuat()
+            extra_quat_inv = extra_rot_inv.to_quaternion()
         else:
             extra_scale_inv = 1.0
-            extra_rot_inv = mathutils.Matrix([[1,0,0],[0,1,0],[0,0,1]])
-            extra_quat_inv = mathutils.Quaternion(1,0,0,0)
+            extra_rot_inv = mathutils.Matrix.Identity(3)
+            extra_quat_inv = mathutils.Quaternion((1, 0, 0, 0))
             extra_trans_inv = mathutils.Vector()
-    
-        # sometimes we need to export an empty keyframe... this will take care of that
-        if (ipo == None):
-            scale_curve = {}
-            rot_curve = {}
-            trans_curve = {}
-        # the usual case comes now...
+
+        # sample all channels once, at every key frame of the animation
+        # and then pick the frames at which each channel has keys
+        frames = key_frames[(key_frames >= self.context.scene.frame_start)
+                            & (key_frames <= self.context.scene.frame_end)]
+        channel_samples = dict(
+            (channel, anim_utils.sample_fcurves(channel_fcurves, frames))
+            for channel, channel_fcurves in channels.items())
+        channel_masks = dict(
+            (channel, np.in1d(
+                frames, anim_utils.get_fcurve_frames(channel_fcurves)))
+            for channel, channel_fcurves in channels.items())
+        no_keys = np.zeros(len(frames), dtype=bool)
+
+        # SC', supporting only uniform scaling... take the mean
+        if "scale" in channels:
+            scale_c = channel_samples["scale"].mean(axis=1)
+            scale_mask = channel_masks["scale"]
         else:
-            # merge the animation curves into a rotation vector and translation vector curve
-            scale_curve = {}
-            rot_curve = {}
-            trans_curve = {}
-            # the following code makes these assumptions
-            assert(Ipo.PO_SCALEX == Ipo.OB_SCALEX)
-            assert(Ipo.PO_LOCX == Ipo.OB_LOCX)
-            # check validity of curves
-            for curvecollection in (
-                (Ipo.PO_SCALEX, Ipo.PO_SCALEY, Ipo.PO_SCALEZ),
-                (Ipo.PO_LOCX, Ipo.PO_LOCY, Ipo.PO_LOCZ),
-                (Ipo.PO_QUATX, Ipo.PO_QUATY, Ipo.PO_QUATZ, Ipo.PO_QUATW),
-                (Ipo.OB_ROTX, Ipo.OB_ROTY, Ipo.OB_ROTZ)):
-                # skip invalid curves
-                try:
-                    ipo[curvecollection[0]]
-                except KeyError:
-                    continue
-                # check that if any curve is defined in the collection
-                # then all curves are defined in the collection
-                if (any(ipo[curve] for curve in curvecollection)
-                    and not all(ipo[curve] for curve in curvecollection)):
-                    keytype = {Ipo.PO_SCALEX: "SCALE",
-                               Ipo.PO_LOCX: "LOC",
-                               Ipo.PO_QUATX: "ROT",
-                               Ipo.OB_ROTX: "ROT"}
-                    raise nif_utils.NifError(
-                        "missing curves in %s; insert %s key at frame 1"
-                        " and try again"
-                        % (ipo, keytype[curvecollection[0]]))
-            # go over all curves
-            ipo_curves = list(ipo.curveConsts.values())
-            for curve in ipo_curves:
-                # skip empty curves
-                if ipo[curve] is None:
-                    continue
-                # non-empty curve: go over all frames of the curve
-                for btriple in ipo[curve].bezierPoints:
-                    frame = btriple.pt[0]
-                    if (frame < self.context.scene.frame_start) or (frame > self.context.scene.frame_end):
-                        continue
-                    # PO_SCALEX == OB_SCALEX, so this does both pose and object
-                    # scale
-                    if curve in (Ipo.PO_SCALEX, Ipo.PO_SCALEY, Ipo.PO_SCALEZ):
-                        # support only uniform scaling... take the mean
-                        scale_curve[frame] = (ipo[Ipo.PO_SCALEX][frame]
-                                              + ipo[Ipo.PO_SCALEY][frame]
-                                              + ipo[Ipo.PO_SCALEZ][frame]) / 3.0
-                        # SC' * SB' / SX
-                        scale_curve[frame] = \
-                            scale_curve[frame] * bind_scale * extra_scale_inv
-                    # object rotation
-                    elif curve in (Ipo.OB_ROTX, Ipo.OB_ROTY, Ipo.OB_ROTZ):
-                        rot_curve[frame] = mathutils.Euler(
-                            [10 * ipo[Ipo.OB_ROTX][frame],
-                             10 * ipo[Ipo.OB_ROTY][frame],
-                             10 * ipo[Ipo.OB_ROTZ][frame]])
-                        # use quat if we have bind matrix and/or extra matrix
-                        # XXX maybe we should just stick with eulers??
-                        if bind_matrix or extra_mat_inv:
-                            rot_curve[frame] = rot_curve[frame].toQuat()
-                            # beware, CrossQuats takes arguments in a counter-intuitive order:
-                            # q1.to_matrix() * q2.to_matrix() == CrossQuats(q2, q1).to_matrix()
-                            rot_curve[frame] = mathutils.CrossQuats(mathutils.CrossQuats(bind_quat, rot_curve[frame]), extra_quat_inv) # inverse(RX) * RC' * RB'
-                    # pose rotation
-                    elif curve in (Ipo.PO_QUATX, Ipo.PO_QUATY,
-                                   Ipo.PO_QUATZ, Ipo.PO_QUATW):
-                        rot_curve[frame] = mathutils.Quaternion()
-                        rot_curve[frame].x = ipo[Ipo.PO_QUATX][frame]
-                        rot_curve[frame].y = ipo[Ipo.PO_QUATY][frame]
-                        rot_curve[frame].z = ipo[Ipo.PO_QUATZ][frame]
-                        rot_curve[frame].w = ipo[Ipo.PO_QUATW][frame]
-                        # beware, CrossQuats takes arguments in a counter-intuitive order:
-                        # q1.to_matrix() * q2.to_matrix() == CrossQuats(q2, q1).to_matrix()
-                        rot_curve[frame] = mathutils.CrossQuats(mathutils.CrossQuats(bind_quat, rot_curve[frame]), extra_quat_inv) # inverse(RX) * RC' * RB'
-                    # PO_LOCX == OB_LOCX, so this does both pose and object
-                    # location
-                    elif curve in (Ipo.PO_LOCX, Ipo.PO_LOCY, Ipo.PO_LOCZ):
-                        trans_curve[frame] = mathutils.Vector(
-                            [ipo[Ipo.PO_LOCX][frame],
-                             ipo[Ipo.PO_LOCY][frame],
-                             ipo[Ipo.PO_LOCZ][frame]])
-                        # T = - TX * inverse(RX) * RC' * RB' * SC' * SB' / SX + TC' * SB' * RB' + TB'
-                        trans_curve[frame] *= bind_scale
-                        trans_curve[frame] *= bind_rot
-                        trans_curve[frame] += bind_trans
-                        # we need RC' and SC'
-                        if Ipo.OB_ROTX in ipo_curves and ipo[Ipo.OB_ROTX]:
-                            rot_c = mathutils.Euler(
-                                [10 * ipo[Ipo.OB_ROTX][frame],
-                                 10 * ipo[Ipo.OB_ROTY][frame],
-                                 10 * ipo[Ipo.OB_ROTZ][frame]]).to_matrix()
-                        elif Ipo.PO_QUATX in ipo_curves and ipo[Ipo.PO_QUATX]:
-                            rot_c = mathutils.Quaternion()
-                            rot_c.x = ipo[Ipo.PO_QUATX][frame]
-                            rot_c.y = ipo[Ipo.PO_QUATY][frame]
-                            rot_c.z = ipo[Ipo.PO_QUATZ][frame]
-                            rot_c.w = ipo[Ipo.PO_QUATW][frame]
-                            rot_c = rot_c.to_matrix()
-                        else:
-                            rot_c = mathutils.Matrix([[1,0,0],[0,1,0],[0,0,1]])
-                        # note, PO_SCALEX == OB_SCALEX, so this does both
-                        if ipo[Ipo.PO_SCALEX]:
-                            # support only uniform scaling... take the mean
-                            scale_c = (ipo[Ipo.PO_SCALEX][frame]
-                                       + ipo[Ipo.PO_SCALEY][frame]
-                                       + ipo[Ipo.PO_SCALEZ][frame]) / 3.0
-                        else:
-                            scale_c = 1.0
-                        trans_curve[frame] += \
-                            extra_trans_inv * rot_c * bind_rot * \
-                            scale_c * bind_scale
-    
+            scale_c = np.ones(len(frames))
+            scale_mask = no_keys
+        # RC', pose rotation or object rotation
+        rot_channel = None
+        if "rotation_quaternion" in channels:
+            rot_channel = "rotation_quaternion"
+            quat_c = channel_samples[rot_channel]
+        elif "rotation_euler" in channels:
+            rot_channel = "rotation_euler"
+            quat_c = anim_utils.euler_to_quat(channel_samples[rot_channel])
+        else:
+            quat_c = np.tile([1.0, 0.0, 0.0, 0.0], (len(frames), 1))
+        rot_mask = channel_masks[rot_channel] if rot_channel else no_keys
+        # use quat if we have bind matrix and/or extra matrix
+        # XXX maybe we should just stick with eulers??
+        use_eulers = (rot_channel == "rotation_euler"
+                      and bind_matrix is None and extra_mat_inv is None)
+        # TC'
+        if "location" in channels:
+            trans_c = channel_samples["location"]
+            trans_mask = channel_masks["location"]
+        else:
+            trans_c = np.zeros((len(frames), 3))
+            trans_mask = no_keys
+
+        # S = SC' * SB' / SX
+        scales = scale_c * bind_scale * extra_scale_inv
+        # R = inverse(RX) * RC' * RB'
+        quats = anim_utils.quat_multiply(
+            extra_quat_inv, anim_utils.quat_multiply(quat_c, bind_quat))
+        # vectors are rows, as in vector * matrix
+        # T = - TX * inverse(RX) * RC' * RB' * SC' * SB' / SX + TC' * SB' * RB' + TB'
+        n_bind_rot = np.array(bind_rot)
+        translations = (np.dot(trans_c, n_bind_rot) * bind_scale
+                        + np.array(bind_trans))
+        translations += (
+            np.dot(np.einsum('j,njk->nk', np.array(extra_trans_inv),
+                             anim_utils.quat_to_matrix(quat_c)),
+                   n_bind_rot)
+            * (scale_c * bind_scale)[:, np.newaxis])
+
+        # drop the keys that interpolation reproduces
+        if bone_name is not None:
+            track_name = bone_name
+        else:
+            track_name = parent_block.name.decode()
+        for mask, values, tolerance, rotation, channel in (
+            (rot_mask, channel_samples[rot_channel] if use_eulers else quats,
+             self.properties.reduce_keys_rotation, not use_eulers,
+             "rotation"),
+            (trans_mask, translations,
+             self.properties.reduce_keys_translation, False, "translation"),
+            (scale_mask, scales,
+             self.properties.reduce_keys_scale, False, "scale")):
+            mask[mask] = self.reduce_keys(
+                track_name, channel, frames[mask], values[mask],
+                tolerance, rotation=rotation)
+
         # -> now comes the real export
-    
-        if (max(len(rot_curve), len(trans_curve), len(scale_curve)) <= 1
+
+        if (max(np.count_nonzero(rot_mask), np.count_nonzero(trans_mask),
+                np.count_nonzero(scale_mask)) <= 1
             and self.nif_export.version >= 0x0A020000):
             # only add data if number of keys is > 1
             # (see importer comments with import_kf_root: a single frame
             # keyframe denotes an interpolator without further data)
             # insufficient keys, so set the data and we're done!
-            if trans_curve:
-                trans = list(trans_curve.values())[0]
-                kfi.translation.x = trans[0]
-                kfi.translation.y = trans[1]
-                kfi.translation.z = trans[2]
-            if rot_curve:
-                rot = list(rot_curve.values())[0]
-                # XXX blender weirdness... Euler() is a function!!
-                if isinstance(rot, mathutils.Euler().__class__):
-                    rot = rot.toQuat()
-                kfi.rotation.x = rot.x
-                kfi.rotation.y = rot.y
-                kfi.rotation.z = rot.z
-                kfi.rotation.w = rot.w
+            if trans_mask.any():
+                kfi.translation.x, kfi.translation.y, kfi.translation.z = \
+                    translations[trans_mask][0].tolist()
+            if rot_mask.any():
+                (kfi.rotation.w, kfi.rotation.x,
+                 kfi.rotation.y, kfi.rotation.z) = quats[rot_mask][0].tolist()
             # ignore scale for now...
             kfi.scale = 1.0
             # done!
@@ -359,78 +392,57 @@ class AnimationHelper():
     
         # add the keyframe data
         if self.nif_export.version < 0x0A020000:
-            kfd = self.nif_export.objecthelper.create_block("NiKeyframeData", ipo)
+            kfd = self.nif_export.objecthelper.create_block("NiKeyframeData", b_action)
             kfc.data = kfd
         else:
             # number of frames is > 1, so add transform data
-            kfd = self.nif_export.objecthelper.create_block("NiTransformData", ipo)
+            kfd = self.nif_export.objecthelper.create_block("NiTransformData", b_action)
             kfi.data = kfd
-    
-        frames = list(rot_curve.keys())
-        frames.sort()
-        # XXX blender weirdness... Euler() is a function!!
-        if (frames
-            and isinstance(list(rot_curve.values())[0],
-                           mathutils.Euler().__class__)):
+
+        times = anim_utils.get_times(frames, fps)
+        rot_times = times[rot_mask].tolist()
+        if use_eulers:
             # eulers
+            eulers = channel_samples[rot_channel][rot_mask]
             kfd.rotation_type = NifFormat.KeyType.XYZ_ROTATION_KEY
             kfd.num_rotation_keys = 1 # *NOT* len(frames) this crashes the engine!
-            kfd.xyz_rotations[0].num_keys = len(frames)
-            kfd.xyz_rotations[1].num_keys = len(frames)
-            kfd.xyz_rotations[2].num_keys = len(frames)
-            # XXX todo: quadratic interpolation?
-            kfd.xyz_rotations[0].interpolation = NifFormat.KeyType.LINEAR_KEY
-            kfd.xyz_rotations[1].interpolation = NifFormat.KeyType.LINEAR_KEY
-            kfd.xyz_rotations[2].interpolation = NifFormat.KeyType.LINEAR_KEY
-            kfd.xyz_rotations[0].keys.update_size()
-            kfd.xyz_rotations[1].keys.update_size()
-            kfd.xyz_rotations[2].keys.update_size()
-            for i, frame in enumerate(frames):
-                # XXX todo: speed up by not recalculating stuff
-                rot_frame_x = kfd.xyz_rotations[0].keys[i]
-                rot_frame_y = kfd.xyz_rotations[1].keys[i]
-                rot_frame_z = kfd.xyz_rotations[2].keys[i]
-                rot_frame_x.time = (frame - 1) * self.context.scene.render.fps
-                rot_frame_y.time = (frame - 1) * self.context.scene.render.fps
-                rot_frame_z.time = (frame - 1) * self.context.scene.render.fps
-                rot_frame_x.value = rot_curve[frame].x * 3.14159265358979323846 / 180.0
-                rot_frame_y.value = rot_curve[frame].y * 3.14159265358979323846 / 180.0
-                rot_frame_z.value = rot_curve[frame].z * 3.14159265358979323846 / 180.0
+            for xyz_rotation, values in zip(kfd.xyz_rotations, eulers.T):
+                xyz_rotation.num_keys = len(rot_times)
+                # XXX todo: quadratic interpolation?
+                xyz_rotation.interpolation = NifFormat.KeyType.LINEAR_KEY
+                xyz_rotation.keys.update_size()
+                for key, time, value in zip(xyz_rotation.keys, rot_times,
+                                            values.tolist()):
+                    key.time = time
+                    key.value = value
         else:
             # quaternions
             # XXX todo: quadratic interpolation?
             kfd.rotation_type = NifFormat.KeyType.LINEAR_KEY
-            kfd.num_rotation_keys = len(frames)
+            kfd.num_rotation_keys = len(rot_times)
             kfd.quaternion_keys.update_size()
-            for i, frame in enumerate(frames):
-                rot_frame = kfd.quaternion_keys[i]
-                rot_frame.time = (frame - 1) * self.context.scene.render.fps
-                rot_frame.value.w = rot_curve[frame].w
-                rot_frame.value.x = rot_curve[frame].x
-                rot_frame.value.y = rot_curve[frame].y
-                rot_frame.value.z = rot_curve[frame].z
-    
-        frames = list(trans_curve.keys())
-        frames.sort()
+            for key, time, quat in zip(kfd.quaternion_keys, rot_times,
+                                       quats[rot_mask].tolist()):
+                key.time = time
+                key.value.w, key.value.x, key.value.y, key.value.z = quat
+
+        trans_times = times[trans_mask].tolist()
         kfd.translations.interpolation = NifFormat.KeyType.LINEAR_KEY
-        kfd.translations.num_keys = len(frames)
+        kfd.translations.num_keys = len(trans_times)
         kfd.translations.keys.update_size()
-        for i, frame in enumerate(frames):
-            trans_frame = kfd.translations.keys[i]
-            trans_frame.time = (frame - 1) * self.context.scene.render.fps
-            trans_frame.value.x = trans_curve[frame][0]
-            trans_frame.value.y = trans_curve[frame][1]
-            trans_frame.value.z = trans_curve[frame][2]
-    
-        frames = list(scale_curve.keys())
-        frames.sort()
+        for key, time, trans in zip(kfd.translations.keys, trans_times,
+                                    translations[trans_mask].tolist()):
+            key.time = time
+            key.value.x, key.value.y, key.value.z = trans
+
+        scale_times = times[scale_mask].tolist()
         kfd.scales.interpolation = NifFormat.KeyType.LINEAR_KEY
-        kfd.scales.num_keys = len(frames)
+        kfd.scales.num_keys = len(scale_times)
         kfd.scales.keys.update_size()
-        for i, frame in enumerate(frames):
-            scale_frame = kfd.scales.keys[i]
-            scale_frame.time = (frame - 1) * self.context.scene.render.fps
-            scale_frame.value = scale_curve[frame]
+        for key, time, scale in zip(kfd.scales.keys, scale_times,
+                                    scales[scale_mask].tolist()):
+            key.time = time
+            key.value = scale
             
 
     def export_anim_groups(self, animtxt, block_parent):
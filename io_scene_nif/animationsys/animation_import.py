@@ -37,9 +37,15 @@
 #
 # ***** END LICENSE BLOCK *****
 import bpy
+import mathutils
+
+import numpy as np
+
 from pyffi.formats.nif import NifFormat
 
 from io_scene_nif.utility import nif_utils
+from io_scene_nif.utility import anim_utils
+from io_scene_nif.utility import mesh_utils
 
 class AnimationHelper():
     
@@ -48,6 +54,9 @@ class AnimationHelper():
         self.object_animation = ObjectAnimation(parent)
         self.material_animation = MaterialAnimation(parent)
         self.armature_animation = ArmatureAnimation(parent)
+        self.morph_animation = MorphAnimation(parent)
+        # residuals of the frame rates tested by get_frames_per_second
+        self.fps_diagnostics = {}
     
 
     def import_kf_root(self, kf_root, root):
@@ -71,7 +80,8 @@ class AnimationHelper():
             # get the name
             nodename = controlledblock.get_node_name()
             # match from nif tree?
-            node = root.find(block_name = nodename)
+            node = nif_utils.find_indexed_block(
+                self.nif_import.dict_named_blocks, nodename)
             if not node:
                 self.info(
                     "Animation for %s but no such node found in nif tree"
@@ -174,43 +184,42 @@ class AnimationHelper():
             self.nif_import.context.scene.getRenderingContext().endFrame(frame)
 
     def get_frames_per_second(self, roots):
-        """Scan all blocks and return a reasonable number for FPS."""
-        # find all key times
+        """Scan all blocks and return a reasonable number for FPS. The
+        residuals of every tested frame rate are kept in
+        fps_diagnostics."""
+        # find all key times, as arrays
         key_times = []
         for root in roots:
             for kfd in root.tree(block_type=NifFormat.NiKeyframeData):
-                key_times.extend(key.time for key in kfd.translations.keys)
-                key_times.extend(key.time for key in kfd.scales.keys)
-                key_times.extend(key.time for key in kfd.quaternion_keys)
-                key_times.extend(key.time for key in kfd.xyz_rotations[0].keys)
-                key_times.extend(key.time for key in kfd.xyz_rotations[1].keys)
-                key_times.extend(key.time for key in kfd.xyz_rotations[2].keys)
+                key_times.append(anim_utils.get_key_times(kfd.translations.keys))
+                key_times.append(anim_utils.get_key_times(kfd.scales.keys))
+                key_times.append(anim_utils.get_key_times(kfd.quaternion_keys))
+                for xyz_rotation in kfd.xyz_rotations:
+                    key_times.append(anim_utils.get_key_times(xyz_rotation.keys))
             for kfi in root.tree(block_type=NifFormat.NiBSplineInterpolator):
                 if not kfi.basis_data:
                     # skip bsplines without basis data (eg bowidle.kf in
                     # Oblivion)
                     continue
-                key_times.extend(
-                    point * (kfi.stop_time - kfi.start_time)
-                    / (kfi.basis_data.num_control_points - 2)
-                    for point in range(kfi.basis_data.num_control_points - 2))
+                key_times.append(
+                    np.arange(kfi.basis_data.num_control_points - 2,
+                              dtype=np.float32)
+                    * (kfi.stop_time - kfi.start_time)
+                    / (kfi.basis_data.num_control_points - 2))
             for uvdata in root.tree(block_type=NifFormat.NiUVData):
                 for uvgroup in uvdata.uv_groups:
-                    key_times.extend(key.time for key in uvgroup.keys)
+                    key_times.append(anim_utils.get_key_times(uvgroup.keys))
+        self.fps_diagnostics = {}
         # not animated, return a reasonable default
-        if not key_times:
+        if not any(times.size for times in key_times):
             return 30
         # calculate FPS
-        fps = 30
-        lowest_diff = sum(abs(int(time * fps + 0.5) - (time * fps))
-                          for time in key_times)
-        # for fps in range(1,120): #disabled, used for testing
-        for test_fps in [20, 25, 35]:
-            diff = sum(abs(int(time * test_fps + 0.5)-(time * test_fps))
-                       for time in key_times)
-            if diff < lowest_diff:
-                lowest_diff = diff
-                fps = test_fps
+        fps, self.fps_diagnostics = anim_utils.estimate_fps(
+            np.concatenate(key_times))
+        for test_fps, (total, largest) in sorted(self.fps_diagnostics.items()):
+            self.nif_import.debug(
+                "%i frames per second: total residual %f, largest %f frames"
+                % (test_fps, total, largest))
         self.nif_import.info("Animation estimated at %i frames per second." % fps)
         return fps
 
@@ -467,10 +476,10 @@ class ArmatureAnimation():
         
     def import_armature_animation(self, b_armature):
         # create an action
-        action = bpy.data.actions.new(b_armature.name)
-        bpy.types.NlaTrack.select = b_armature #action.setActive(b_armature)
+        b_action = bpy.data.actions.new(b_armature.name)
+        b_armature.animation_data_create()
+        b_armature.animation_data.action = b_action
         # go through all armature pose bones
-        # see http://www.elysiun.com/forum/viewtopic.php?t=58693
         self.nif_import.info('Importing Animations')
         for bone_name, b_posebone in b_armature.pose.bones.items():
             # denote progress
@@ -491,7 +500,7 @@ class ArmatureAnimation():
             # Rchannel = Rtotal * inverse(Rbind)
             # Tchannel = (Ttotal - Tbind) * inverse(Rbind) / Sbind
             bone_bm = nif_utils.import_matrix(niBone) # base pose
-            niBone_bind_scale, niBone_bind_rot, niBone_bind_trans = self.decompose_srt(bone_bm)
+            niBone_bind_scale, niBone_bind_rot, niBone_bind_trans = nif_utils.decompose_srt(bone_bm)
             niBone_bind_rot_inv = mathutils.Matrix(niBone_bind_rot)
             niBone_bind_rot_inv.invert()
             niBone_bind_quat_inv = niBone_bind_rot_inv.to_quaternion()
@@ -516,7 +525,7 @@ class ArmatureAnimation():
             # SC' = SX * SC / SX = SC
             # RC' = RX * RC * inverse(RX)
             # TC' = (TX * SC * RC + TC - TX) * inverse(RX) / SX
-            extra_matrix_scale, extra_matrix_rot, extra_matrix_trans = self.decompose_srt(self.nif_import.dict_bones_extra_matrix[niBone])
+            extra_matrix_scale, extra_matrix_rot, extra_matrix_trans = nif_utils.decompose_srt(self.nif_import.dict_bones_extra_matrix[niBone])
             extra_matrix_quat = extra_matrix_rot.to_quaternion()
             extra_matrix_rot_inv = mathutils.Matrix(extra_matrix_rot)
             extra_matrix_rot_inv.invert()
@@ -541,121 +550,39 @@ class ArmatureAnimation():
                 # for now, in this case, ignore interpolator
                 kfi = None
 
+            # collect the keys of every channel, as (frames, values)
+            # with the values still in nif space
+            scale_keys = rot_keys = trans_keys = None
+            scale_ipol = rot_ipol = trans_ipol = 'BEZIER'
+
             # B-spline curve import
             if isinstance(kfi, NifFormat.NiBSplineInterpolator):
-                times = list(kfi.get_times())
+                frames = anim_utils.get_frames(list(kfi.get_times()),
+                                               self.nif_import.fps)
                 translations = list(kfi.get_translations())
-                scales = list(kfi.get_scales())
                 rotations = list(kfi.get_rotations())
-
-                # if we have translation keys, we make a dictionary of
-                # rot_keys and scale_keys, this makes the script work MUCH
-                # faster in most cases
-                if translations:
-                    scale_keys_dict = {}
-                    rot_keys_dict = {}
-
                 # scales: ignore for now, implement later
                 #         should come here
-                scales = None
-
-                # rotations
                 if rotations:
                     self.nif_import.debug(
                         'Rotation keys...(bspline quaternions)')
-                    for time, quat in zip(times, rotations):
-                        frame = 1 + int(time * self.nif_import.fps + 0.5)
-                        quat = mathutils.Quaternion(
-                            [quat[0], quat[1], quat[2], quat[3]])
-                        # beware, CrossQuats takes arguments in a
-                        # counter-intuitive order:
-                        # q1.to_matrix() * q2.to_matrix() == CrossQuats(q2, q1).to_matrix()
-                        quatVal = CrossQuats(niBone_bind_quat_inv, quat) # Rchannel = Rtotal * inverse(Rbind)
-                        rot = CrossQuats(CrossQuats(extra_matrix_quat_inv, quatVal), extra_matrix_quat) # C' = X * C * inverse(X)
-                        b_posebone.quat = rot
-                        b_posebone.insertKey(b_armature, frame,
-                                             [Blender.Object.Pose.ROT])
-                        # fill optimizer dictionary
-                        if translations:
-                            rot_keys_dict[frame] = mathutils.Quaternion(rot)
-
-                # translations
+                    rot_keys = frames, [(quat[0], quat[1], quat[2], quat[3])
+                                        for quat in rotations]
                 if translations:
                     self.nif_import.debug('Translation keys...(bspline)')
-                    for time, translation in zip(times, translations):
-                        # time 0.0 is frame 1
-                        frame = 1 + int(time * self.nif_import.fps + 0.5)
-                        trans = mathutils.Vector(*translation)
-                        locVal = (trans - niBone_bind_trans) * niBone_bind_rot_inv * (niBone_bind_scale)# Tchannel = (Ttotal - Tbind) * inverse(Rbind) / Sbind
-                        # the rotation matrix is needed at this frame (that's
-                        # why the other keys are inserted first)
-                        if rot_keys_dict:
-                            try:
-                                rot = rot_keys_dict[frame].to_matrix()
-                            except KeyError:
-                                # fall back on slow method
-                                ipo = action.getChannelIpo(bone_name)
-                                quat = mathutils.Quaternion()
-                                quat.x = ipo.getCurve('QuatX').evaluate(frame)
-                                quat.y = ipo.getCurve('QuatY').evaluate(frame)
-                                quat.z = ipo.getCurve('QuatZ').evaluate(frame)
-                                quat.w = ipo.getCurve('QuatW').evaluate(frame)
-                                rot = quat.to_matrix()
-                        else:
-                            rot = mathutils.Matrix([[1.0, 0.0, 0.0],
-                                                    [0.0, 1.0, 0.0],
-                                                    [0.0, 0.0, 1.0]])
-                        # we also need the scale at this frame
-                        if scale_keys_dict:
-                            try:
-                                sizeVal = scale_keys_dict[frame]
-                            except KeyError:
-                                ipo = action.getChannelIpo(bone_name)
-                                if ipo.getCurve('SizeX'):
-                                    sizeVal = ipo.getCurve('SizeX').evaluate(frame) # assume uniform scale
-                                else:
-                                    sizeVal = 1.0
-                        else:
-                            sizeVal = 1.0
-                        size = mathutils.Matrix([[sizeVal, 0.0, 0.0],
-                                                 [0.0, sizeVal, 0.0],
-                                                 [0.0, 0.0, sizeVal]])
-                        # now we can do the final calculation
-                        loc = (extra_matrix_trans * size * rot + locVal - extra_matrix_trans) * extra_matrix_rot_inv * (extra_matrix_scale) # C' = X * C * inverse(X)
-                        b_posebone.loc = loc
-                        b_posebone.insertKey(b_armature, frame, [Blender.Object.Pose.LOC])
-
-                # delete temporary dictionaries
-                if translations:
-                    del scale_keys_dict
-                    del rot_keys_dict
+                    trans_keys = frames, [tuple(trans)
+                                          for trans in translations]
 
             # NiKeyframeData and NiTransformData import
             elif isinstance(kfd, NifFormat.NiKeyframeData):
 
-                translations = kfd.translations
-                scales = kfd.scales
-                # if we have translation keys, we make a dictionary of
-                # rot_keys and scale_keys, this makes the script work MUCH
-                # faster in most cases
-                if translations:
-                    scale_keys_dict = {}
-                    rot_keys_dict = {}
-                # add the keys
-
                 # Scaling
-                if scales.keys:
+                if kfd.scales.keys:
                     self.nif_import.debug('Scale keys...')
-                for scaleKey in scales.keys:
-                    # time 0.0 is frame 1
-                    frame = 1 + int(scaleKey.time * self.nif_import.fps + 0.5)
-                    sizeVal = scaleKey.value
-                    size = sizeVal / niBone_bind_scale # Schannel = Stotal / Sbind
-                    b_posebone.size = mathutils.Vector(size, size, size)
-                    b_posebone.insertKey(b_armature, frame, [Blender.Object.Pose.SIZE]) # this is very slow... :(
-                    # fill optimizer dictionary
-                    if translations:
-                        scale_keys_dict[frame] = size
+                    scale_keys = self.get_key_frames(kfd.scales.keys), \
+                        [key.value for key in kfd.scales.keys]
+                    scale_ipol = self.nif_import.get_b_ipol_from_n_ipol(
+                        kfd.scales.interpolation)
 
                 # detect the type of rotation keys
                 rotation_type = kfd.rotation_type
@@ -663,119 +590,305 @@ class ArmatureAnimation():
                 # Euler Rotations
                 if rotation_type == 4:
                     # uses xyz rotation
-                    if kfd.xyz_rotations[0].keys:
+                    xkeys, ykeys, zkeys = (
+                        xyz_rotation.keys
+                        for xyz_rotation in kfd.xyz_rotations)
+                    if xkeys:
                         self.nif_import.debug('Rotation keys...(euler)')
-                    for xkey, ykey, zkey in zip(kfd.xyz_rotations[0].keys,
-                                                 kfd.xyz_rotations[1].keys,
-                                                 kfd.xyz_rotations[2].keys):
-                        # time 0.0 is frame 1
+                        num_keys = min(len(xkeys), len(ykeys), len(zkeys))
+                        xyz_times = np.array(
+                            [[key.time for key in keys[:num_keys]]
+                             for keys in (xkeys, ykeys, zkeys)])
+                        xyz_values = np.array(
+                            [[key.value for key in keys[:num_keys]]
+                             for keys in (xkeys, ykeys, zkeys)])
                         # XXX it is assumed that all the keys have the
                         # XXX same times!!!
-                        if (abs(xkey.time - ykey.time) > self.properties.epsilon
-                            or abs(xkey.time - zkey.time) > self.properties.epsilon):
+                        if (np.abs(xyz_times[1:] - xyz_times[0]) >
+                            self.nif_import.properties.epsilon).any():
                             self.nif_import.warning(
                                 "xyz key times do not correspond, "
                                 "animation may not be correctly imported")
-                        frame = 1 + int(xkey.time * self.nif_import.fps + 0.5)
-                        euler = mathutils.Euler(
-                            [xkey.value * 180.0 / math.pi,
-                             ykey.value * 180.0 / math.pi,
-                             zkey.value * 180.0 / math.pi])
-                        quat = euler.toQuat()
-
-                        # beware, CrossQuats takes arguments in a counter-intuitive order:
-                        # q1.to_matrix() * q2.to_matrix() == CrossQuats(q2, q1).to_matrix()
-
-                        quatVal = CrossQuats(niBone_bind_quat_inv, quat) # Rchannel = Rtotal * inverse(Rbind)
-                        rot = CrossQuats(CrossQuats(extra_matrix_quat_inv, quatVal), extra_matrix_quat) # C' = X * C * inverse(X)
-                        b_posebone.quat = rot
-                        b_posebone.insertKey(b_armature, frame, [Blender.Object.Pose.ROT]) # this is very slow... :(
-                        # fill optimizer dictionary
-                        if translations:
-                            rot_keys_dict[frame] = mathutils.Quaternion(rot) 
+                        rot_keys = (
+                            anim_utils.get_frames(xyz_times[0],
+                                                  self.nif_import.fps),
+                            anim_utils.euler_to_quat(xyz_values.T))
+                        rot_ipol = self.nif_import.get_b_ipol_from_n_ipol(
+                            kfd.xyz_rotations[0].interpolation)
 
                 # Quaternion Rotations
                 else:
-                    # TODO:take rotation type into account for interpolation
                     if kfd.quaternion_keys:
                         self.nif_import.debug('Rotation keys...(quaternions)')
-                    quaternion_keys = kfd.quaternion_keys
-                    for key in quaternion_keys:
-                        frame = 1 + int(key.time * self.nif_import.fps + 0.5)
-                        keyVal = key.value
-                        quat = mathutils.Quaternion([keyVal.w, keyVal.x, keyVal.y, keyVal.z])
-                        # beware, CrossQuats takes arguments in a
-                        # counter-intuitive order:
-                        # q1.to_matrix() * q2.to_matrix() == CrossQuats(q2, q1).to_matrix()
-                        quatVal = CrossQuats(niBone_bind_quat_inv, quat) # Rchannel = Rtotal * inverse(Rbind)
-                        rot = CrossQuats(CrossQuats(extra_matrix_quat_inv, quatVal), extra_matrix_quat) # C' = X * C * inverse(X)
-                        b_posebone.quat = rot
-                        b_posebone.insertKey(b_armature, frame,
-                                             [Blender.Object.Pose.ROT])
-                        # fill optimizer dictionary
-                        if translations:
-                            rot_keys_dict[frame] = mathutils.Quaternion(rot)
-                    #else:
-                    #    print("Rotation keys...(unknown)" + 
-                    #          "WARNING: rotation animation data of type" +
-                    #          " %i found, but this type is not yet supported; data has been skipped""" % rotation_type)                        
-    
+                        rot_keys = self.get_key_frames(kfd.quaternion_keys), \
+                            [(key.value.w, key.value.x, key.value.y, key.value.z)
+                             for key in kfd.quaternion_keys]
+                        rot_ipol = self.nif_import.get_b_ipol_from_n_ipol(
+                            rotation_type)
+
                 # Translations
-                if translations.keys:
+                if kfd.translations.keys:
                     self.nif_import.debug('Translation keys...')
-                for key in translations.keys:
-                    # time 0.0 is frame 1
-                    frame = 1 + int(key.time * self.nif_import.fps + 0.5)
-                    keyVal = key.value
-                    trans = mathutils.Vector(keyVal.x, keyVal.y, keyVal.z)
-                    locVal = (trans - niBone_bind_trans) * niBone_bind_rot_inv * (niBone_bind_scale)# Tchannel = (Ttotal - Tbind) * inverse(Rbind) / Sbind
-                    # the rotation matrix is needed at this frame (that's
-                    # why the other keys are inserted first)
-                    if rot_keys_dict:
-                        try:
-                            rot = rot_keys_dict[frame].to_matrix()
-                        except KeyError:
-                            # fall back on slow method
-                            ipo = action.getChannelIpo(bone_name)
-                            quat = mathutils.Quaternion()
-                            quat.x = ipo.getCurve('QuatX').evaluate(frame)
-                            quat.y = ipo.getCurve('QuatY').evaluate(frame)
-                            quat.z = ipo.getCurve('QuatZ').evaluate(frame)
-                            quat.w = ipo.getCurve('QuatW').evaluate(frame)
-                            rot = quat.to_matrix()
-                    else:
-                        rot = mathutils.Matrix([[1.0, 0.0, 0.0],
-                                                [0.0, 1.0, 0.0],
-                                                [0.0, 0.0, 1.0]])
-                    # we also need the scale at this frame
-                    if scale_keys_dict:
-                        try:
-                            sizeVal = scale_keys_dict[frame]
-                        except KeyError:
-                            ipo = action.getChannelIpo(bone_name)
-                            if ipo.getCurve('SizeX'):
-                                sizeVal = ipo.getCurve('SizeX').evaluate(frame) # assume uniform scale
-                            else:
-                                sizeVal = 1.0
-                    else:
-                        sizeVal = 1.0
-                    size = mathutils.Matrix([[sizeVal, 0.0, 0.0],
-                                             [0.0, sizeVal, 0.0],
-                                             [0.0, 0.0, sizeVal]])
-                    # now we can do the final calculation
-                    loc = (extra_matrix_trans * size * rot + locVal - extra_matrix_trans) * extra_matrix_rot_inv * (extra_matrix_scale) # C' = X * C * inverse(X)
-                    b_posebone.loc = loc
-                    b_posebone.insertKey(b_armature, frame, [Blender.Object.Pose.LOC])
-                if translations:
-                    del scale_keys_dict
-                    del rot_keys_dict
-            # set extend mode for all ipo curves
+                    trans_keys = self.get_key_frames(kfd.translations.keys), \
+                        [(key.value.x, key.value.y, key.value.z)
+                         for key in kfd.translations.keys]
+                    trans_ipol = self.nif_import.get_b_ipol_from_n_ipol(
+                        kfd.translations.interpolation)
+
+            # write the keys to F-curves of the action
+            # extend mode is the same for all curves of the bone
             if kfc:
-                try:
-                    ipo = action.getChannelIpo(bone_name)
-                except ValueError:
-                    # no channel for bone_name
-                    pass
+                extend = self.nif_import.get_extend_from_flags(kfc.flags)
+            else:
+                extend = 'CONSTANT'
+            bone_path = 'pose.bones["%s"].' % bone_name
+
+            # Schannel = Stotal / Sbind
+            if scale_keys:
+                scale_frames, sizes = anim_utils.unique_frames(*scale_keys)
+                sizes = np.asarray(sizes, dtype=np.float64) / niBone_bind_scale
+                anim_utils.set_fcurve_keys(
+                    b_action, bone_path + "scale",
+                    scale_frames, np.repeat(sizes[:, np.newaxis], 3, axis=1),
+                    group=bone_name, interpolation=scale_ipol,
+                    extrapolation=extend)
+
+            if rot_keys:
+                rot_frames, quats = anim_utils.unique_frames(*rot_keys)
+                # Rchannel = Rtotal * inverse(Rbind)
+                rots = anim_utils.quat_multiply(quats, niBone_bind_quat_inv)
+                # C' = X * C * inverse(X)
+                rots = anim_utils.quat_multiply(
+                    anim_utils.quat_multiply(extra_matrix_quat, rots),
+                    extra_matrix_quat_inv)
+                anim_utils.set_fcurve_keys(
+                    b_action, bone_path + "rotation_quaternion",
+                    rot_frames, rots,
+                    group=bone_name, interpolation=rot_ipol,
+                    extrapolation=extend)
+
+            if trans_keys:
+                frames, translations = anim_utils.unique_frames(*trans_keys)
+                translations = np.asarray(translations, dtype=np.float64)
+                # the rotation and scale are needed at every frame,
+                # resample them where there is no key
+                if rot_keys:
+                    frame_rots = anim_utils.quat_to_matrix(
+                        anim_utils.slerp_keys(rot_frames, rots, frames))
                 else:
-                    for b_curve in ipo:
-                        b_curve.extend = self.nif_import.get_extend_from_flags(kfc.flags)
+                    frame_rots = np.tile(np.identity(3), (len(frames), 1, 1))
+                if scale_keys:
+                    frame_sizes = anim_utils.lerp_keys(
+                        scale_frames, sizes, frames)
+                else:
+                    frame_sizes = np.ones(len(frames))
+                # vectors are rows, as in vector * matrix
+                # Tchannel = (Ttotal - Tbind) * inverse(Rbind) / Sbind
+                locs = np.dot(translations - np.array(niBone_bind_trans),
+                              np.array(niBone_bind_rot_inv)) * niBone_bind_scale
+                # C' = X * C * inverse(X)
+                extra_trans = np.array(extra_matrix_trans)
+                locs += (frame_sizes[:, np.newaxis]
+                         * np.einsum('j,njk->nk', extra_trans, frame_rots))
+                locs = np.dot(locs - extra_trans,
+                              np.array(extra_matrix_rot_inv)) * extra_matrix_scale
+                anim_utils.set_fcurve_keys(
+                    b_action, bone_path + "location",
+                    frames, locs,
+                    group=bone_name, interpolation=trans_ipol,
+                    extrapolation=extend)
+
+    def get_key_frames(self, keys):
+        """Return the frames of a list of nif keys, time 0.0 being frame 1."""
+        return anim_utils.get_frames([key.time for key in keys],
+                                     self.nif_import.fps)
+
+
+class MorphAnimation():
+
+    def __init__(self, parent):
+        self.nif_import = parent
+
+    def import_morph_controller(self, niBlock, b_obj, b_v_map, transform=None):
+        """Import the morphs of a NiGeomMorpherController as shape keys,
+        with their influence animated as in the controller.
+
+        :param niBlock: The geometry block.
+        :param b_obj: The blender object of the geometry.
+        :param b_v_map: The blender vertex of every nif vertex.
+        :type b_v_map: :class:`numpy.ndarray`
+        :param transform: The transform applied on the vertices, if any.
+        :type transform: :class:`mathutils.Matrix`
+        """
+        morphCtrl = nif_utils.find_controller(niBlock, NifFormat.NiGeomMorpherController)
+        if not morphCtrl:
+            return
+        morphData = morphCtrl.data
+        if not morphData.num_morphs:
+            return
+        # get all morph vectors at once, the first morph holds the base
+        # vectors and the others hold offsets from the base
+        n_vectors = [mesh_utils.vectors_as_array(morph.vectors)
+                     for morph in morphData.morphs]
+        base_name = morphData.morphs[0].frame_name.decode()
+        if not base_name:
+            base_name = 'Base'
+        morph_indices = []
+        for idxMorph in range(1, morphData.num_morphs):
+            if len(n_vectors[idxMorph]) != len(b_v_map):
+                self.nif_import.warning(
+                    "skipped morph %i with %i vectors instead of %i"
+                    % (idxMorph, len(n_vectors[idxMorph]), len(b_v_map)))
+                continue
+            morph_indices.append(idxMorph)
+        if not morph_indices:
+            return
+        # the absolute key positions, of shape (morphs, vertices, 3)
+        morph_coords = (np.array([n_vectors[idxMorph]
+                                  for idxMorph in morph_indices])
+                        + n_vectors[0])
+        if transform is not None:
+            morph_coords = mesh_utils.transform_coords(
+                morph_coords.reshape(-1, 3), transform
+                ).reshape(morph_coords.shape)
+        keynames = []
+        for idxMorph in morph_indices:
+            keyname = morphData.morphs[idxMorph].frame_name.decode()
+            if not keyname:
+                keyname = 'Key %i' % idxMorph
+            self.nif_import.info("inserting key '%s'" % keyname)
+            keynames.append(keyname)
+        b_keys = self.add_shape_keys(
+            b_obj, b_v_map, morph_coords, keynames, base_name)
+
+        # animate the influence of the keys
+        b_action = self.get_shape_key_action(b_obj)
+        extend = self.nif_import.get_extend_from_flags(morphCtrl.flags)
+        for idxMorph, b_key in zip(morph_indices, b_keys):
+            # older versions store keys in the morphData
+            morphkeys = morphData.morphs[idxMorph].keys
+            # newer versions store keys in the controller
+            if (not morphkeys) and morphCtrl.interpolators:
+                morphkeys = morphCtrl.interpolators[idxMorph].data.data.keys
+            if not morphkeys:
+                continue
+            times = anim_utils.get_key_times(morphkeys)
+            values = np.fromiter((key.value for key in morphkeys),
+                                 dtype=np.float32, count=len(morphkeys))
+            # no idea how to set up the bezier handles -> switching
+            # to linear instead
+            anim_utils.set_fcurve_keys(
+                b_action, 'key_blocks["%s"].value' % b_key.name,
+                anim_utils.get_frames(times, self.nif_import.fps), values,
+                interpolation='LINEAR', extrapolation=extend)
+
+    def import_egm_morphs(self, egmdata, b_obj, b_v_map, n_verts,
+                          transform=None):
+        """Import the morphs of a FaceGen EGM file as shape keys, and
+        optionally animate them one after the other.
+
+        :param egmdata: The EGM data, with scale correction applied.
+        :type egmdata: :class:`pyffi.formats.egm.EgmFormat.Data`
+        :param b_obj: The blender object of the geometry.
+        :param b_v_map: The blender vertex of every nif vertex.
+        :type b_v_map: :class:`numpy.ndarray`
+        :param n_verts: The nif vertices, of shape (n, 3).
+        :type n_verts: :class:`numpy.ndarray`
+        :param transform: The transform applied on the vertices, if any.
+        :type transform: :class:`mathutils.Matrix`
+        """
+        morphs = list(egmdata.sym_morphs) + list(egmdata.asym_morphs)
+        if not morphs:
+            return
+        keynames = (["EGM SYM %i" % i
+                     for i in range(len(egmdata.sym_morphs))]
+                    + ["EGM ASYM %i" % i
+                       for i in range(len(egmdata.asym_morphs))])
+        # the absolute key positions, of shape (morphs, vertices, 3)
+        morph_coords = (self.get_egm_relative_vertices(morphs, len(n_verts))
+                        + n_verts)
+        if transform is not None:
+            morph_coords = mesh_utils.transform_coords(
+                morph_coords.reshape(-1, 3), transform
+                ).reshape(morph_coords.shape)
+        b_keys = self.add_shape_keys(
+            b_obj, b_v_map, morph_coords, keynames, "Basis")
+
+        if self.nif_import.properties.egm_animation:
+            # animate every key in turn, over ten frames
+            b_action = self.get_shape_key_action(b_obj)
+            num_keys = len(b_obj.data.shape_keys.key_blocks)
+            first_key = num_keys - len(b_keys)
+            values = np.array(
+                [0, self.nif_import.properties.egm_animation_scale, 0],
+                dtype=np.float32)
+            for i, b_key in enumerate(b_keys):
+                framestart = 1 + (first_key + i) * 10
+                anim_utils.set_fcurve_keys(
+                    b_action, 'key_blocks["%s"].value' % b_key.name,
+                    framestart + np.array([0, 5, 10]), values,
+                    interpolation='LINEAR', extrapolation='CONSTANT')
+            # set begin and end frame
+            b_scene = self.nif_import.context.scene
+            b_scene.frame_start = 1
+            b_scene.frame_end = 11 + num_keys * 10
+
+    def get_egm_relative_vertices(self, morphs, num_verts):
+        """Decode the offsets of EGM morphs into a single array.
+
+        Sometimes, oddly, the morphs have more vertices than the
+        geometry: these are dropped. Missing vertices get no offset.
+
+        :param morphs: The EGM morph records.
+        :param num_verts: The number of nif vertices.
+        :return: The offsets, of shape (morphs, num_verts, 3).
+        """
+        rel_verts = np.zeros((len(morphs), num_verts, 3), dtype=np.float32)
+        scales = np.empty(len(morphs), dtype=np.float32)
+        for i, morph in enumerate(morphs):
+            n_vectors = mesh_utils.vectors_as_array(morph.vertices)
+            num_common = min(num_verts, len(n_vectors))
+            rel_verts[i, :num_common] = n_vectors[:num_common]
+            scales[i] = morph.scale
+        rel_verts *= scales[:, np.newaxis, np.newaxis]
+        return rel_verts
+
+    def add_shape_keys(self, b_obj, b_v_map, coords, keynames, base_name):
+        """Add shape keys to an object, from the absolute positions of
+        the nif vertices. Blender vertices without nif vertex keep their
+        position in the basis key.
+
+        :param b_obj: The blender object.
+        :param b_v_map: The blender vertex of every nif vertex.
+        :param coords: The positions, of shape (keys, nif vertices, 3).
+        :param keynames: The name of every key.
+        :param base_name: Name of the basis key, if it must be created.
+        :return: The new shape keys.
+        """
+        if not b_obj.data.shape_keys:
+            b_obj.shape_key_add(name=base_name, from_mix=False)
+        base_coords = mesh_utils.get_collection_array(
+            b_obj.data.shape_keys.reference_key.data, "co", 3)
+        key_coords = base_coords.copy()
+        b_keys = []
+        for morph_coords, keyname in zip(coords, keynames):
+            key_coords[b_v_map] = morph_coords
+            # duplicate names are made unique by blender, an instance
+            # of duplicates is in fallout 3
+            # meshes/characters/_male/skeleton.nif HeadAnims:0
+            b_key = b_obj.shape_key_add(name=keyname, from_mix=False)
+            b_key.data.foreach_set("co", key_coords.ravel())
+            b_keys.append(b_key)
+        return b_keys
+
+    def get_shape_key_action(self, b_obj):
+        """Return the action animating the shape keys of an object,
+        creating it if needed.
+        """
+        b_shape_keys = b_obj.data.shape_keys
+        if not b_shape_keys.animation_data:
+            b_shape_keys.animation_data_create()
+        if not b_shape_keys.animation_data.action:
+            b_shape_keys.animation_data.action = bpy.data.actions.new(
+                b_obj.name + "-Morphs")
+        return b_shape_keys.animation_data.action
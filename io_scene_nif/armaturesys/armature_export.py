@@ -119,10 +119,10 @@ class Armature():
             if root_bones.count(root_bone) == 0:
                 root_bones.append(root_bone)
 
-        if bpy.types.Action(arm):
-            bones_ipo = bpy.types.ActionGroups(arm) # dictionary of Bone Ipos (name -> ipo)
+        if arm.animation_data and arm.animation_data.action:
+            b_action = arm.animation_data.action # bone animation
         else:
-            bones_ipo = {} # no ipos
+            b_action = None # no animation
 
         bones_node = {} # maps bone names to NiNode blocks
 
@@ -178,10 +178,13 @@ class Armature():
             except KeyError:
                 bonexmat_inv = mathutils.Matrix()
                 bonexmat_inv.identity()
-            if bone.name in bones_ipo:
+            if (b_action and
+                self.nif_export.animationhelper.get_keyframe_fcurves(
+                    b_action, bone.name)):
                 self.nif_export.animationhelper.export_keyframes(
-                    bones_ipo[bone.name], 'localspace', node,
-                    bind_matrix = bone_rest_matrix, extra_mat_inv = bonexmat_inv)
+                    b_action, 'localspace', node,
+                    bind_matrix = bone_rest_matrix, extra_mat_inv = bonexmat_inv,
+                    bone_name = bone.name)
 
             # does bone have priority value in NULL constraint?
             for constr in arm.pose.bones[bone.name].constraints:
@@ -231,23 +234,19 @@ class Armature():
                         # to the armature
                         # so let's find that bone!
                         nif_bone_name = self.nif_export.objecthelper.get_full_name(parent_bone_name)
-                        for bone_block in self.nif_export.dict_blocks:
-                            if isinstance(bone_block, NifFormat.NiNode) and \
-                                bone_block.name.decode() == nif_bone_name:
-                                # ok, we should parent to block
-                                # instead of to parent_block
-                                # two problems to resolve:
-                                #   - blender bone matrix is not the exported
-                                #     bone matrix!
-                                #   - blender objects parented to bone have
-                                #     extra translation along the Y axis
-                                #     with length of the bone ("tail")
-                                # this is handled in the get_object_srt function
-                                self.nif_export.objecthelper.export_node(b_obj_child, 'localspace',
-                                                 bone_block, b_obj_child.name)
-                                break
-                        else:
-                            assert(False) # BUG!
+                        bone_block = self.nif_export.objecthelper.get_block_by_name(nif_bone_name)
+                        assert(bone_block) # BUG!
+                        # ok, we should parent to block
+                        # instead of to parent_block
+                        # two problems to resolve:
+                        #   - blender bone matrix is not the exported
+                        #     bone matrix!
+                        #   - blender objects parented to bone have
+                        #     extra translation along the Y axis
+                        #     with length of the bone ("tail")
+                        # this is handled in the get_object_srt function
+                        self.nif_export.objecthelper.export_node(b_obj_child, 'localspace',
+                                         bone_block, b_obj_child.name)
                             
                             
     def get_bone_rest_matrix(self, bone, space, extra = True, tail = False):
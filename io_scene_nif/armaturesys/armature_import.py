@@ -38,6 +38,7 @@
 # ***** END LICENSE BLOCK *****
 
 import os
+from collections import OrderedDict
 
 import bpy
 import mathutils
@@ -321,14 +322,15 @@ class Armature():
 					"cannot import skeleton: root is not a NiNode")
 			# for morrowind, take the Bip01 node to be the skeleton root
 			if self.nif_import.data.version == 0x04000002:
-				skelroot = niBlock.find(block_name='Bip01',
-										block_type=NifFormat.NiNode)
+				skelroot = nif_utils.find_indexed_block(
+					self.nif_import.dict_named_blocks, 'Bip01',
+					NifFormat.NiNode)
 				if not skelroot:
 					skelroot = niBlock
 			else:
 				skelroot = niBlock
 			if skelroot not in self.nif_import.dict_armatures:
-				self.nif_import.dict_armatures[skelroot] = []
+				self.nif_import.dict_armatures[skelroot] = OrderedDict()
 			self.nif_import.info("Selecting node '%s' as skeleton root"
 							 % skelroot.name)
 			# add bones
@@ -339,32 +341,35 @@ class Armature():
 					continue
 				if self.nif_import.is_grouping_node(bone):
 					continue
-				if bone not in self.nif_import.dict_armatures[skelroot]:
-					self.nif_import.dict_armatures[skelroot].append(bone)
+				self.mark_bone(bone, skelroot)
 			return # done!
 
 		# attaching to selected armature -> first identify armature and bones
 		elif self.properties.skeleton == "GEOMETRY_ONLY" and not self.nif_import.dict_armatures:
-			skelroot = niBlock.find(
-							block_name=self.nif_import.selected_objects[0].name)
+			skelroot = nif_utils.find_indexed_block(
+							self.nif_import.dict_named_blocks,
+							self.nif_import.selected_objects[0].name)
 			if not skelroot:
 				raise nif_utils.NifError("nif has no armature '%s'" % 
 									self.nif_import.selected_objects[0].name)
 			self.nif_import.debug("Identified '%s' as armature" % 
 									skelroot.name)
-			self.nif_import.dict_armatures[skelroot] = []
+			self.nif_import.dict_armatures[skelroot] = OrderedDict()
+			# index the blocks below the armature once, by name
+			dict_skelroot_blocks = nif_utils.index_block_names(skelroot)
 			for bone_name in self.nif_import.selected_objects[0].data.bones.keys():
 				# blender bone naming -> nif bone naming
 				nif_bone_name = self.nif_import.get_bone_name_for_nif(bone_name)
 				# find a block with bone name
-				bone_block = skelroot.find(block_name=nif_bone_name)
+				bone_block = nif_utils.find_indexed_block(
+					dict_skelroot_blocks, nif_bone_name)
 				# add it to the name list if there is a bone with that name
 				if bone_block:
 					self.nif_import.info(
 						"Identified nif block '%s' with bone '%s' "
 						"in selected armature" % (nif_bone_name, bone_name))
 					self.nif_import.dict_names[bone_block] = bone_name
-					self.nif_import.dict_armatures[skelroot].append(bone_block)
+					self.mark_bone(bone_block, skelroot)
 					self.complete_bone_tree(bone_block, skelroot)
 
 		# search for all NiTriShape or NiTriStrips blocks...
@@ -379,7 +384,7 @@ class Armature():
 				skelroot = skininst.skeleton_root
 				if self.properties.skeleton == "EVERYTHING":
 					if skelroot not in self.nif_import.dict_armatures:
-						self.nif_import.dict_armatures[skelroot] = []
+						self.nif_import.dict_armatures[skelroot] = OrderedDict()
 						self.nif_import.debug("'%s' is an armature"
 										  % skelroot.name)
 				elif self.properties.skeleton == "GEOMETRY_ONLY":
@@ -394,8 +399,7 @@ class Armature():
 					# boneBlock can be None; see pyffi issue #3114079
 					if not boneBlock:
 						continue
-					if boneBlock not in self.nif_import.dict_armatures[skelroot]:
-						self.nif_import.dict_armatures[skelroot].append(boneBlock)
+					if self.mark_bone(boneBlock, skelroot):
 						self.nif_import.debug(
 							"'%s' is a bone of armature '%s'"
 							% (boneBlock.name, skelroot.name))
@@ -417,8 +421,7 @@ class Armature():
 							continue
 						if self.nif_import.is_grouping_node(bone):
 							continue
-						if bone not in self.nif_import.dict_armatures[skelroot]:
-							self.nif_import.dict_armatures[skelroot].append(bone)
+						if self.mark_bone(bone, skelroot):
 							self.nif_import.debug(
 								"'%s' marked as extra bone of armature '%s'"
 								% (bone.name, skelroot.name))
@@ -432,6 +435,19 @@ class Armature():
 			if not isinstance(child, NifFormat.NiAVObject): continue # skip blocks that don't have transforms
 			self.mark_armatures_bones(child)
 
+	def mark_bone(self, bone, skelroot):
+		"""Mark a block as a bone of an armature. The bones of every
+		armature are kept in the order in which they are marked.
+
+		:return: True if the block was not yet a bone of the armature.
+		"""
+		bones = self.nif_import.dict_armatures[skelroot]
+		if bone in bones:
+			return False
+		bones[bone] = None
+		self.nif_import.dict_bone_armatures.setdefault(bone, skelroot)
+		return True
+
 	def complete_bone_tree(self, bone, skelroot):
 		"""Make sure that the bones actually form a tree all the way
 		down to the armature node. Call this function on all bones of
@@ -442,27 +458,25 @@ class Armature():
 		assert bone in self.nif_import.dict_armatures[skelroot] # debug
 		# get the node parent, this should be marked as an armature or as a bone
 		boneparent = bone._parent
-		if boneparent != skelroot:
+		while boneparent != skelroot:
 			# parent is not the skeleton root
-			if boneparent not in self.nif_import.dict_armatures[skelroot]:
-				# neither is it marked as a bone: so mark the parent as a bone
-				self.nif_import.dict_armatures[skelroot].append(boneparent)
-				# store the coordinates for realignement autodetection 
-				self.nif_import.debug("'%s' is a bone of armature '%s'"
-								  % (boneparent.name, skelroot.name))
+			if not self.mark_bone(boneparent, skelroot):
+				# parent was marked as a bone before, so its tree has
+				# been completed already
+				break
+			# neither was it marked as a bone: so we marked the parent as a bone
+			# store the coordinates for realignement autodetection 
+			self.nif_import.debug("'%s' is a bone of armature '%s'"
+							  % (boneparent.name, skelroot.name))
 			# now the parent is marked as a bone
-			# recursion: complete the bone tree,
-			# this time starting from the parent bone
-			self.complete_bone_tree(boneparent, skelroot)
+			# complete the bone tree, this time starting from the parent bone
+			boneparent = boneparent._parent
 
 	def is_bone(self, niBlock):
 		"""Tests a NiNode to see if it's a bone."""
 		if not niBlock :
 			return False
-		for bones in self.nif_import.dict_armatures.values():
-			if niBlock in bones:
-				return True
-		return False
+		return niBlock in self.nif_import.dict_bone_armatures
 
 	def is_armature_root(self, niBlock):
 		"""Tests a block to see if it's an armature."""
@@ -486,17 +500,12 @@ class Armature():
 		"""Retrieves the Blender object or Blender bone matching the block."""
 		if self.is_bone(niBlock):
 			bone_name = self.nif_import.dict_names[niBlock]
-			armatureName = None
-			for armatureBlock, boneBlocks in self.nif_import.dict_armatures.items():
-				if niBlock in boneBlocks:
-					armatureName = self.nif_import.dict_names[armatureBlock]
-					break
-				else:
-					raise nif_utils.NifError("cannot find bone '%s'" % bone_name)
-			armatureObject = bpy.types.Object(armatureName)
+			armatureBlock = self.nif_import.dict_bone_armatures[niBlock]
+			armatureName = self.nif_import.dict_names[armatureBlock]
+			armatureObject = bpy.data.objects[armatureName]
 			return armatureObject.data.bones[bone_name]
 		else:
-			return bpy.types.Object(self.nif_import.dict_names[niBlock])
+			return bpy.data.objects[self.nif_import.dict_names[niBlock]]
 		
 
 	def decompose_srt(self, matrix):
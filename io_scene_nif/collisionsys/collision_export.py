@@ -39,9 +39,11 @@
 
 import bpy
 import mathutils
+import numpy as np
 
 from pyffi.formats.nif import NifFormat
 from io_scene_nif.utility import nif_utils
+from io_scene_nif.utility import vertex_weld
 
 class bhkshape_export():
 
@@ -455,24 +457,29 @@ class bhkshape_export():
                             b_rot_quat.to_matrix() * b_face.normal)
                          for b_face in b_mesh.polygons ]
 
-            # remove duplicates through dictionary
-            vertdict = {}
-            for i, vert in enumerate(vertlist):
-                vertdict[(int(vert[0]*self.nif_export.VERTEX_RESOLUTION),
-                          int(vert[1]*self.nif_export.VERTEX_RESOLUTION),
-                          int(vert[2]*self.nif_export.VERTEX_RESOLUTION))] = i
-            fdict = {}
-            for i, (norm, dist) in enumerate(zip(fnormlist, fdistlist)):
-                fdict[(int(norm[0]*self.nif_export.NORMAL_RESOLUTION),
-                       int(norm[1]*self.nif_export.NORMAL_RESOLUTION),
-                       int(norm[2]*self.nif_export.NORMAL_RESOLUTION),
-                       int(dist*self.nif_export.VERTEX_RESOLUTION))] = i
-            # sort vertices and normals
-            vertkeys = sorted(vertdict.keys())
-            fkeys = sorted(fdict.keys())
-            vertlist = [ vertlist[vertdict[hsh]] for hsh in vertkeys ]
-            fnormlist = [ fnormlist[fdict[hsh]] for hsh in fkeys ]
-            fdistlist = [ fdistlist[fdict[hsh]] for hsh in fkeys ]
+            # remove duplicates
+            vert_unique = vertex_weld.weld(
+                vertlist, 1.0 / self.nif_export.VERTEX_RESOLUTION)[0]
+            # planes are identified by their normal and distance
+            f_unique = vertex_weld.weld(
+                np.hstack((np.reshape(fnormlist, (-1, 3)),
+                           np.reshape(fdistlist, (-1, 1)))),
+                [1.0 / self.nif_export.NORMAL_RESOLUTION] * 3
+                + [1.0 / self.nif_export.VERTEX_RESOLUTION])[0]
+            # sort vertices and planes on their truncated coordinates, so
+            # they are written in the same order as always
+            vert_keys = np.trunc(np.reshape(vertlist, (-1, 3))[vert_unique]
+                                 * self.nif_export.VERTEX_RESOLUTION)
+            vert_unique = vert_unique[np.lexsort(vert_keys.T[::-1])]
+            f_keys = np.trunc(np.hstack((
+                np.reshape(fnormlist, (-1, 3))[f_unique]
+                * self.nif_export.NORMAL_RESOLUTION,
+                np.reshape(fdistlist, (-1, 1))[f_unique]
+                * self.nif_export.VERTEX_RESOLUTION)))
+            f_unique = f_unique[np.lexsort(f_keys.T[::-1])]
+            vertlist = [ vertlist[i] for i in vert_unique ]
+            fnormlist = [ fnormlist[i] for i in f_unique ]
+            fdistlist = [ fdistlist[i] for i in f_unique ]
 
             if len(fnormlist) > 65535 or len(vertlist) > 65535:
                 raise nif_utils.NifError(
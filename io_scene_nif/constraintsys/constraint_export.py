@@ -76,11 +76,10 @@ class constraint_export():
                         " can be exported: skipped %s." % b_constr)
                     continue
                 # check that the object is a rigid body
-                for otherbody, otherobj in self.nif_export.dict_blocks.items():
-                    if isinstance(otherbody, NifFormat.bhkRigidBody) \
-                        and otherobj is b_obj:
-                        hkbody = otherbody
-                        break
+                hkbodies = self.nif_export.objecthelper.get_blocks_by_object(
+                    b_obj, NifFormat.bhkRigidBody)
+                if hkbodies:
+                    hkbody = hkbodies[0]
                 else:
                     # no collision body for this object
                     raise nif_utils.NifError(
@@ -160,11 +159,10 @@ class constraint_export():
                     self.warning("Constraint %s has no target, skipped")
                     continue
                 # find target's bhkRigidBody
-                for otherbody, otherobj in self.nif_export.dict_blocks.items():
-                    if isinstance(otherbody, NifFormat.bhkRigidBody) \
-                        and otherobj == targetobj:
-                        hkconstraint.entities[1] = otherbody
-                        break
+                hkbodies = self.nif_export.objecthelper.get_blocks_by_object(
+                    targetobj, NifFormat.bhkRigidBody)
+                if hkbodies:
+                    hkconstraint.entities[1] = hkbodies[0]
                 else:
                     # not found
                     raise nif_utils.NifError(
@@ -51,8 +51,11 @@ class NifCommon:
     """
     
     # dictionary of bones that belong to a certain armature
-    # maps NIF armature name to list of NIF bone name
+    # maps NIF armature block to an ordered dictionary whose keys are the
+    # NIF bone blocks, in the order in which they were marked
     dict_armatures = {}
+    # reverse of dict_armatures, maps NIF bone block to NIF armature block
+    dict_bone_armatures = {}
     # dictionary of bones, maps Blender bone name to matrix that maps the
     # NIF bone matrix on the Blender bone matrix
     # B' = X * B, where B' is the Blender bone matrix, and B is the NIF bone matrix
@@ -78,9 +81,12 @@ class NifCommon:
 
     # dictionary of bones, maps Blender name to NIF block
     dict_blocks = {}
+
+    # dictionary of named blocks, maps NIF name to list of NIF blocks
+    dict_named_blocks = {}
     
-    # keeps track of names of exported blocks, to make sure they are unique
-    dict_block_names = []
+    # keeps track of names in use, to make sure new names are unique
+    name_allocator = None
 
     # bone animation priorities (maps NiNode name to priority number);
     # priorities are set in import_kf_root and are stored into the name
@@ -281,32 +287,32 @@ class NifCommon:
 
     def get_extend_from_flags(self, flags):
         if flags & 6 == 4: # 0b100
-            return Blender.IpoCurve.ExtendTypes.CONST
+            return 'CONSTANT'
         elif flags & 6 == 0: # 0b000
-            return Blender.IpoCurve.ExtendTypes.CYCLIC
+            return 'CYCLIC'
 
         self.warning(
             "Unsupported cycle mode in nif, using clamped.")
-        return Blender.IpoCurve.ExtendTypes.CONST
+        return 'CONSTANT'
 
     def get_b_ipol_from_n_ipol(self, n_ipol):
         if n_ipol == NifFormat.KeyType.LINEAR_KEY:
-            return Blender.IpoCurve.InterpTypes.LINEAR
+            return 'LINEAR'
         elif n_ipol == NifFormat.KeyType.QUADRATIC_KEY:
-            return Blender.IpoCurve.InterpTypes.BEZIER
+            return 'BEZIER'
         elif n_ipol == 0:
             # guessing, not documented in nif.xml
-            return Blender.IpoCurve.InterpTypes.CONST
+            return 'CONSTANT'
         self.warning(
             "Unsupported interpolation mode in nif, using quadratic/bezier.")
-        return Blender.IpoCurve.InterpTypes.BEZIER
+        return 'BEZIER'
 
     def get_n_ipol_from_b_ipol(self, b_ipol):
-        if b_ipol == Blender.IpoCurve.InterpTypes.LINEAR:
+        if b_ipol == 'LINEAR':
             return NifFormat.KeyType.LINEAR_KEY
-        elif b_ipol == Blender.IpoCurve.InterpTypes.BEZIER:
+        elif b_ipol == 'BEZIER':
             return NifFormat.KeyType.QUADRATIC_KEY
-        elif b_ipol == Blender.IpoCurve.InterpTypes.CONST:
+        elif b_ipol == 'CONSTANT':
             return NifFormat.KeyType.CONST_KEY
         self.warning(
             "Unsupported interpolation mode in blend, using quadratic/bezier.")
@@ -40,6 +40,8 @@
 
 from io_scene_nif.nif_common import NifCommon
 from io_scene_nif.utility import nif_utils
+from io_scene_nif.utility import mesh_utils
+from io_scene_nif.utility.name_allocator import NameAllocator
 
 from io_scene_nif.animationsys.animation_export import AnimationHelper
 from io_scene_nif.collisionsys.collision_export import bhkshape_export, bound_export
@@ -125,7 +127,11 @@ class NifExport(NifCommon):
         self.dict_havok_objects = {}
         self.dict_names = {}
         self.dict_blocks = {}
-        self.dict_block_names = []
+        self.dict_object_blocks = {}
+        self.dict_named_blocks = {}
+        self.unindexed_blocks = []
+        self.missed_block_names = set()
+        self.name_allocator = NameAllocator()
         self.dict_materials = {}
         self.dict_textures = {}
         self.dict_mesh_uvlayers = []
@@ -741,8 +747,8 @@ class NifExport(NifCommon):
                     kf_root.text_keys = anim_textextra
                     kf_root.cycle_type = NifFormat.CycleType.CYCLE_CLAMP
                     kf_root.frequency = 1.0
-                    kf_root.start_time =(self.context.scene.frame_start - 1) * self.context.scene.render.fps
-                    kf_root.stop_time = (self.context.scene.frame_end - self.context.scene.frame_start) * self.context.scene.render.fps
+                    kf_root.start_time =(self.context.scene.frame_start - 1) / self.context.scene.render.fps
+                    kf_root.stop_time = (self.context.scene.frame_end - self.context.scene.frame_start) / self.context.scene.render.fps
                     # quick hack to set correct target name
                     if not self.EXPORT_ANIMTARGETNAME:
                         if "Bip01" in [node.name for
@@ -1085,6 +1091,9 @@ class NifExport(NifCommon):
     
     def exportEgm(self, keyblocks):
         self.egmdata = EgmFormat.Data(num_vertices=len(keyblocks[0].data))
+        # note: keyblocks[0] is base key
+        base_coords = mesh_utils.get_collection_array(
+            keyblocks[0].data, "co", 3)
         for keyblock in keyblocks:
             if keyblock.name.startswith("EGM SYM"):
                 morph = self.egmdata.add_sym_morph()
@@ -1093,11 +1102,10 @@ class NifExport(NifCommon):
             else:
                 continue
             self.info("Exporting morph %s to egm" % keyblock.name)
-            relative_vertices = []
-            # note: keyblocks[0] is base key
-            for vert, key_vert in zip(keyblocks[0].data, keyblock.data):
-                relative_vertices.append(key_vert - vert)
-            morph.set_relative_vertices(relative_vertices)
+            relative_vertices = (
+                mesh_utils.get_collection_array(keyblock.data, "co", 3)
+                - base_coords)
+            morph.set_relative_vertices(relative_vertices.tolist())
 
 
 def menu_func(self, context):
@@ -39,6 +39,10 @@
 
 from io_scene_nif.nif_common import NifCommon
 from io_scene_nif.utility import nif_utils
+from io_scene_nif.utility import mesh_utils
+from io_scene_nif.utility import vertex_weld
+from io_scene_nif.utility.name_allocator import NameAllocator
+from io_scene_nif.utility.nif_cache import NifCache
 
 from io_scene_nif.animationsys.animation_import import AnimationHelper
 from io_scene_nif.armaturesys.armature_import import Armature
@@ -50,7 +54,9 @@ from io_scene_nif.texturesys.texture_loader import TextureLoader
 
 import bpy
 import mathutils
+import numpy as np
 
+import pyffi
 import pyffi.spells.nif.fix
 from pyffi.formats.nif import NifFormat
 from pyffi.formats.egm import EgmFormat
@@ -61,6 +67,11 @@ class NifImport(NifCommon):
     D2R = 3.14159265358979/180.0
     IMPORT_EXTRANODES = True
     IMPORT_EXPORTEMBEDDEDTEXTURES = False
+    # properties that affect the file as stored in the cache
+    CACHE_PROPERTIES = ('merge_skeleton_roots', 'send_geoms_to_bind_pos',
+                        'send_detached_geoms_to_node_pos',
+                        'send_bones_to_bind_position',
+                        'apply_skin_deformation', 'scale_correction_import')
     
     
     def __init__(self, operator, context):
@@ -84,13 +95,18 @@ class NifImport(NifCommon):
         """Main import function."""
 
         self.dict_armatures = {}
+        self.dict_bone_armatures = {}
         self.dict_bones_extra_matrix = {}
         self.dict_bones_extra_matrix_inv = {}
         self.dict_bone_priorities = {}
         self.dict_havok_objects = {}
         self.dict_names = {}
         self.dict_blocks = {}
-        self.dict_block_names = []
+        self.dict_named_blocks = {}
+        self.name_allocator = NameAllocator(
+            is_used=lambda name: (name in bpy.data.objects
+                                  or name in bpy.data.materials
+                                  or name in bpy.data.meshes))
         self.dict_materials = {}
         self.dict_textures = {}
         self.dict_mesh_uvlayers = []
@@ -107,9 +123,27 @@ class NifImport(NifCommon):
                         " 'Import Geometry Only + Parent To Selected Armature'"
                         " mode.")
 
+            # look up the prepared file in the cache
+            nif_cache = None
+            cached_filepath = None
+            if self.properties.use_cache:
+                nif_cache = NifCache(
+                    bpy.utils.user_resource('DATAFILES', "io_scene_nif_cache"),
+                    self.properties.cache_size * 1024 * 1024)
+                cache_key = nif_cache.get_key(
+                    self.properties.filepath,
+                    dict((name, getattr(self.properties, name))
+                         for name in self.CACHE_PROPERTIES),
+                    pyffi.__version__)
+                cached_filepath = nif_cache.get(cache_key)
+
             # open file for binary reading
             self.info("Importing %s" % self.properties.filepath)
-            niffile = open(self.properties.filepath, "rb")
+            if cached_filepath:
+                self.info("Using cached file %s" % cached_filepath)
+                niffile = open(cached_filepath, "rb")
+            else:
+                niffile = open(self.properties.filepath, "rb")
             self.data = NifFormat.Data()
             try:
                 # check if nif file is valid
@@ -185,33 +219,49 @@ class NifImport(NifCommon):
                     + (self.kfdata.roots if self.kfdata else []))
                 self.context.scene.render.fps = self.fps
 
-            # merge skeleton roots and transform geometry into the rest pose
-            if self.properties.merge_skeleton_roots:
-                pyffi.spells.nif.fix.SpellMergeSkeletonRoots(data=self.data).recurse()
-            if self.properties.send_geoms_to_bind_pos:
-                pyffi.spells.nif.fix.SpellSendGeometriesToBindPosition(data=self.data).recurse()
-            if self.properties.send_detached_geoms_to_node_pos:
-                pyffi.spells.nif.fix.SpellSendDetachedGeometriesToNodePosition(data=self.data).recurse()
-            if self.properties.send_bones_to_bind_position:
-                pyffi.spells.nif.fix.SpellSendBonesToBindPosition(data=self.data).recurse()
-            if self.properties.apply_skin_deformation:
-                for n_geom in self.data.get_global_iterator():
-                    if not isinstance(n_geom, NifFormat.NiGeometry):
-                        continue
-                    if not n_geom.is_skin():
-                        continue
-                    self.info('Applying skin deformation on geometry %s'
-                                     % n_geom.name)
-                    vertices, normals = n_geom.get_skin_deformation()
-                    for vold, vnew in zip(n_geom.data.vertices, vertices):
-                        vold.x = vnew.x
-                        vold.y = vnew.y
-                        vold.z = vnew.z
-
-            # scale tree
-            toaster = pyffi.spells.nif.NifToaster()
-            toaster.scale = self.properties.scale_correction_import
-            pyffi.spells.nif.fix.SpellScale(data=self.data, toaster=toaster).recurse()
+            # the cached file has been prepared already
+            if not cached_filepath:
+                # merge skeleton roots and transform geometry into the rest pose
+                if self.properties.merge_skeleton_roots:
+                    pyffi.spells.nif.fix.SpellMergeSkeletonRoots(data=self.data).recurse()
+                if self.properties.send_geoms_to_bind_pos:
+                    pyffi.spells.nif.fix.SpellSendGeometriesToBindPosition(data=self.data).recurse()
+                if self.properties.send_detached_geoms_to_node_pos:
+                    pyffi.spells.nif.fix.SpellSendDetachedGeometriesToNodePosition(data=self.data).recurse()
+                if self.properties.send_bones_to_bind_position:
+                    pyffi.spells.nif.fix.SpellSendBonesToBindPosition(data=self.data).recurse()
+                if self.properties.apply_skin_deformation:
+                    for n_geom in self.data.get_global_iterator():
+                        if not isinstance(n_geom, NifFormat.NiGeometry):
+                            continue
+                        if not n_geom.is_skin():
+                            continue
+                        self.info('Applying skin deformation on geometry %s'
+                                         % n_geom.name)
+                        vertices, normals = n_geom.get_skin_deformation()
+                        for vold, vnew in zip(n_geom.data.vertices, vertices):
+                            vold.x = vnew.x
+                            vold.y = vnew.y
+                            vold.z = vnew.z
+
+                # scale tree
+                toaster = pyffi.spells.nif.NifToaster()
+                toaster.scale = self.properties.scale_correction_import
+                pyffi.spells.nif.fix.SpellScale(data=self.data, toaster=toaster).recurse()
+
+                # store the prepared file for later imports
+                if nif_cache:
+                    try:
+                        nif_cache.put(cache_key, self.data)
+                    except Exception as e:
+                        # caching is optional, a failed write must not
+                        # stop the import
+                        self.warning("Could not cache file: %s" % e)
+                        nif_cache.discard(cache_key)
+
+            # look for the image files while the geometry is imported
+            if self.properties.skeleton != "SKELETON_ONLY":
+                self.textureloader.start_image_search(self.data.roots)
 
             # import all root blocks
             for block in self.data.roots:
@@ -238,13 +288,19 @@ class NifImport(NifCommon):
                                 root.remove_child(child)
                 # import this root block
                 self.debug("Root block: %s" % root.get_global_display())
+                # index the blocks of this tree by name
+                self.dict_named_blocks = nif_utils.index_block_names(root)
                 # merge animation from kf tree into nif tree
                 if self.properties.animation and self.kfdata:
                     for kf_root in self.kfdata.roots:
                         self.animationhelper.import_kf_root(kf_root, root)
                 # import the nif tree
                 self.import_root(root)
+
+            # the geometry is done, now load the pixels of the images
+            self.textureloader.load_deferred_images()
         finally:
+            self.textureloader.stop_image_search()
             # clear progress bar
             self.info("Finished")
             # XXX no longer needed?
@@ -774,7 +830,6 @@ class NifImport(NifCommon):
             % (niBlock.__class__.__name__, niBlock.name))
 
         # find unique name for Blender to use
-        uniqueInt = 0
         niName = niBlock.name.decode()
         # if name is empty, create something non-empty
         if not niName:
@@ -782,8 +837,8 @@ class NifImport(NifCommon):
                 niName = "collision"
             else:
                 niName = "noname"
-        
-        for uniqueInt in range(-1, 1000):
+
+        def make_name(uniqueInt):
             # limit name length
             if uniqueInt == -1:
                 shortName = niName[:max_length-1]
@@ -792,18 +847,14 @@ class NifImport(NifCommon):
                              % (niName[:max_length-4],
                                 uniqueInt))
             # bone naming convention for blender
-            shortName = self.get_bone_name_for_blender(shortName)
-            # make sure it is unique
-            if niName == "InvMarker":
-                if niName not in self.dict_names:
-                    break
-            if (shortName not in bpy.data.objects
-                and shortName not in bpy.data.materials
-                and shortName not in bpy.data.meshes):
-                # shortName not in use anywhere
-                break
+            return self.get_bone_name_for_blender(shortName)
+
+        if niName == "InvMarker":
+            shortName = make_name(-1)
         else:
-            raise RuntimeError("Ran out of names.")
+            # make sure it is unique
+            shortName = self.name_allocator.allocate(
+                (niName, max_length), make_name, first=-1, stop=1000)
         # save mapping
         # block niBlock has Blender name shortName
         self.dict_names[niBlock] = shortName
@@ -892,20 +943,16 @@ class NifImport(NifCommon):
             raise nif_utils.NifError("no shape data in %s" % b_name)
 
         # vertices
-        n_verts = niData.vertices
+        n_verts = mesh_utils.vectors_as_array(niData.vertices)
 
         # polygons
-        poly_gens = [list(tri) for tri in niData.get_triangles()]
+        poly_gens = np.array(niData.get_triangles(), dtype=np.int32).reshape(-1, 3)
 
         # "sticky" UV coordinates: these are transformed in Blender UV's
-        n_uv = list()
-        for i in range(len(niData.uv_sets)):
-            for lw in range(len(niData.uv_sets[i])):
-                n_uvt = list()
-                n_uvt.append(niData.uv_sets[i][lw].u)
-                n_uvt.append(1.0 - (niData.uv_sets[i][lw].v))
-                n_uv.append(tuple(n_uvt))
-        n_uvco = tuple(n_uv)
+        n_uv_sets = [np.array([(n_uv.u, 1.0 - n_uv.v) for n_uv in n_uv_set],
+                              dtype=np.float32).reshape(-1, 2)
+                     for n_uv_set in niData.uv_sets]
+        n_uvco = any(len(n_uv_set) for n_uv_set in n_uv_sets)
 
         # vertex normals
         n_norms = niData.normals
@@ -1033,144 +1080,78 @@ class NifImport(NifCommon):
             material = None
             materialIndex = 0
 
-        # v_map will store the vertex index mapping
-        # nif vertex i maps to blender vertex v_map[i]
-        v_map = [(i) for i in range(len(n_verts))] # pre-allocate memory, for faster performance
+        # b_v_map will store the vertex index mapping
+        # nif vertex i maps to blender vertex b_v_map[i]
 
         # Following code avoids introducing unwanted cracks in UV seams:
         # Construct vertex map to get unique vertex / normal pair list.
-        # We use a Python dictionary to remove doubles and to keep track of indices.
-        # While we are at it, we also add vertices while constructing the map.
-        n_map = {}
-        b_v_index = len(b_mesh.vertices)
-        for i, v in enumerate(n_verts):
-            # The key k identifies unique vertex /normal pairs.
-            # We use a tuple of ints for key, this works MUCH faster than a
-            # tuple of floats.
-            if n_norms:
-                n = n_norms[i]
-                k = (int(v.x*self.VERTEX_RESOLUTION),
-                     int(v.y*self.VERTEX_RESOLUTION),
-                     int(v.z*self.VERTEX_RESOLUTION),
-                     int(n.x*self.NORMAL_RESOLUTION),
-                     int(n.y*self.NORMAL_RESOLUTION),
-                     int(n.z*self.NORMAL_RESOLUTION))
-            else:
-                k = (int(v.x*self.VERTEX_RESOLUTION),
-                     int(v.y*self.VERTEX_RESOLUTION),
-                     int(v.z*self.VERTEX_RESOLUTION))
-            # check if vertex was already added, and if so, what index
-            try:
-                # this is the bottle neck...
-                # can we speed this up?
-                if not self.properties.combine_vertices:
-                    n_map_k = None
-                else:
-                    n_map_k = n_map[k]
-            except KeyError:
-                n_map_k = None
-            if not n_map_k:
-                # not added: new vertex / normal pair
-                n_map[k] = i         # unique vertex / normal pair with key k was added, with NIF index i
-                v_map[i] = b_v_index # NIF vertex i maps to blender vertex b_v_index
-                # add the vertex
-                if applytransform:
-                    v = mathutils.Vector([v.x, v.y, v.z])
-                    v  = v * transform
-                    b_mesh.vertices.add(1)
-                    b_mesh.vertices[-1].co = [v.x, v.y, v.z]
-                else:
-                    b_mesh.vertices.add(1)
-                    b_mesh.vertices[-1].co = [v.x, v.y, v.z]
-                # adds normal info if present (Blender recalculates these when
-                # switching between edit mode and object mode, handled further)
-                #if n_norms:
-                #    mv = b_mesh.vertices[b_v_index]
-                #    n = n_norms[i]
-                #    mv.normal = mathutils.Vector(n.x, n.y, n.z)
-                b_v_index += 1
-            else:
-                # already added
-                # NIF vertex i maps to Blender vertex v_map[n_map_k]
-                v_map[i] = v_map[n_map_k]
-        # report
-        self.debug("%i unique vertex-normal pairs" % len(n_map))
-        # release memory
-        del n_map
+        if self.properties.combine_vertices:
+            n_unique, n_remap = vertex_weld.weld_vertices(
+                coords=n_verts,
+                normals=mesh_utils.vectors_as_array(n_norms) if n_norms else None,
+                coord_epsilon=1.0 / self.VERTEX_RESOLUTION,
+                normal_epsilon=1.0 / self.NORMAL_RESOLUTION)
+            # report
+            self.debug("%i unique vertex-normal pairs" % len(n_unique))
+        else:
+            n_unique = np.arange(len(n_verts), dtype=np.int32)
+            n_remap = n_unique
 
-        # Adds the polygons to the mesh
-        f_map = [None]*len(poly_gens)
-        b_f_index = len(b_mesh.polygons)
-        bf2_index = len(b_mesh.polygons)
-        bl_index = len(b_mesh.loops)
-        poly_count = len(poly_gens)
-        b_mesh.polygons.add(poly_count)
-        b_mesh.loops.add(poly_count * 3)
-        num_new_faces = 0 # counter for debugging
-        unique_faces = list() # to avoid duplicate polygons
-        tri_point_list = list()
-        for i, f in enumerate(poly_gens):
-            # get face index
-            f_verts = [v_map[vert_index] for vert_index in f]
-            if tuple(f_verts) in unique_faces:
-                continue
-            unique_faces.append(tuple(f_verts))
-            f_map[i] = b_f_index
-            tri_point_list.append(len(poly_gens[i]))
-            ls_list = list()
-            b_f_index += 1
-            num_new_faces += 1
-        for ls1 in range(0, num_new_faces * (tri_point_list[len(ls_list)]), (tri_point_list[len(ls_list)])):
-            ls_list.append((ls1 + bl_index))
-        for i in range(len(unique_faces)):
-            if f_map[i] is None:
-                continue
-            b_mesh.polygons[f_map[i]].loop_start = ls_list[(f_map[i] - bf2_index)]
-            b_mesh.polygons[f_map[i]].loop_total = len(unique_faces[(f_map[i] - bf2_index)])
-            l = 0
-            lp_points = [v_map[loop_point] for loop_point in poly_gens[(f_map[i] - bf2_index)]]
-            while l < (len(poly_gens[(f_map[i] - bf2_index)])):
-                b_mesh.loops[(l + (bl_index))].vertex_index = lp_points[l]
-                l += 1
-            bl_index += (len(poly_gens[(f_map[i] - bf2_index)]))
-            
-        # at this point, deleted polygons (degenerate or duplicate)
-        # satisfy f_map[i] = None
+        # add the vertices, transforming them all at once if needed
+        b_verts = n_verts[n_unique]
+        if applytransform:
+            b_verts = mesh_utils.transform_coords(b_verts, transform)
+        b_v_map = mesh_utils.append_vertices(b_mesh, b_verts) + n_remap
 
+        # Adds the polygons to the mesh
+        # f_map[i] is the blender polygon for nif triangle i, or -1 for
+        # deleted polygons (degenerate or duplicate)
+        f_verts = b_v_map[poly_gens]
+        f_keep, num_duplicate, num_degenerate = mesh_utils.unique_faces(f_verts)
+        b_f_start, b_l_start = mesh_utils.append_polygons(
+            b_mesh, f_verts[f_keep])
+        num_new_faces = len(f_keep)
+        f_map = np.full(len(poly_gens), -1, dtype=np.int32)
+        f_map[f_keep] = np.arange(b_f_start, b_f_start + num_new_faces)
+        # nif vertex index of every new loop, to look up loop data
+        n_loop_verts = poly_gens[f_keep].ravel()
+
+        if num_duplicate or num_degenerate:
+            self.info("Skipped %i duplicate and %i degenerate polygons in %s"
+                      % (num_duplicate, num_degenerate, niBlock.name))
         self.debug("%i unique polygons" % num_new_faces)
 
         # set face smoothing and material
-        for b_polysmooth_index in f_map:
-            if b_polysmooth_index is None:
-                continue
-            polysmooth = b_mesh.polygons[b_polysmooth_index]
-            polysmooth.use_smooth = True if (n_norms or niBlock.skin_instance) else False
-            polysmooth.material_index = materialIndex
+        mesh_utils.set_collection_array(
+            b_mesh.polygons, "use_smooth",
+            np.full(num_new_faces, bool(n_norms or niBlock.skin_instance),
+                    dtype=bool),
+            start=b_f_start, dtype=bool)
+        mesh_utils.set_collection_array(
+            b_mesh.polygons, "material_index",
+            np.full(num_new_faces, materialIndex, dtype=np.int32),
+            start=b_f_start, dtype=np.int32)
         # vertex colors
-        
-
         if b_mesh.polygons and niData.vertex_colors:
-            n_vcol_map = list()
-            for n_vcol, n_vmap in zip(niData.vertex_colors, v_map):
-                n_vcol_map.append((n_vcol, n_vmap))
-            
+            n_vcols = np.array([(n_vcol.r, n_vcol.g, n_vcol.b, n_vcol.a)
+                                for n_vcol in niData.vertex_colors],
+                               dtype=np.float32).reshape(-1, 4)
+
             # create vertex_layers
             if not "VertexColor" in b_mesh.vertex_colors:
                 b_mesh.vertex_colors.new(name="VertexColor") # color layer
                 b_mesh.vertex_colors.new(name="VertexAlpha") # greyscale
-            
+
             # Mesh Vertex Color / Mesh Face
-            for b_polygon_loop in b_mesh.loops:
-                b_loop_index = b_polygon_loop.index
-                vcol = b_mesh.vertex_colors["VertexColor"].data[b_loop_index]
-                vcola = b_mesh.vertex_colors["VertexAlpha"].data[b_loop_index]
-                for n_col_index, n_map_index in n_vcol_map:
-                    if n_map_index == b_polygon_loop.vertex_index:
-                        col_list = n_col_index
-                        vcol.color.r = col_list.r
-                        vcol.color.g = col_list.g
-                        vcol.color.b = col_list.b
-                        vcola.color.v = col_list.a
+            # each new loop takes the color of its nif vertex; loops of
+            # previously imported shapes (group_mesh) are left untouched
+            b_loop_cols = n_vcols[n_loop_verts]
+            mesh_utils.set_collection_array(
+                b_mesh.vertex_colors["VertexColor"].data, "color",
+                b_loop_cols[:, :3], start=b_l_start)
+            mesh_utils.set_collection_array(
+                b_mesh.vertex_colors["VertexAlpha"].data, "color",
+                np.repeat(b_loop_cols[:, 3:], 3, axis=1), start=b_l_start)
             # vertex colors influence lighting...
             # we have to set the use_vertex_color_light flag on the material
             # see below
@@ -1186,34 +1167,17 @@ class NifImport(NifCommon):
         # (some corner cases have only one vertex, and no polygons,
         # and b_mesh.faceUV = 1 on such mesh raises a runtime error)
         if b_mesh.polygons:
-           
-            #b_mesh.faceUV = 1
-            #b_mesh.vertexUV = 0
-            for i in range(len(niData.uv_sets)):
+            for i, n_uv_set in enumerate(n_uv_sets):
                 # Set the face UV's for the mesh. The NIF format only supports
                 # vertex UV's, but Blender only allows explicit editing of face
                 # UV's, so load vertex UV's as face UV's
                 uvlayer = self.texturehelper.get_uv_layer_name(i)
                 if not uvlayer in b_mesh.uv_textures:
                     b_mesh.uv_textures.new(uvlayer)
-                    uv_faces = b_mesh.uv_textures.active.data[:]
-                elif uvlayer in b_mesh.uv_textures:
-                    uv_faces = b_mesh.uv_textures[uvlayer].data[:]
-                else:
-                    uv_faces = None
-                if uv_faces:
-                    uvl = b_mesh.uv_layers.active.data[:]
-                    for b_f_index, f in enumerate(poly_gens):
-                        if b_f_index is None:
-                            continue
-                        uvlist = f
-                        v1,v2,v3 = uvlist
-                        #if v3 == 0:
-                        #   v1,v2,v3 = v3,v1,v2
-                        b_poly_index = b_mesh.polygons[b_f_index + bf2_index]
-                        uvl[b_poly_index.loop_start].uv = n_uvco[v1]
-                        uvl[b_poly_index.loop_start + 1].uv = n_uvco[v2]
-                        uvl[b_poly_index.loop_start + 2].uv = n_uvco[v3]
+                if len(n_uv_set):
+                    mesh_utils.set_collection_array(
+                        b_mesh.uv_layers[uvlayer].data, "uv",
+                        n_uv_set[n_loop_verts], start=b_l_start)
             b_mesh.uv_textures.active_index = 0
 
         if material:
@@ -1235,9 +1199,8 @@ class NifImport(NifCommon):
             if mbasetex and mbasetex.texture and n_uvco:
                 imgobj = mbasetex.texture.image
                 if imgobj:
-                    for b_polyimage_index in f_map:
-                        if b_polyimage_index is None:
-                            continue
+                    for b_polyimage_index in range(
+                            b_f_start, b_f_start + num_new_faces):
                         tface = b_mesh.uv_textures.active.data[b_polyimage_index]
                         # gone in blender 2.5x+?
                         # f.mode = Blender.Mesh.FaceModes['TEX']
@@ -1256,12 +1219,18 @@ class NifImport(NifCommon):
                     continue
                 vertex_weights = boneWeights[idx].vertex_weights
                 groupname = self.dict_names[bone]
-                if not groupname in b_obj.vertex_groups.items():
+                # create vertex group if it did not exist yet
+                v_group = b_obj.vertex_groups.get(groupname)
+                if not v_group:
                     v_group = b_obj.vertex_groups.new(groupname)
-                for skinWeight in vertex_weights:
-                    vert = skinWeight.index
-                    weight = skinWeight.weight
-                    v_group.add([v_map[vert]], weight, 'REPLACE')
+                n_vert_indices = np.fromiter(
+                    (skinWeight.index for skinWeight in vertex_weights),
+                    dtype=np.int64, count=len(vertex_weights))
+                n_vert_weights = np.fromiter(
+                    (skinWeight.weight for skinWeight in vertex_weights),
+                    dtype=np.float32, count=len(vertex_weights))
+                mesh_utils.set_vertex_group_weights(
+                    v_group, b_v_map[n_vert_indices], n_vert_weights)
 
         # import body parts as vertex groups
         if isinstance(skininst, NifFormat.BSDismemberSkinInstance):
@@ -1274,16 +1243,17 @@ class NifImport(NifCommon):
                 bodypart_wrap.set_value(bodypart.body_part)
                 groupname = bodypart_wrap.get_detail_display()
                 # create vertex group if it did not exist yet
-                if not(groupname in b_obj.vertex_groups.items()):
+                v_group = b_obj.vertex_groups.get(groupname)
+                if not v_group:
                     v_group = b_obj.vertex_groups.new(groupname)
                     skinpart_index = len(skinpart_list)
                     skinpart_list.append((skinpart_index, groupname))
                     bodypart_flag.append(bodypart.part_flag)
                 # find vertex indices of this group
-                groupverts = [v_map[v_index]
-                              for v_index in skinpartblock.vertex_map]
-                # create the group
-                v_group.add(groupverts, 1, 'ADD')
+                groupverts = b_v_map[np.array(
+                    list(skinpartblock.vertex_map), dtype=np.int64)]
+                # add the vertices to the group
+                mesh_utils.set_vertex_group_weights(v_group, groupverts, 1.0)
             b_obj.niftools_part_flags_panel.pf_partcount = len(skinpart_list)
             for i,pl_name in skinpart_list:
                 b_obj_partflag = b_obj.niftools_part_flags.add()
@@ -1294,154 +1264,17 @@ class NifImport(NifCommon):
         # import morph controller
         # XXX todo: move this to import_mesh_controllers
         if self.properties.animation:
-            morphCtrl = nif_utils.find_controller(niBlock, NifFormat.NiGeomMorpherController)
-            if morphCtrl:
-                morphData = morphCtrl.data
-                if morphData.num_morphs:
-                    # insert base key at frame 1, using relative keys
-                    b_mesh.insertKey(1, 'relative')
-                    # get name for base key
-                    keyname = morphData.morphs[0].frame_name
-                    if not keyname:
-                        keyname = 'Base'
-                    # set name for base key
-                    b_mesh.key.blocks[0].name = keyname
-                    # get base vectors and import all morphs
-                    baseverts = morphData.morphs[0].vectors
-                    b_ipo = Blender.Ipo.New('Key' , 'KeyIpo')
-                    b_mesh.key.ipo = b_ipo
-                    for idxMorph in range(1, morphData.num_morphs):
-                        # get name for key
-                        keyname = morphData.morphs[idxMorph].frame_name
-                        if not keyname:
-                            keyname = 'Key %i' % idxMorph
-                        self.info("inserting key '%s'" % keyname)
-                        # get vectors
-                        morphverts = morphData.morphs[idxMorph].vectors
-                        # for each vertex calculate the key position from base
-                        # pos + delta offset
-                        assert(len(baseverts) == len(morphverts) == len(v_map))
-                        for bv, mv, b_v_index in zip(baseverts, morphverts, v_map):
-                            base = mathutils.Vector(bv.x, bv.y, bv.z)
-                            delta = mathutils.Vector(mv.x, mv.y, mv.z)
-                            v = base + delta
-                            if applytransform:
-                                v *= transform
-                            b_mesh.vertices[b_v_index].co[0] = v.x
-                            b_mesh.vertices[b_v_index].co[1] = v.y
-                            b_mesh.vertices[b_v_index].co[2] = v.z
-                        # update the mesh and insert key
-                        b_mesh.insertKey(idxMorph, 'relative')
-                        # set name for key
-                        b_mesh.key.blocks[idxMorph].name = keyname
-                        # set up the ipo key curve
-                        try:
-                            b_curve = b_ipo.addCurve(keyname)
-                        except ValueError:
-                            # this happens when two keys have the same name
-                            # an instance of this is in fallout 3
-                            # meshes/characters/_male/skeleton.nif HeadAnims:0
-                            self.warning(
-                                "skipped duplicate of key '%s'" % keyname)
-                        # no idea how to set up the bezier triples -> switching
-                        # to linear instead
-                        b_curve.interpolation = Blender.IpoCurve.InterpTypes.LINEAR
-                        # select extrapolation
-                        b_curve.extend = self.get_extend_from_flags(morphCtrl.flags)
-                        # set up the curve's control points
-                        # first find the keys
-                        # older versions store keys in the morphData
-                        morphkeys = morphData.morphs[idxMorph].keys
-                        # newer versions store keys in the controller
-                        if (not morphkeys) and morphCtrl.interpolators:
-                            morphkeys = morphCtrl.interpolators[idxMorph].data.data.keys
-                        for key in morphkeys:
-                            x =  key.value
-                            frame =  1+int(key.time * self.fps + 0.5)
-                            b_curve.addBezier( ( frame, x ) )
-                        # finally: return to base position
-                        for bv, b_v_index in zip(baseverts, v_map):
-                            base = mathutils.Vector(bv.x, bv.y, bv.z)
-                            if applytransform:
-                                base *= transform
-                            b_mesh.vertices[b_v_index].co[0] = base.x
-                            b_mesh.vertices[b_v_index].co[1] = base.y
-                            b_mesh.vertices[b_v_index].co[2] = base.z
+            self.animationhelper.morph_animation.import_morph_controller(
+                niBlock, b_obj, b_v_map,
+                transform if applytransform else None)
 
         # import facegen morphs
         if self.egmdata:
             # XXX if there is an egm, the assumption is that there is only one
             # XXX mesh in the nif
-            sym_morphs = [list(morph.get_relative_vertices())
-                          for morph in self.egmdata.sym_morphs]
-            asym_morphs = [list(morph.get_relative_vertices())
-                          for morph in self.egmdata.asym_morphs]
-
-            # insert base key at frame 1, using relative keys
-            b_mesh.insertKey(1, 'relative')
-
-            if self.IMPORT_EGMANIM:
-                # if morphs are animated: create key ipo for mesh
-                b_ipo = Blender.Ipo.New('Key' , 'KeyIpo')
-                b_mesh.key.ipo = b_ipo
-
-
-            morphs = ([(morph, "EGM SYM %i" % i)
-                       for i, morph in enumerate(sym_morphs)]
-                      +
-                      [(morph, "EGM ASYM %i" % i)
-                       for i, morph in enumerate(asym_morphs)])
-
-            for morphverts, keyname in morphs:
-                # length check disabled
-                # as sometimes, oddly, the morph has more vertices...
-                #assert(len(verts) == len(morphverts) == len(v_map))
-
-                # for each vertex calculate the key position from base
-                # pos + delta offset
-                for bv, mv, b_v_index in zip(n_verts, morphverts, v_map):
-                    base = mathutils.Vector(bv.x, bv.y, bv.z)
-                    delta = mathutils.Vector(mv[0], mv[1], mv[2])
-                    v = base + delta
-                    if applytransform:
-                        v *= transform
-                    b_mesh.vertices[b_v_index].co[0] = v.x
-                    b_mesh.vertices[b_v_index].co[1] = v.y
-                    b_mesh.vertices[b_v_index].co[2] = v.z
-                # update the mesh and insert key
-                b_mesh.insertKey(1, 'relative')
-                # set name for key
-                b_mesh.key.blocks[-1].name = keyname
-
-                if self.IMPORT_EGMANIM:
-                    # set up the ipo key curve
-                    b_curve = b_ipo.addCurve(keyname)
-                    # linear interpolation
-                    b_curve.interpolation = Blender.IpoCurve.InterpTypes.LINEAR
-                    # constant extrapolation
-                    b_curve.extend = Blender.IpoCurve.ExtendTypes.CONST
-                    # set up the curve's control points
-                    framestart = 1 + len(b_mesh.key.blocks) * 10
-                    for frame, value in ((framestart, 0),
-                                         (framestart + 5, self.IMPORT_EGMANIMSCALE),
-                                         (framestart + 10, 0)):
-                        b_curve.addBezier( ( frame, value ) )
-
-            if self.IMPORT_EGMANIM:
-                # set begin and end frame
-                self.context.scene.getRenderingContext().startFrame(1)
-                self.context.scene.getRenderingContext().endFrame(
-                    11 + len(b_mesh.key.blocks) * 10)
-
-            # finally: return to base position
-            for bv, b_v_index in zip(n_verts, v_map):
-                base = mathutils.Vector(bv.x, bv.y, bv.z)
-                if applytransform:
-                    base *= transform
-                b_mesh.vertices[b_v_index].co[0] = base.x
-                b_mesh.vertices[b_v_index].co[1] = base.y
-                b_mesh.vertices[b_v_index].co[2] = base.z
-
+            self.animationhelper.morph_animation.import_egm_morphs(
+                self.egmdata, b_obj, b_v_map, n_verts,
+                transform if applytransform else None)
 
         # import priority if existing
         if niBlock.name in self.dict_bone_priorities:
@@ -39,10 +39,14 @@
 
 import bpy
 import mathutils
+import numpy as np
 
 from pyffi.formats.nif import NifFormat
 
 from io_scene_nif.utility import nif_utils
+from io_scene_nif.utility import mesh_utils
+from io_scene_nif.utility import anim_utils
+from io_scene_nif.utility import vertex_weld
 
 class ObjectHelper():
 
@@ -100,7 +104,99 @@ class ObjectHelper():
             self.nif_export.info("Exporting %s as %s block"
                      % (b_obj, block.__class__.__name__))
         self.nif_export.dict_blocks[block] = b_obj
+        # names are usually set after registration, so blocks are added to
+        # the name index on the next lookup
+        self.nif_export.unindexed_blocks.append(block)
+        # a new block may carry a name that was looked up in vain before
+        self.nif_export.missed_block_names.clear()
+        if b_obj is not None:
+            self.nif_export.dict_object_blocks.setdefault(b_obj, []).append(block)
         return block
+
+
+    def get_blocks_by_name(self, name, block_type = NifFormat.NiNode):
+        """Return all exported blocks of a given type with a given name, in
+        the order in which they were registered.
+
+        @param name: The full nif name of the block.
+        @type name: C{str}
+        @param block_type: The nif block type.
+        @return: The list of matching blocks."""
+        self.index_block_names(self.nif_export.unindexed_blocks)
+        del self.nif_export.unindexed_blocks[:]
+        blocks = self.find_indexed_blocks(name, block_type)
+        if not blocks and name not in self.nif_export.missed_block_names:
+            # blocks may have been renamed since they were indexed, but
+            # only rebuild the index once per missing name until the next
+            # block is registered
+            self.nif_export.dict_named_blocks = {}
+            self.index_block_names(self.nif_export.dict_blocks)
+            blocks = self.find_indexed_blocks(name, block_type)
+            if not blocks:
+                self.nif_export.missed_block_names.add(name)
+        return blocks
+
+
+    def get_block_by_name(self, name, block_type = NifFormat.NiNode):
+        """Return the first exported block of a given type with a given name,
+        or C{None} if there is no such block."""
+        blocks = self.get_blocks_by_name(name, block_type)
+        if blocks:
+            return blocks[0]
+        return None
+
+
+    def get_bone_block(self, bone_name):
+        """Return the exported node of a bone.
+
+        @param bone_name: The Blender name of the bone.
+        @return: The bone's nif node."""
+        bone_blocks = self.get_blocks_by_name(self.get_full_name(bone_name))
+        if len(bone_blocks) > 1:
+            raise nif_utils.NifError(
+                "multiple bones"
+                " with name '%s': probably"
+                " you have multiple armatures,"
+                " please parent all meshes"
+                " to a single armature"
+                " and try again"
+                % bone_name)
+        if not bone_blocks:
+            raise nif_utils.NifError(
+                "Bone '%s' not found." % bone_name)
+        return bone_blocks[0]
+
+
+    def get_blocks_by_object(self, b_obj, block_type = None):
+        """Return all exported blocks associated with a Blender object,
+        optionally only those of a given type.
+
+        @param b_obj: The Blender object.
+        @param block_type: The nif block type, or C{None} for all blocks.
+        @return: The list of blocks, in the order in which they were
+            registered."""
+        return [block
+                for block in self.nif_export.dict_object_blocks.get(b_obj, ())
+                if block in self.nif_export.dict_blocks
+                and (block_type is None or isinstance(block, block_type))]
+
+
+    def index_block_names(self, blocks):
+        """Add blocks to the name index."""
+        dict_named_blocks = self.nif_export.dict_named_blocks
+        for block in blocks:
+            if isinstance(block, NifFormat.NiObjectNET):
+                dict_named_blocks.setdefault(block.name, []).append(block)
+
+
+    def find_indexed_blocks(self, name, block_type):
+        """Look up blocks in the name index, skipping stale entries."""
+        b_name = name.encode() if isinstance(name, str) else name
+        return [block
+                for block in self.nif_export.dict_named_blocks.get(b_name, ())
+                if isinstance(block, block_type)
+                and block.name == b_name
+                and block in self.nif_export.dict_blocks]
     
     
     def export_node(self, b_obj, space, parent_block, node_name):
@@ -186,7 +282,8 @@ class ObjectHelper():
             # If this has children or animations or more than one material
             # it gets wrapped in a purpose made NiNode.
             is_collision = b_obj.game.use_collision_bounds
-            has_ipo = b_obj_ipo and len(b_obj_ipo.getCurves()) > 0
+            has_ipo = bool(b_obj_ipo and b_obj_ipo.action
+                           and b_obj_ipo.action.fcurves)
             has_children = len(b_obj_children) > 0
             is_multimaterial = len(set([f.material_index for f in b_obj.data.polygons])) > 1
             # determine if object tracks camera
@@ -276,10 +373,12 @@ class ObjectHelper():
         if b_obj:
             # export animation
             if b_obj_ipo:
-                if any(
-                    b_obj_ipo[b_channel]
-                    for b_channel in (Ipo.OB_LOCX, Ipo.OB_ROTX, Ipo.OB_SCALEX)):
-                    self.animationhelper.export_keyframes(b_obj_ipo, space, node)
+                b_action = b_obj_ipo.action
+                if (b_action and
+                    self.nif_export.animationhelper.get_keyframe_fcurves(
+                        b_action)):
+                    self.nif_export.animationhelper.export_keyframes(
+                        b_action, space, node)
                 self.export_object_vis_controller(b_obj, node)
             # if it is a mesh, export the mesh as trishape children of
             # this ninode
@@ -341,6 +440,7 @@ class ObjectHelper():
             if len(line)>0:
                 name, fullname = line.split(';')
                 self.nif_export.dict_names[name] = fullname
+                self.nif_export.name_allocator.reserve(fullname)
 
     
     #TODO: get objects to store their own names.
@@ -351,8 +451,6 @@ class ObjectHelper():
 
         :param b_name: Name of object as in blender.
         :type b_name: :class:`str`
-
-        .. todo:: Refactor and simplify this code.
         """
         unique_name = "unnamed"
         if b_name:
@@ -360,13 +458,7 @@ class ObjectHelper():
         # blender bone naming -> nif bone naming
         unique_name = self.nif_export.get_bone_name_for_nif(unique_name)
         # ensure uniqueness
-        if unique_name in self.nif_export.dict_block_names or unique_name in list(self.nif_export.dict_names.values()):
-            unique_int = 0
-            old_name = unique_name
-            while unique_name in self.nif_export.dict_block_names or unique_name in list(self.nif_export.dict_names.values()):
-                unique_name = "%s.%02d" % (old_name, unique_int)
-                unique_int += 1
-        self.nif_export.dict_block_names.append(unique_name)
+        unique_name = self.nif_export.name_allocator.get_unique_name(unique_name)
         self.nif_export.dict_names[b_name] = unique_name
         return unique_name
 
@@ -468,6 +560,71 @@ class MeshHelper():
         # Non-textured materials, vertex colors are used to color the mesh
         # Textured materials, they represent lighting details
 
+        # read the mesh data in bulk, it is shared by all materials
+        b_vert_coords = mesh_utils.get_collection_array(b_mesh.vertices, "co", 3)
+        b_vert_normals = mesh_utils.get_collection_array(
+            b_mesh.vertices, "normal", 3)
+        b_loop_verts = mesh_utils.get_collection_array(
+            b_mesh.loops, "vertex_index", dtype=np.int32)
+        b_poly_normals = mesh_utils.get_collection_array(
+            b_mesh.polygons, "normal", 3)
+        b_poly_smooth = mesh_utils.get_collection_array(
+            b_mesh.polygons, "use_smooth", dtype=bool)
+        b_poly_materials = mesh_utils.get_collection_array(
+            b_mesh.polygons, "material_index", dtype=np.int32)
+        b_loop_starts = mesh_utils.get_collection_array(
+            b_mesh.polygons, "loop_start", dtype=np.int32)
+        b_loop_totals = mesh_utils.get_collection_array(
+            b_mesh.polygons, "loop_total", dtype=np.int32)
+        b_loop_uvs = {} # uv layer name -> uv of each loop, read when needed
+        if mesh_hasvcol:
+            b_loop_colors = np.ones((len(b_mesh.loops), 4), dtype=np.float32)
+            b_loop_colors[:, :3] = mesh_utils.get_collection_array(
+                b_mesh.vertex_colors[0].data, "color", 3)
+            if mesh_hasvcola:
+                # alpha is the value of the second layer
+                b_loop_colors[:, 3] = mesh_utils.get_collection_array(
+                    b_mesh.vertex_colors[1].data, "color", 3).max(axis=1)
+
+        # list of body part (name, index) in this mesh
+        bodypartgroups = []
+        group_bodyparts = {} # vertex group index -> body part position
+        for bodypartgroupname in NifFormat.BSDismemberBodyPartType().get_editor_keys():
+            vertex_group = b_obj.vertex_groups.get(bodypartgroupname)
+            if vertex_group:
+                self.nif_export.debug("Found body part %s" % bodypartgroupname)
+                group_bodyparts[vertex_group.index] = len(bodypartgroups)
+                bodypartgroups.append(
+                    [bodypartgroupname,
+                     getattr(NifFormat.BSDismemberBodyPartType,
+                             bodypartgroupname)])
+        # for each vertex, a mask of the body parts it belongs to,
+        # found in a single sweep over the vertex groups
+        b_vert_bodyparts = np.zeros((len(b_mesh.vertices), len(bodypartgroups)),
+                                    dtype=bool)
+        if bodypartgroups:
+            bodypart_verts = []
+            bodypart_indices = []
+            for b_vert in b_mesh.vertices:
+                for b_groupname in b_vert.groups:
+                    bodypart_index = group_bodyparts.get(b_groupname.group)
+                    if bodypart_index is not None:
+                        bodypart_verts.append(b_vert.index)
+                        bodypart_indices.append(bodypart_index)
+            b_vert_bodyparts[bodypart_verts, bodypart_indices] = True
+
+        # bucket the polygons by material in a single pass, keeping their
+        # order; degenerate polygons are ignored
+        b_valid_polys = np.flatnonzero(b_loop_totals >= 3)
+        b_material_polys = b_valid_polys[np.argsort(
+            b_poly_materials[b_valid_polys], kind="mergesort")]
+        b_material_bounds = np.searchsorted(
+            b_poly_materials[b_material_polys],
+            np.arange(len(mesh_materials) + 1))
+
+        # skin weights, gathered when the first skinned trishape is exported
+        skin_weights = None
+
         # let's now export one trishape for every mesh material
         ### TODO: needs refactoring - move material, texture, etc.
         ### to separate function
@@ -543,27 +700,6 @@ class MeshHelper():
                 mesh_haswire = (b_mat.type == 'WIRE')
             
                     
-            # list of body part (name, index, vertices) in this mesh
-            bodypartgroups = []
-            for bodypartgroupname in NifFormat.BSDismemberBodyPartType().get_editor_keys():
-                vertex_group = b_obj.vertex_groups.get(bodypartgroupname)
-                vertices_list = set()
-                if vertex_group:
-                    for b_vert in b_mesh.vertices:
-                        for b_groupname in b_vert.groups:
-                            if b_groupname.group == vertex_group.index:
-                                vertices_list.add(b_vert.index)
-                    self.nif_export.debug("Found body part %s" % bodypartgroupname)
-                    bodypartgroups.append(
-                        [bodypartgroupname,
-                         getattr(NifFormat.BSDismemberBodyPartType,
-                                 bodypartgroupname),
-                                 vertices_list])
-                         
-
-
-
-
             # note: we can be in any of the following five situations
             # material + base texture        -> normal object
             # material + base tex + glow tex -> normal glow mapped object
@@ -778,145 +914,117 @@ class MeshHelper():
             # produce lists of vertices, uv-vertices, normals, vertex colors, and face indices.
             
             mesh_uvlayers = self.nif_export.texturehelper.get_uv_layers(b_mat)
-            vertquad_list = [] # (vertex, uv coordinate, normal, vertex color) list
-            vertmap = [None for i in range(len(b_mesh.vertices))] # blender vertex -> nif vertices
-            vertlist = []
-            normlist = []
-            vcollist = []
-            uvlist = []
-            trilist = []
             # for each face in trilist, a body part index
             bodypartfacemap = []
             polygons_without_bodypart = []
-            for poly in b_mesh.polygons:
-                
-                # does the face belong to this trishape?
-                if (b_mat != None): # we have a material
-                    if (poly.material_index != materialIndex): # but this face has another material
-                        continue # so skip this face
-                    
-                f_numverts = len(poly.vertices)
-                if (f_numverts < 3): continue # ignore degenerate polygons
-                assert((f_numverts == 3) or (f_numverts == 4)) # debug
-                if mesh_uvlayers:
-                    # if we have uv coordinates
-                    # double check that we have uv data
-                    if not b_mesh.uv_layer_stencil:
-                        raise nif_utils.NifError(
-                            "ERROR%t|Create a UV map for every texture,"
-                            " and run the script again.")
-                # find (vert, uv-vert, normal, vcol) quad, and if not found, create it
-                f_index = [ -1 ] * f_numverts
-                for i, loop_index in enumerate(
-                                    range(poly.loop_start, poly.loop_start + poly.loop_total)):
-                    
-                    fv_index = b_mesh.loops[loop_index].vertex_index
-                    vertex = b_mesh.vertices[fv_index]
-                    vertex_index = vertex.index
-                    fv = vertex.co
-                    #smooth = vertex normal, non-smooth = face normal)
-                    if mesh_hasnormals:
-                        if poly.use_smooth:
-                            fn = vertex.normal
-                        else:
-                            fn = poly.normal
-                    else:
-                        fn = None
-                        
-                    fuv = []
-                    for uvlayer in mesh_uvlayers:
-                        if uvlayer != "":
-                            #TODO: map uv layer to index
-                            #currently we have uv_layer names, but we need their index value
-                            #b_mesh.uv_layers[0].data[poly.index].uv
-                            fuv.append(b_mesh.uv_layers[uvlayer].data[loop_index].uv)
-                        else:
-                            raise nif_utils.NifError(
-                                "ERROR%t|Texture is set to use UV"
-                                " but no UV Map is Selected for"
-                                " Mapping > Map")
-                    fcol = None
-
-                    '''TODO: Need to map b_verts -> n_verts'''
-                    if mesh_hasvcol:
-                        #check for an alpha layer
-                        b_color = b_mesh.vertex_colors[0].data[loop_index].color
-                        if(mesh_hasvcola):
-                            b_alpha = b_mesh.vertex_colors[1].data[loop_index].color
-                            fcol = [b_color.r, b_color.g, b_color.b, b_alpha.v]
-                        else:
-                            fcol = [b_color.r, b_color.g, b_color.b, 1.0]
-                    else:
-                        fcol = None
-
-                    vertquad = ( fv, fuv, fn, fcol )
-
-                    # check for duplicate vertquad?
-                    f_index[i] = len(vertquad_list)
-                    if vertmap[vertex_index]:
-                        # iterate only over vertices with the same vertex index
-                        # and check if they have the same uvs, normals and colors
-                        for j in vertmap[vertex_index]:
-                            if mesh_uvlayers:
-                                if max(abs(vertquad[1][uvlayer][0] - vertquad_list[j][1][uvlayer][0])
-                                       for uvlayer in range(len(mesh_uvlayers))) \
-                                       > self.properties.epsilon:
-                                    continue
-                                if max(abs(vertquad[1][uvlayer][1] - vertquad_list[j][1][uvlayer][1])
-                                       for uvlayer in range(len(mesh_uvlayers))) \
-                                       > self.properties.epsilon:
-                                    continue
-                            if mesh_hasnormals:
-                                if abs(vertquad[2][0] - vertquad_list[j][2][0]) > self.properties.epsilon: continue
-                                if abs(vertquad[2][1] - vertquad_list[j][2][1]) > self.properties.epsilon: continue
-                                if abs(vertquad[2][2] - vertquad_list[j][2][2]) > self.properties.epsilon: continue
-                            if mesh_hasvcol:
-                                if abs(vertquad[3][0] - vertquad_list[j][3][0]) > self.properties.epsilon: continue
-                                if abs(vertquad[3][1] - vertquad_list[j][3][1]) > self.properties.epsilon: continue
-                                if abs(vertquad[3][2] - vertquad_list[j][3][2]) > self.properties.epsilon: continue
-                                if abs(vertquad[3][3] - vertquad_list[j][3][3]) > self.properties.epsilon: continue
-                            # all tests passed: so yes, we already have it!
-                            f_index[i] = j
-                            break
-
-                    if f_index[i] > 65535:
-                        raise nif_utils.NifError(
-                            "ERROR%t|Too many vertices. Decimate your mesh"
-                            " and try again.")
-                    if (f_index[i] == len(vertquad_list)):
-                        # first: add it to the vertex map
-                        if not vertmap[vertex_index]:
-                            vertmap[vertex_index] = []
-                        vertmap[vertex_index].append(len(vertquad_list))
-                        # new (vert, uv-vert, normal, vcol) quad: add it
-                        vertquad_list.append(vertquad)
-                        # add the vertex
-                        vertlist.append(vertquad[0])
-                        if mesh_hasnormals: normlist.append(vertquad[2])
-                        if mesh_hasvcol:    vcollist.append(vertquad[3])
-                        if mesh_uvlayers:   uvlist.append(vertquad[1])
-
-                # now add the (hopefully, convex) face, in triangles
-                for i in range(f_numverts - 2):
-                    if ((b_obj.scale.x + b_obj.scale.y + b_obj.scale.z) > 0):
-                        f_indexed = (f_index[0], f_index[1+i], f_index[2+i])
-                    else:
-                        f_indexed = (f_index[0], f_index[2+i], f_index[1+i])
-                    trilist.append(f_indexed)
-                    # add body part number
-                    if (self.properties.game not in ('FALLOUT_3','SKYRIM')
-                        or not bodypartgroups):
-                        # TODO: or not self.EXPORT_FO3_BODYPARTS):
-                        bodypartfacemap.append(0)
-                    else:
-                        for bodypartname, bodypartindex, bodypartverts in bodypartgroups:
-                            if (set(b_vert_index for b_vert_index in poly.vertices)
-                                <= bodypartverts):
-                                bodypartfacemap.append(bodypartindex)
-                                break
-                        else:
-                            # this signals an error
-                            polygons_without_bodypart.append(poly)
+
+            # the faces which belong to this trishape
+            if (b_mat != None): # we have a material
+                poly_sel = b_material_polys[
+                    b_material_bounds[materialIndex]:b_material_bounds[materialIndex + 1]]
+            else:
+                poly_sel = b_valid_polys
+            if not len(poly_sel):
+                continue # m_4444x: skip 'empty' material indices
+            poly_totals = b_loop_totals[poly_sel]
+            assert(np.all(poly_totals <= 4)) # debug
+            if mesh_uvlayers:
+                # if we have uv coordinates
+                # double check that we have uv data
+                if not b_mesh.uv_layer_stencil:
+                    raise nif_utils.NifError(
+                        "ERROR%t|Create a UV map for every texture,"
+                        " and run the script again.")
+                if "" in mesh_uvlayers:
+                    raise nif_utils.NifError(
+                        "ERROR%t|Texture is set to use UV"
+                        " but no UV Map is Selected for"
+                        " Mapping > Map")
+
+            # every corner of the selected polygons, in order
+            corner_polys = np.repeat(poly_sel, poly_totals)
+            corner_firsts = np.cumsum(poly_totals) - poly_totals
+            corner_loops = mesh_utils.get_corner_loops(
+                b_loop_starts[poly_sel], poly_totals)
+            corner_verts = b_loop_verts[corner_loops]
+
+            # (vert, uv-vert, normal, vcol) of each corner
+            corner_coords = b_vert_coords[corner_verts]
+            corner_normals = None
+            if mesh_hasnormals:
+                #smooth = vertex normal, non-smooth = face normal)
+                corner_normals = np.where(
+                    b_poly_smooth[corner_polys][:, np.newaxis],
+                    b_vert_normals[corner_verts],
+                    b_poly_normals[corner_polys])
+            corner_uvs = []
+            for uvlayer in mesh_uvlayers:
+                if uvlayer not in b_loop_uvs:
+                    b_loop_uvs[uvlayer] = mesh_utils.get_collection_array(
+                        b_mesh.uv_layers[uvlayer].data, "uv", 2)
+                corner_uvs.append(b_loop_uvs[uvlayer][corner_loops])
+            corner_colors = None
+            if mesh_hasvcol:
+                corner_colors = b_loop_colors[corner_loops]
+
+            # find unique (vert, uv-vert, normal, vcol) quads: corners of the
+            # same blender vertex are welded if their uvs, normals and colors
+            # match
+            vertquad_unique, vertquad_remap = vertex_weld.weld_vertices(
+                normals=corner_normals, uvs=corner_uvs, colors=corner_colors,
+                ids=corner_verts,
+                normal_epsilon=self.properties.epsilon,
+                uv_epsilon=self.properties.epsilon,
+                color_epsilon=self.properties.epsilon)
+            if len(vertquad_unique) > 65536:
+                raise nif_utils.NifError(
+                    "ERROR%t|Too many vertices. Decimate your mesh"
+                    " and try again.")
+            # blender vertex of every nif vertex
+            vert_b_indices = corner_verts[vertquad_unique]
+            vertlist = corner_coords[vertquad_unique]
+            if mesh_hasnormals:
+                normlist = corner_normals[vertquad_unique]
+            if mesh_hasvcol:
+                vcollist = corner_colors[vertquad_unique]
+            uvlist = [corner_uv[vertquad_unique] for corner_uv in corner_uvs]
+
+            # now add the (hopefully, convex) face, in triangles
+            tri_totals = poly_totals - 2
+            tri_polys = np.repeat(np.arange(len(poly_sel)), tri_totals)
+            tri_offsets = (np.arange(len(tri_polys))
+                           - np.repeat(np.cumsum(tri_totals) - tri_totals,
+                                       tri_totals))
+            tri_firsts = corner_firsts[tri_polys]
+            if ((b_obj.scale.x + b_obj.scale.y + b_obj.scale.z) > 0):
+                tri_corners = (tri_firsts, tri_firsts + 1 + tri_offsets,
+                               tri_firsts + 2 + tri_offsets)
+            else:
+                tri_corners = (tri_firsts, tri_firsts + 2 + tri_offsets,
+                               tri_firsts + 1 + tri_offsets)
+            trilist = [tuple(tri) for tri in np.column_stack(
+                [vertquad_remap[corners] for corners in tri_corners]).tolist()]
+
+            # add body part number
+            if (self.properties.game not in ('FALLOUT_3','SKYRIM')
+                or not bodypartgroups):
+                # TODO: or not self.EXPORT_FO3_BODYPARTS):
+                bodypartfacemap = [0] * len(trilist)
+            else:
+                # a face belongs to the first body part which contains all
+                # of its vertices
+                poly_bodyparts = np.logical_and.reduceat(
+                    b_vert_bodyparts[corner_verts], corner_firsts, axis=0)
+                poly_has_bodypart = poly_bodyparts.any(axis=1)
+                bodypart_values = np.array(
+                    [bodypartindex for bodypartname, bodypartindex in bodypartgroups])
+                bodypartfacemap = np.repeat(
+                    bodypart_values[poly_bodyparts.argmax(axis=1)],
+                    tri_totals).tolist()
+                # this signals an error
+                polygons_without_bodypart = [
+                    b_mesh.polygons[poly_index]
+                    for poly_index in poly_sel[~poly_has_bodypart].tolist()]
 
             # check that there are no missing body part polygons
             if polygons_without_bodypart:
@@ -969,30 +1077,21 @@ class MeshHelper():
             tridata.num_vertices = len(vertlist)
             tridata.has_vertices = True
             tridata.vertices.update_size()
-            for i, v in enumerate(tridata.vertices):
-                v.x = vertlist[i][0]
-                v.y = vertlist[i][1]
-                v.z = vertlist[i][2]
+            for v, co in zip(tridata.vertices, vertlist.tolist()):
+                v.x, v.y, v.z = co
             tridata.update_center_radius()
 
             if mesh_hasnormals:
                 tridata.has_normals = True
                 tridata.normals.update_size()
-                for i, v in enumerate(tridata.normals):
-                    v.x = normlist[i][0]
-                    v.y = normlist[i][1]
-                    v.z = normlist[i][2]
+                for v, norm in zip(tridata.normals, normlist.tolist()):
+                    v.x, v.y, v.z = norm
 
             if mesh_hasvcol:
                 tridata.has_vertex_colors = True
                 tridata.vertex_colors.update_size()
-                for i, v in enumerate(tridata.vertex_colors):
-
-
-                    v.r = vcollist[i][0]
-                    v.g = vcollist[i][1]
-                    v.b = vcollist[i][2]
-                    v.a = vcollist[i][3]
+                for v, col in zip(tridata.vertex_colors, vcollist.tolist()):
+                    v.r, v.g, v.b, v.a = col
 
             if mesh_uvlayers:
                 tridata.num_uv_sets = len(mesh_uvlayers)
@@ -1003,10 +1102,10 @@ class MeshHelper():
                             "Fallout 3 does not support multiple UV layers")
                 tridata.has_uv = True
                 tridata.uv_sets.update_size()
-                for j, uvlayer in enumerate(mesh_uvlayers):
-                    for i, uv in enumerate(tridata.uv_sets[j]):
-                        uv.u = uvlist[i][j][0]
-                        uv.v = 1.0 - uvlist[i][j][1] # opengl standard
+                for n_uv_set, b_uvs in zip(tridata.uv_sets, uvlist):
+                    for uv, (b_u, b_v) in zip(n_uv_set, b_uvs.tolist()):
+                        uv.u = b_u
+                        uv.v = 1.0 - b_v # opengl standard
 
             # set triangles
             # stitch strips for civ4
@@ -1046,12 +1145,9 @@ class MeshHelper():
                         else:
                             skininst = self.nif_export.objecthelper.create_block("NiSkinInstance", b_obj)
                         trishape.skin_instance = skininst
-                        for block in self.nif_export.dict_blocks:
-                            if isinstance(block, NifFormat.NiNode):
-                                if block.name.decode() == self.nif_export.objecthelper.get_full_name(armaturename):
-                                    skininst.skeleton_root = block
-                                    break
-                        else:
+                        skininst.skeleton_root = self.nif_export.objecthelper.get_block_by_name(
+                            self.nif_export.objecthelper.get_full_name(armaturename))
+                        if not skininst.skeleton_root:
                             raise nif_utils.NifError(
                                 "Skeleton root '%s' not found."
                                 % armaturename)
@@ -1066,42 +1162,19 @@ class MeshHelper():
                         skindata.set_transform(
                             self.nif_export.get_object_matrix(b_obj, 'localspace').get_inverse())
                        
-                        # Vertex weights,  find weights and normalization factors
-                        vert_list = {}
-                        vert_norm = {}
-                        unassigned_verts = []
-                                                
-                        for bone_group in boneinfluences:
-                            b_list_weight = []
-                            b_vert_group = b_obj.vertex_groups[bone_group]
-                            
-                            for b_vert in b_obj.data.vertices:
-                                if len(b_vert.groups) == 0: #check vert has weight_groups
-                                    unassigned_verts.append(b_vert)
-                                    continue
-                                
-                                for g in b_vert.groups:
-                                    if b_vert_group.name in boneinfluences:
-                                        if g.group == b_vert_group.index:
-                                            b_list_weight.append((b_vert.index, g.weight))
-                                            break
-                                                
-                            vert_list[bone_group] = b_list_weight             
-                            
-                            #create normalisation groupings
-                            for v in vert_list[bone_group]:
-                                if v[0] in vert_norm:
-                                    vert_norm[v[0]] += v[1]
-                                else:
-                                    vert_norm[v[0]] = v[1]
-                        
+                        # Vertex weights, find weights and normalization factors
+                        # (shared by all materials of the mesh)
+                        if skin_weights is None:
+                            skin_weights = self.get_skin_weights(b_obj, boneinfluences)
+                        bone_weights, unassigned_verts = skin_weights
+
                         # vertices must be assigned at least one vertex group
                         # lets be nice and display them for the user 
                         if len(unassigned_verts) > 0:
                             for b_scene_obj in self.nif_export.context.scene.objects:
                                 b_scene_obj.select = False
                                 
-                            b_obj = self.nif_export.context.scene.objects.active
+                            self.nif_export.context.scene.objects.active = b_obj
                             b_obj.select = True
                             
                             # switch to edit mode and raise exception
@@ -1113,55 +1186,37 @@ class MeshHelper():
                                 
                             raise nif_utils.NifError(
                                 "Cannot export mesh with unweighted vertices."
-                                " The unweighted vertices have been selected"
+                                " The %i unweighted vertices have been selected"
                                 " in the mesh so they can easily be"
-                                " identified.")
+                                " identified." % len(unassigned_verts))
                         
                         
                         # for each bone, first we get the bone block
                         # then we get the vertex weights
                         # and then we add it to the NiSkinData
-                        # note: allocate memory for faster performance
-                        vert_added = [False for i in range(len(vertlist))]
-                        for bone_index, bone in enumerate(boneinfluences):
+                        # the original vertex of each exported vertex
+                        vertquad_bverts = corner_verts[vertquad_unique]
+                        bvert_weights = np.zeros(len(b_mesh.vertices))
+                        bvert_weighted = np.zeros(len(b_mesh.vertices), dtype=bool)
+                        for bone, (w_verts, w_weights) in zip(boneinfluences, bone_weights):
                             # find bone in exported blocks
-                            bone_block = None
-                            for block in self.nif_export.dict_blocks:
-                                if isinstance(block, NifFormat.NiNode):
-                                    if block.name.decode() == self.nif_export.objecthelper.get_full_name(bone):
-                                        if not bone_block:
-                                            bone_block = block
-                                        else:
-                                            raise nif_utils.NifError(
-                                                "multiple bones"
-                                                " with name '%s': probably"
-                                                " you have multiple armatures,"
-                                                " please parent all meshes"
-                                                " to a single armature"
-                                                " and try again"
-                                                % bone)
-                            
-                            if not bone_block:
-                                raise nif_utils.NifError(
-                                    "Bone '%s' not found." % bone)
-                            
+                            bone_block = self.nif_export.objecthelper.get_bone_block(bone)
+
                             # find vertex weights
-                            vert_weights = {}
-                            for v in vert_list[bone]:
-                                # v[0] is the original vertex index
-                                # v[1] is the weight
-
-                                # vertmap[v[0]] is the set of vertices (indices)
-                                # to which v[0] was mapped
-                                # so we simply export the same weight as the
-                                # original vertex for each new vertex
-
-                                # write the weights
-                                # extra check for multi material meshes
-                                if vertmap[v[0]] and vert_norm[v[0]]:
-                                    for vert_index in vertmap[v[0]]:
-                                        vert_weights[vert_index] = v[1] / vert_norm[v[0]]
-                                        vert_added[vert_index] = True
+                            # we simply export the same weight as the
+                            # original vertex for each new vertex to which
+                            # it was mapped; the vertex may not be in this
+                            # material at all (multi material meshes)
+                            bvert_weights[w_verts] = w_weights
+                            bvert_weighted[w_verts] = True
+                            vert_indices = np.flatnonzero(bvert_weighted[vertquad_bverts])
+                            # keep the order of the original vertices
+                            vert_indices = vert_indices[np.argsort(
+                                vertquad_bverts[vert_indices], kind="mergesort")]
+                            vert_weights = dict(zip(
+                                vert_indices.tolist(),
+                                bvert_weights[vertquad_bverts[vert_indices]].tolist()))
+                            bvert_weighted[w_verts] = False
                             # add bone as influence, but only if there were
                             # actually any vertices influenced by the bone
                             if vert_weights:
@@ -1237,7 +1292,6 @@ class MeshHelper():
 
                         # clean up
                         del vert_weights
-                        del vert_added
 
 
             # shape key morphing
@@ -1248,21 +1302,21 @@ class MeshHelper():
                     # export as egm, or as morphdata?
                     if key.key_blocks[1].name.startswith("EGM"):
                         # egm export!
-                        self.exportEgm(key.key_blocks)
-                    elif key.ipo:
+                        self.nif_export.exportEgm(key.key_blocks)
+                    elif key.animation_data and key.animation_data.action:
                         # regular morphdata export
-                        # (there must be a shape ipo)
-                        keyipo = key.ipo
+                        # (there must be a shape key action)
+                        b_action = key.animation_data.action
                         # check that they are relative shape keys
-                        if not key.relative:
-                            # XXX if we do "key.relative = True"
+                        if not key.use_relative:
+                            # XXX if we do "key.use_relative = True"
                             # XXX would this automatically fix the keys?
                             raise ValueError(
                                 "Can only export relative shape keys.")
 
                         # create geometry morph controller
                         morphctrl = self.nif_export.objecthelper.create_block(
-                                                    "NiGeomMorpherController", keyipo)
+                                                    "NiGeomMorpherController", b_action)
                         trishape.add_controller(morphctrl)
                         morphctrl.target = trishape
                         morphctrl.frequency = 1.0
@@ -1273,7 +1327,7 @@ class MeshHelper():
 
                         # create geometry morph data
                         morphdata = self.nif_export.objecthelper.create_block(
-                                                                "NiMorphData", keyipo)
+                                                                "NiMorphData", b_action)
                         morphctrl.data = morphdata
                         morphdata.num_morphs = len(key.key_blocks)
                         morphdata.num_vertices = len(vertlist)
@@ -1292,32 +1346,30 @@ class MeshHelper():
                         morphctrl.num_unknown_ints = len(key.key_blocks)
                         morphctrl.unknown_ints.update_size()
 
+                        # export morphed vertices: the base key holds
+                        # absolute positions, the other keys hold offsets
+                        # from the mesh vertices, all in nif vertex order
+                        morph_coords = np.array(
+                            [mesh_utils.get_collection_array(
+                                keyblock.data, "co", 3)
+                             for keyblock in key.key_blocks])
+                        morph_coords[1:] -= b_vert_coords
+                        morph_coords = morph_coords[:, vert_b_indices]
+
                         for keyblocknum, keyblock in enumerate(key.key_blocks):
-                            # export morphed vertices
                             morph = morphdata.morphs[keyblocknum]
                             morph.frame_name = keyblock.name
                             self.nif_export.info("Exporting morph %s: vertices"
                                              % keyblock.name)
                             morph.arg = morphdata.num_vertices
                             morph.vectors.update_size()
-                            for b_v_index, (vert_indices, vert) \
-                                in enumerate(list(zip(vertmap, keyblock.data))):
-                                # vertmap check
-                                if not vert_indices:
-                                    continue
-                                # copy vertex and assign morph vertex
-                                mv = vert.copy()
-                                if keyblocknum > 0:
-                                    mv.x -= b_mesh.vertices[b_v_index].co.x
-                                    mv.y -= b_mesh.vertices[b_v_index].co.y
-                                    mv.z -= b_mesh.vertices[b_v_index].co.z
-                                for vert_index in vert_indices:
-                                    morph.vectors[vert_index].x = mv.x
-                                    morph.vectors[vert_index].y = mv.y
-                                    morph.vectors[vert_index].z = mv.z
-
-                            # export ipo shape key curve
-                            curve = keyipo[keyblock.name]
+                            for v, co in zip(morph.vectors,
+                                             morph_coords[keyblocknum].tolist()):
+                                v.x, v.y, v.z = co
+
+                            # export shape key influence curve
+                            curve = anim_utils.find_fcurve(
+                                b_action, 'key_blocks["%s"].value' % keyblock.name)
 
                             # create interpolator for shape key
                             # (needs to be there even if there is no curve)
@@ -1339,32 +1391,25 @@ class MeshHelper():
                             # written to the file
                             self.nif_export.info("Exporting morph %s: curve"
                                              % keyblock.name)
-                            interpol.data = self.nif_export.objecthelper.create_block("NiFloatData", curve)
+                            interpol.data = self.nif_export.objecthelper.create_block("NiFloatData", b_action)
                             floatdata = interpol.data.data
-                            if curve.getExtrapolation() == "Constant":
-                                ctrlFlags = 0x000c
-                            elif curve.getExtrapolation() == "Cyclic":
-                                ctrlFlags = 0x0008
-                            morph.interpolation = NifFormat.KeyType.LINEAR_KEY
-                            morph.num_keys = len(curve.getPoints())
-                            morph.keys.update_size()
-                            floatdata.interpolation = NifFormat.KeyType.LINEAR_KEY
-                            floatdata.num_keys = len(curve.getPoints())
-                            floatdata.keys.update_size()
-                            for i, btriple in enumerate(curve.getPoints()):
-                                knot = btriple.getPoints()
-                                morph.keys[i].arg = morph.interpolation
-                                morph.keys[i].time = (knot[0] - self.context.scene.frame_start) * self.context.scene.render.fps
-                                morph.keys[i].value = curve.evaluate( knot[0] )
-                                #morph.keys[i].forwardTangent = 0.0 # ?
-                                #morph.keys[i].backwardTangent = 0.0 # ?
-                                floatdata.keys[i].arg = floatdata.interpolation
-                                floatdata.keys[i].time = (knot[0] - self.context.scene.frame_start) * self.context.scene.render.fps
-                                floatdata.keys[i].value = curve.evaluate( knot[0] )
-                                #floatdata.keys[i].forwardTangent = 0.0 # ?
-                                #floatdata.keys[i].backwardTangent = 0.0 # ?
-                                ctrlStart = min(ctrlStart, morph.keys[i].time)
-                                ctrlStop  = max(ctrlStop,  morph.keys[i].time)
+                            ctrlFlags = 0x0008 | self.nif_export.animationhelper.get_flags_from_extend(
+                                anim_utils.get_fcurve_extend(curve))
+                            times, values = anim_utils.get_fcurve_keys(
+                                curve, self.nif_export.context.scene.render.fps)
+                            times = times.tolist()
+                            values = values.tolist()
+                            for keys in (morph, floatdata):
+                                keys.interpolation = NifFormat.KeyType.LINEAR_KEY
+                                keys.num_keys = len(times)
+                                keys.keys.update_size()
+                                for n_key, time, value in zip(keys.keys, times, values):
+                                    n_key.arg = keys.interpolation
+                                    n_key.time = time
+                                    n_key.value = value
+                            if times:
+                                ctrlStart = min(ctrlStart, times[0])
+                                ctrlStop = max(ctrlStop, times[-1])
                         morphctrl.flags = ctrlFlags
                         morphctrl.start_time = ctrlStart
                         morphctrl.stop_time = ctrlStop
@@ -1372,54 +1417,105 @@ class MeshHelper():
                         tridata.consistency_flags = b_obj.niftools.consistency_flags
 
 
+    def get_skin_weights(self, b_obj, bone_names):
+        """Gather the weights of the vertex groups of the given bones in a
+        single sweep over the mesh vertices, and normalise them so that
+        the weights of each vertex add up to one.
+
+        :param b_obj: The mesh object.
+        :type b_obj: :class:`bpy.types.Object`
+        :param bone_names: Names of the bones that influence the mesh.
+        :type bone_names: :class:`list` of :class:`str`
+        :return: For each bone, the Blender vertex indices and normalised
+            weights, and the indices of vertices without any vertex group.
+        """
+        group_bones = {b_obj.vertex_groups[bone_name].index: bone_index
+                       for bone_index, bone_name in enumerate(bone_names)}
+        w_bones = []
+        w_verts = []
+        w_weights = []
+        unassigned_verts = []
+        for b_vert in b_obj.data.vertices:
+            if not b_vert.groups: #check vert has weight_groups
+                unassigned_verts.append(b_vert.index)
+                continue
+            for g in b_vert.groups:
+                bone_index = group_bones.get(g.group)
+                if bone_index is not None:
+                    w_bones.append(bone_index)
+                    w_verts.append(b_vert.index)
+                    w_weights.append(g.weight)
+        # sparse bone x vertex matrix, sorted by bone
+        order = np.argsort(w_bones, kind="mergesort")
+        w_bones = np.array(w_bones, dtype=np.int32)[order]
+        w_verts = np.array(w_verts, dtype=np.int32)[order]
+        w_weights = np.array(w_weights, dtype=np.float64)[order]
+        # normalise; vertices whose weights add up to zero are skipped
+        vert_norm = np.bincount(w_verts, weights=w_weights,
+                                minlength=len(b_obj.data.vertices))
+        w_norms = vert_norm[w_verts]
+        w_keep = (w_norms != 0)
+        w_bones = w_bones[w_keep]
+        w_verts = w_verts[w_keep]
+        w_weights = w_weights[w_keep] / w_norms[w_keep]
+        bounds = np.searchsorted(w_bones, np.arange(len(bone_names) + 1))
+        bone_weights = [(w_verts[start:stop], w_weights[start:stop])
+                        for start, stop in zip(bounds[:-1], bounds[1:])]
+        return bone_weights, np.array(unassigned_verts, dtype=np.int32)
+
+
     def smooth_mesh_seams(self, b_objs):
         # get shared vertices
         self.nif_export.info("Smoothing seams between objects...")
-        vdict = {}
-        for b_obj in [b_obj for b_obj in b_objs if b_obj.type == 'MESH']:
-            b_mesh = b_obj.data
-            # for vertex in b_mesh.vertices:
-            #    vertex.sel = False
-            for poly in b_mesh.polygons:
-                for loop_index in range(poly.loop_start, poly.loop_start + poly.loop_total):
-                    pv_index = b_mesh.loops[loop_index].vertex_index
-                    vertex = b_mesh.vertices[pv_index]
-                    vertex_vec = vertex.co
-                    vkey = (int(vertex_vec[0]*self.nif_export.VERTEX_RESOLUTION),
-                            int(vertex_vec[1]*self.nif_export.VERTEX_RESOLUTION),
-                            int(vertex_vec[2]*self.nif_export.VERTEX_RESOLUTION))
-                    try:
-                        vdict[vkey].append((vertex, poly, b_mesh))
-                    except KeyError:
-                        vdict[vkey] = [(vertex, poly, b_mesh)]
+        b_meshes = [b_obj.data for b_obj in b_objs if b_obj.type == 'MESH']
+        # for each polygon corner: its position, the normal of its polygon,
+        # and the mesh and vertex it belongs to
+        corner_coords = []
+        corner_normals = []
+        corner_meshes = []
+        corner_verts = []
+        for mesh_index, b_mesh in enumerate(b_meshes):
+            corner_polys, corner_loops = mesh_utils.get_polygon_corners(b_mesh)
+            loop_verts = mesh_utils.get_collection_array(
+                b_mesh.loops, "vertex_index", dtype=np.int32)[corner_loops]
+            corner_coords.append(mesh_utils.get_collection_array(
+                b_mesh.vertices, "co", 3)[loop_verts])
+            corner_normals.append(mesh_utils.get_collection_array(
+                b_mesh.polygons, "normal", 3)[corner_polys])
+            corner_meshes.append(np.full(len(loop_verts), mesh_index,
+                                         dtype=np.int32))
+            corner_verts.append(loop_verts)
+        if not b_meshes:
+            corner_coords = [np.empty((0, 3), dtype=np.float32)]
+            corner_normals = [np.empty((0, 3), dtype=np.float32)]
+            corner_meshes = corner_verts = [np.empty(0, dtype=np.int32)]
+        corner_coords = np.vstack(corner_coords)
+        corner_normals = np.vstack(corner_normals).astype(np.float64)
+        corner_meshes = np.concatenate(corner_meshes)
+        corner_verts = np.concatenate(corner_verts)
+        remap = vertex_weld.weld(
+            corner_coords, 1.0 / self.nif_export.VERTEX_RESOLUTION)[1]
         # set normals on shared vertices
         nv = 0
-        for vlist in vdict.values():
-            if len(vlist) <= 1: continue # not shared
-            meshes = set([b_mesh for vertex, poly, b_mesh in vlist])
-            if len(meshes) <= 1: continue # not shared
+        for corners in vertex_weld.group_by_remap(remap):
+            if len(set(corner_meshes[corners].tolist())) <= 1:
+                continue # not shared
             # take average of all face normals of polygons that have this
             # vertex
-            norm = mathutils.Vector()
-            for vertex, poly, b_mesh in vlist:
-                norm += poly.normal
-            norm.normalize()
+            normals = corner_normals[corners]
+            norm = mathutils.Vector(normals.sum(axis=0)).normalized()
             # remove outliers (fixes better bodies issue)
             # first calculate fitness of each face
-            fitlist = [poly.normal.dot(norm)
-                       for vertex, poly, b_mesh in vlist]
-            bestfit = max(fitlist)
+            fitlist = np.dot(normals, norm)
             # recalculate normals only taking into account
             # well-fitting polygons
-            norm = mathutils.Vector()
-            for (vertex, poly, b_mesh), fit in zip(vlist, fitlist):
-                if fit >= bestfit - 0.2:
-                    norm += poly.normal
-            norm.normalize()
+            norm = mathutils.Vector(
+                normals[fitlist >= fitlist.max() - 0.2].sum(axis=0)).normalized()
             # save normal of this vertex
-            for vertex, poly, b_mesh in vlist:
-                vertex.normal = norm
-                # vertex.sel = True
+            for mesh_index, vert_index in zip(
+                    corner_meshes[corners].tolist(),
+                    corner_verts[corners].tolist()):
+                b_meshes[mesh_index].vertices[vert_index].normal = norm
             nv += 1
         self.nif_export.info("Fixed normals on %i vertices." % nv)
     
@@ -86,6 +86,35 @@ class NifExportOperator(bpy.types.Operator, ExportHelper, NifOperatorCommon):
         description="Selects which parts of the blender file to export.",
         default='ALL_NIF')
 
+    #: Drop animation keys that interpolation reproduces.
+    reduce_keys = bpy.props.BoolProperty(
+        name="Reduce Keys",
+        description="Drop animation keys that interpolation between the"
+        " remaining keys reproduces within tolerance.",
+        default=False)
+
+    #: Largest translation error of key reduction.
+    reduce_keys_translation = bpy.props.FloatProperty(
+        name="Translation Tolerance",
+        description="Largest translation error of key reduction.",
+        min=0.0, max=10.0, precision=4,
+        default=0.001)
+
+    #: Largest rotation error of key reduction.
+    reduce_keys_rotation = bpy.props.FloatProperty(
+        name="Rotation Tolerance",
+        description="Largest rotation error of key reduction.",
+        subtype='ANGLE',
+        min=0.0, max=0.1, precision=4,
+        default=0.001)
+
+    #: Largest scale error of key reduction.
+    reduce_keys_scale = bpy.props.FloatProperty(
+        name="Scale Tolerance",
+        description="Largest scale error of key reduction.",
+        min=0.0, max=1.0, precision=4,
+        default=0.001)
+
     #: Smoothen inter-object seams.
     smooth_object_seams = bpy.props.BoolProperty(
         name="Smooth Inter-Object Seams",
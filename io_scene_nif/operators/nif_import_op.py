@@ -69,6 +69,20 @@ class NifImportOperator(bpy.types.Operator, ImportHelper, NifOperatorCommon):
         default="",
         subtype="FILE_PATH")
 
+    #: Animate the FaceGen EGM morphs, one after the other.
+    egm_animation = bpy.props.BoolProperty(
+        name="Animate EGM Morphs",
+        description="Animate the FaceGen EGM morphs, one after the other.",
+        default=False)
+
+    #: Influence of the FaceGen EGM morphs at the peak of their animation.
+    egm_animation_scale = bpy.props.FloatProperty(
+        name="EGM Animation Scale",
+        description="Influence of the FaceGen EGM morphs at the peak of"
+        " their animation.",
+        min=0.0, max=10.0,
+        default=1.0)
+
     #: Import animation.
     animation = bpy.props.BoolProperty(
         name="Animation",
@@ -106,6 +120,21 @@ class NifImportOperator(bpy.types.Operator, ImportHelper, NifOperatorCommon):
         description="Apply skin deformation to all skinned geometries.",
         default=False)
 
+    #: Keep files prepared for import in a cache, to speed up re-imports.
+    use_cache = bpy.props.BoolProperty(
+        name="Use Cache",
+        description="Cache the file after reading, merging, sending to"
+        " bind position, and scaling, to speed up later imports.",
+        default=False)
+
+    #: Size limit of the cache.
+    cache_size = bpy.props.IntProperty(
+        name="Cache Size (MB)",
+        description="Size limit of the cache, least recently used files"
+        " are removed first.",
+        min=1, max=65536,
+        default=512)
+
     #: Re-align Tail bones on import
     import_realign_bones = bpy.props.EnumProperty(
         items=(
@@ -153,10 +182,12 @@ class NifImportOperator(bpy.types.Operator, ImportHelper, NifOperatorCommon):
         
         # setup the viewport for preferred viewing settings
         bpy.context.scene.game_settings.material_mode = 'GLSL'
-        for area in bpy.context.window.screen.areas:
-            if area.type =='VIEW_3D':
-                area.spaces[0].viewport_shade = 'MATERIAL'
-                area.spaces[0].show_backface_culling = True
+        # there is no window when running in the background
+        if bpy.context.window:
+            for area in bpy.context.window.screen.areas:
+                if area.type =='VIEW_3D':
+                    area.spaces[0].viewport_shade = 'MATERIAL'
+                    area.spaces[0].show_backface_culling = True
         
         return nif_import.NifImport(self, context).execute()
     
@@ -37,20 +37,32 @@
 #
 # ***** END LICENSE BLOCK *****
 
-from functools import reduce
-import operator
+from concurrent.futures import ThreadPoolExecutor
 import os.path
 
 import bpy
 from pyffi.formats.nif import NifFormat
 
+from io_scene_nif.texturesys.texture_resolver import TextureResolver, is_image_file
+
 class TextureLoader():
     
-    
+    # number of threads that find, check, and save image files
+    MAX_WORKERS = 4
     
     def __init__(self, parent):
         self.nif_import = parent
         self.properties = parent.properties
+        self.resolver = TextureResolver()
+        # background work, maps texture hash to future of
+        # (file name, image paths or image path or None)
+        self.executor = None
+        self.image_files = {}
+        # embedded texture file names that have been handed out
+        self.embedded_files = set()
+        # images that are loaded after the geometry, with the
+        # alternate files to try and the path of the stub image
+        self.deferred_images = []
     
     def get_texture_hash(self, source):
         """Helper function for import_texture. Returns a key that uniquely
@@ -66,6 +78,85 @@ class TextureLoader():
         else:
             raise TypeError("source must be NiSourceTexture block or string")
     
+    def start_image_search(self, roots):
+        """Start finding and checking the image files of all textures in
+        the background, and saving the embedded ones, so the geometry
+        import does not have to wait for file access.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=self.MAX_WORKERS)
+        # search paths come from the context, so get them in this thread
+        search_paths = self.get_search_paths()
+        for root in roots:
+            for source in root.tree(block_type=NifFormat.NiSourceTexture):
+                texture_hash = self.get_texture_hash(source)
+                if texture_hash in self.image_files:
+                    continue
+                if source.use_external:
+                    self.image_files[texture_hash] = self.executor.submit(
+                        self.find_image_file, source.file_name.decode(),
+                        search_paths)
+                elif self.nif_import.IMPORT_EXPORTEMBEDDEDTEXTURES:
+                    fn, tex = self.get_embedded_texture_path()
+                    self.nif_import.info("Saving embedded texture as %s" % tex)
+                    self.image_files[texture_hash] = self.executor.submit(
+                        self.save_embedded_texture, source, fn, tex)
+    
+    def stop_image_search(self):
+        """Wait for background work to finish and release the threads."""
+        if self.executor:
+            self.executor.shutdown()
+            self.executor = None
+        self.image_files = {}
+    
+    def get_image_file(self, texture_hash, get_file):
+        """Return the result of find_image_file or save_embedded_texture
+        for a texture, from the background search if it was started, or
+        else by calling get_file.
+        """
+        try:
+            future = self.image_files[texture_hash]
+        except KeyError:
+            return get_file()
+        return future.result()
+    
+    def load_deferred_images(self):
+        """Load the pixels of all images imported so far. An image that
+        Blender cannot load is pointed to the next alternate file, and
+        becomes a stub image if none of them loads."""
+        for b_image, alternates, fn in self.deferred_images:
+            for tex in alternates:
+                if self.is_image_loaded(b_image):
+                    break
+                self.nif_import.debug("Trying %s" % tex)
+                b_image.filepath = tex
+                b_image.reload()
+            else:
+                if self.is_image_loaded(b_image):
+                    continue
+                self.nif_import.warning(
+                    "Texture '%s' not found or not supported"
+                    " and no alternate available"
+                    % fn)
+                b_image.source = 'GENERATED'
+                b_image.generated_width = 1
+                b_image.generated_height = 1
+                b_image.filepath = fn
+        self.deferred_images = []
+
+    @staticmethod
+    def is_image_loaded(b_image):
+        """Load the pixels of an image, and return whether Blender could
+        load them."""
+        # Blender will return an image object even if the
+        # file format is not supported,
+        # so to check if the image is actually loaded an error
+        # is forced via "b_image.size"
+        try:
+            b_image.size
+        except: # RuntimeError: couldn't load image data in Blender
+            return False
+        return True
+    
     def import_texture_source(self, source):
         """Convert a NiSourceTexture block, or simply a path string,
         to a Blender Texture object, return the Texture object and
@@ -90,9 +181,10 @@ class TextureLoader():
         
         if (isinstance(source, NifFormat.NiSourceTexture)
             and not source.use_external):
-            fn, b_image = self.import_embedded_texture_source(source)
+            fn, b_image = self.import_embedded_texture_source(
+                source, texture_hash)
         else:
-            fn, b_image = self.import_source(source)
+            fn, b_image = self.import_source(source, texture_hash)
             
         # create a stub image if the image could not be loaded
         
@@ -116,59 +208,61 @@ class TextureLoader():
         self.nif_import.dict_textures[texture_hash] = b_texture
         return b_texture
 
-    def import_embedded_texture_source(self, source):
-        fn = None
-        
-        # find a file name (but avoid overwriting)
+    def load_image(self, texs, fn):
+        """Create an image for the first of the checked files. Its pixels
+        are only loaded by load_deferred_images, after the geometry,
+        which falls back to the other files, and then to a stub image
+        with path fn."""
+        b_image = bpy.data.images.load(texs[0])
+        self.deferred_images.append((b_image, texs[1:], fn))
+        return b_image
+
+    def get_embedded_texture_path(self):
+        """Find a file name for an embedded texture (but avoid
+        overwriting)."""
         n = 0
         while True:
             fn = "image%03i.dds" % n
             tex = os.path.join(
                 os.path.dirname(self.properties.filepath), fn)
-            if not os.path.exists(tex):
+            if tex not in self.embedded_files and not os.path.exists(tex):
                 break
             n += 1
-        if self.nif_import.IMPORT_EXPORTEMBEDDEDTEXTURES:
-            # save embedded texture as dds file
-            stream = open(tex, "wb")
+        self.embedded_files.add(tex)
+        return fn, tex
+
+    def save_embedded_texture(self, source, fn, tex):
+        """Save an embedded texture as dds file. Runs in the background,
+        so does not report.
+
+        :return: The file name, and the path of the file, or None if the
+            pixel format is not supported.
+        """
+        with open(tex, "wb") as stream:
             try:
-                self.nif_import.info("Saving embedded texture as %s" % tex)
                 source.pixel_data.save_as_dds(stream)
             except ValueError:
                 # value error means that the pixel format is not supported
-                b_image = None
-            else:
-                # saving dds succeeded so load the file
-                b_image = bpy.ops.image.open(tex)
-                # Blender will return an image object even if the
-                # file format is not supported,
-                # so to check if the image is actually loaded an error
-                # is forced via "b_image.size"
-                try:
-                    b_image.size
-                except: # RuntimeError: couldn't load image data in Blender
-                    b_image = None # not supported, delete image object
-            finally:
-                stream.close()
+                return [fn, None]
+        return [fn, tex]
+
+    def import_embedded_texture_source(self, source, texture_hash):
+        if not self.nif_import.IMPORT_EXPORTEMBEDDEDTEXTURES:
+            fn, tex = self.get_embedded_texture_path()
+            return [fn, None]
+        if texture_hash in self.image_files:
+            fn, tex = self.image_files[texture_hash].result()
         else:
-            b_image = None
-        return [fn, b_image]
+            fn, tex = self.get_embedded_texture_path()
+            self.nif_import.info("Saving embedded texture as %s" % tex)
+            fn, tex = self.save_embedded_texture(source, fn, tex)
+        if tex:
+            # saving dds succeeded so load the file
+            return [fn, self.load_image([tex], fn)]
+        return [fn, None]
         
-    def import_source(self, source):
-        b_image = None
-        fn = None
-        
-        # the texture uses an external image file
-        if isinstance(source, NifFormat.NiSourceTexture):
-            fn = source.file_name.decode()
-        elif isinstance(source, str):
-            fn = source
-        else:
-            raise TypeError(
-                "source must be NiSourceTexture or str")
-        fn = fn.replace( '\\', os.sep )
-        fn = fn.replace( '/', os.sep )
-        # go searching for it
+    def get_search_paths(self):
+        """Return the folders to search for image files."""
         importpath = os.path.dirname(self.nif_import.properties.filepath)
         searchPathList = [importpath]
         if self.nif_import.context.user_preferences.filepaths.texture_directory:
@@ -189,47 +283,42 @@ class TextureLoader():
         art_index = importpath.lower().find("art")
         if art_index != -1:
             searchPathList.append(importpath[:art_index] + 'shared')
-        # go through all texture search paths
-        for texdir in searchPathList:
-            texdir = texdir.replace( '\\', os.sep )
-            texdir = texdir.replace( '/', os.sep )
-            # go through all possible file names, try alternate extensions
-            # too; for linux, also try lower case versions of filenames
-            texfns = reduce(operator.add,
-                            [ [ fn[:-4]+ext, fn[:-4].lower()+ext ]
-                              for ext in ('.DDS','.dds','.PNG','.png',
-                                         '.TGA','.tga','.BMP','.bmp',
-                                         '.JPG','.jpg') ] )
-            texfns = [fn, fn.lower()] + list(set(texfns))
-            for texfn in texfns:
-                # now a little trick, to satisfy many Morrowind mods
-                if (texfn[:9].lower() == 'textures' + os.sep) \
-                   and (texdir[-9:].lower() == os.sep + 'textures'):
-                    # strip one of the two 'textures' from the path
-                    tex = os.path.join( texdir[:-9], texfn )
-                else:
-                    tex = os.path.join( texdir, texfn )
-                # "ignore case" on linux
-                tex = bpy.path.resolve_ncase(tex)
-                self.nif_import.debug("Searching %s" % tex)
-                if os.path.exists(tex):
-                    # tries to load the file
-                    b_image = bpy.data.images.load(tex)
-                    # Blender will return an image object even if the
-                    # file format is not supported,
-                    # so to check if the image is actually loaded an error
-                    # is forced via "b_image.size"
-                    try:
-                        b_image.size
-                    except: # RuntimeError: couldn't load image data in Blender
-                        b_image = None # not supported, delete image object
-                    else:
-                        # file format is supported
-                        self.nif_import.debug("Found '%s' at %s" % (fn, tex))
-                        break
-            if b_image:
-                return [tex, b_image]
-        else:
-            tex = os.path.join(searchPathList[0], fn)
+        return [texdir.replace('\\', os.sep).replace('/', os.sep)
+                for texdir in searchPathList]
+
+    def find_image_file(self, fn, search_paths):
+        """Find the supported image files for a texture file name, trying
+        alternate extensions too, ignoring case. Runs in the background,
+        so does not report.
 
-        return [tex, b_image]
+        :return: The path of the first image and the paths of all images
+            in search order, or a path in the first search folder and an
+            empty list if no image was found.
+        """
+        fn = fn.replace( '\\', os.sep )
+        fn = fn.replace( '/', os.sep )
+        # go through all texture search paths, and check the headers,
+        # pixels are loaded later
+        texs = [tex for texdir in search_paths
+                for tex in self.resolver.find(texdir, fn)
+                if is_image_file(tex)]
+        if texs:
+            return [texs[0], texs]
+        return [os.path.join(search_paths[0], fn), texs]
+
+    def import_source(self, source, texture_hash):
+        # the texture uses an external image file
+        if isinstance(source, NifFormat.NiSourceTexture):
+            fn = source.file_name.decode()
+        elif isinstance(source, str):
+            fn = source
+        else:
+            raise TypeError(
+                "source must be NiSourceTexture or str")
+        tex_fn, texs = self.get_image_file(
+            texture_hash,
+            lambda: self.find_image_file(fn, self.get_search_paths()))
+        if texs:
+            self.nif_import.debug("Found '%s' at %s" % (fn, tex_fn))
+            return [tex_fn, self.load_image(texs, tex_fn)]
+        return [tex_fn, None]
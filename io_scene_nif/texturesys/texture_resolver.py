@@ -0,0 +1,181 @@
+"""This script contains classes to find texture files on disk."""
+
+# ***** BEGIN LICENSE BLOCK *****
+# 
+# Copyright © 2005-2015, NIF File Format Library and Tools contributors.
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+# 
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+# 
+#    * Neither the name of the NIF File Format Library and Tools
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+
+import os
+import struct
+import threading
+
+
+class DirectoryIndex():
+    """Case insensitive listing of the files in a directory, refreshed
+    when the modification time of the directory changes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+        # maps lower case name to name
+        self.names = {}
+        # maps lower case name without extension to names
+        self.stems = {}
+
+    def update(self):
+        """Read the directory again if it changed since the last read."""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self.mtime:
+            return
+        self.mtime = mtime
+        self.names = {}
+        self.stems = {}
+        try:
+            names = sorted(os.listdir(self.path))
+        except OSError:
+            names = []
+        for name in names:
+            lower_name = name.lower()
+            self.names.setdefault(lower_name, name)
+            stem = os.path.splitext(lower_name)[0]
+            self.stems.setdefault(stem, []).append(name)
+
+
+class TextureResolver():
+    """Find texture files in search directories, ignoring case, and
+    trying alternate image extensions.
+
+    Directory listings are shared by all resolvers, so they are reused
+    across imports. Each resolver checks whether a directory changed
+    at most once, when it first needs it. Resolvers can be used from
+    several threads at once.
+    """
+
+    #: Extensions of image files, in order of preference.
+    EXTENSIONS = ('.dds', '.png', '.tga', '.bmp', '.jpg')
+
+    # directory listings, maps normalized path to DirectoryIndex
+    _directories = {}
+    _lock = threading.Lock()
+
+    def __init__(self):
+        # directories that have been checked for changes
+        self.checked = set()
+
+    def get_directory(self, path):
+        """Return the up to date listing of a directory."""
+        key = os.path.normcase(os.path.abspath(path))
+        with self._lock:
+            try:
+                index = self._directories[key]
+            except KeyError:
+                index = self._directories[key] = DirectoryIndex(path)
+            if key not in self.checked:
+                index.update()
+                self.checked.add(key)
+        return index
+
+    def find(self, texdir, filename):
+        """Find the files that match a texture file name in a search
+        directory.
+
+        :param texdir: The search directory.
+        :param filename: The file name, possibly with folders, relative
+            to the search directory, using os.sep as separator.
+        :return: The paths of all matching files: the file with its own
+            extension first, followed by the files with alternate
+            extensions.
+        """
+        parts = [part for part in filename.split(os.sep) if part]
+        if not parts:
+            return []
+        # now a little trick, to satisfy many Morrowind mods:
+        # strip one of the two 'textures' from the path
+        if (len(parts) > 1 and parts[0].lower() == 'textures'
+            and os.path.basename(texdir.rstrip(os.sep)).lower() == 'textures'):
+            parts = parts[1:]
+        # find the folders, ignoring case
+        directory = texdir
+        for part in parts[:-1]:
+            if part not in (os.curdir, os.pardir):
+                part = self.get_directory(directory).names.get(part.lower())
+                if part is None:
+                    return []
+            directory = os.path.join(directory, part)
+        # find the files, trying alternate extensions
+        stem, ext = os.path.splitext(parts[-1].lower())
+        names = self.get_directory(directory).stems.get(stem, ())
+        paths = []
+        for test_ext in (ext,) + self.EXTENSIONS:
+            for name in names:
+                if os.path.splitext(name)[1].lower() == test_ext:
+                    path = os.path.join(directory, name)
+                    if path not in paths:
+                        paths.append(path)
+        return paths
+
+
+def is_image_file(path):
+    """Check from its header, without decoding pixels, whether a file
+    is a DDS, PNG, JPEG, BMP, or TGA image.
+    """
+    try:
+        with open(path, "rb") as stream:
+            header = stream.read(18)
+    except OSError:
+        return False
+    if header.startswith(b"DDS "):
+        # the size of the header struct is always 124
+        return len(header) >= 8 and struct.unpack("<I", header[4:8])[0] == 124
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return True
+    if header.startswith(b"\xff\xd8\xff"):
+        return True
+    if header.startswith(b"BM"):
+        return True
+    # TGA files have no magic number, so check the header fields
+    if len(header) == 18 and path.lower().endswith(".tga"):
+        colormap_type, image_type = header[1], header[2]
+        width, height, depth = struct.unpack("<HHB", header[12:17])
+        return (colormap_type in (0, 1)
+                and image_type in (1, 2, 3, 9, 10, 11)
+                and width > 0 and height > 0
+                and depth in (8, 15, 16, 24, 32))
+    return False
@@ -0,0 +1,409 @@
+"""Helper functions to read and write animation keys as arrays."""
+
+# ***** BEGIN LICENSE BLOCK *****
+# 
+# Copyright © 2005-2015, NIF File Format Library and Tools contributors.
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+# 
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+# 
+#    * Neither the name of the NIF File Format Library and Tools
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+
+import numpy as np
+
+
+def get_frames(times, fps):
+    """Convert key times to Blender frames, time 0.0 being frame 1.
+
+    :param times: The key times, in seconds.
+    :param fps: Frames per second.
+    :return: The frames, as integer array.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    return 1 + np.floor(times * fps + 0.5).astype(np.int64)
+
+
+def unique_frames(frames, values):
+    """Keep only the last key of every frame, as inserting keys one
+    by one would do, and sort the keys by frame.
+
+    :param frames: The frames, of shape (n,).
+    :param values: The values, of shape (n,) or (n, k).
+    :return: The remaining frames and values.
+    """
+    frames = np.asarray(frames)
+    values = np.asarray(values)
+    if frames.size == 0:
+        return frames, values
+    # np.unique picks the first occurrence, so search the reversed keys
+    rev_frames = frames[::-1]
+    frames, rev_index = np.unique(rev_frames, return_index=True)
+    return frames, values[::-1][rev_index]
+
+
+def get_key_times(keys):
+    """Read the times of a list of nif keys into a float array."""
+    return np.fromiter((key.time for key in keys), dtype=np.float64,
+                       count=len(keys))
+
+
+def get_frame_residuals(key_times, fps):
+    """Distance of every key time to the nearest frame, in frames.
+
+    :param key_times: The key times, in seconds.
+    :param fps: Frames per second.
+    :return: The residuals, of the same shape as *key_times*.
+    """
+    frames = np.asarray(key_times, dtype=np.float64) * fps
+    return np.abs(np.floor(frames + 0.5) - frames)
+
+
+def estimate_fps(key_times, candidates=(30, 20, 25, 35), tolerance=1e-3):
+    """Find the frame rate whose frames best match the key times.
+
+    Candidates are tried in order, and the search stops at the first
+    one for which no key time is further than *tolerance* frames from
+    a frame. Otherwise, the candidate with the smallest total residual
+    wins, the earliest one in case of a tie.
+
+    :param key_times: The key times, in seconds.
+    :param candidates: The frame rates to test, in order of preference.
+    :param tolerance: Largest residual of a fitting frame rate, in frames.
+    :return: The frame rate, and a dictionary mapping every tested
+        candidate to its total and largest residual.
+    """
+    key_times = np.unique(np.asarray(key_times, dtype=np.float64))
+    best_fps = candidates[0]
+    best_total = None
+    diagnostics = {}
+    for fps in candidates:
+        residuals = get_frame_residuals(key_times, fps)
+        total = float(residuals.sum())
+        largest = float(residuals.max()) if residuals.size else 0.0
+        diagnostics[fps] = total, largest
+        if best_total is None or total < best_total:
+            best_fps, best_total = fps, total
+        if largest <= tolerance:
+            best_fps = fps
+            break
+    return best_fps, diagnostics
+
+
+def quat_multiply(quats1, quats2):
+    """Multiply arrays of quaternions, as ``quat1 * quat2`` does for
+    :class:`mathutils.Quaternion`.
+
+    :param quats1: Quaternions as (w, x, y, z), of shape (n, 4) or (4,).
+    :param quats2: Quaternions as (w, x, y, z), of shape (n, 4) or (4,).
+    :return: The products, of shape (n, 4).
+    """
+    w1, x1, y1, z1 = np.asarray(quats1, dtype=np.float64).T
+    w2, x2, y2, z2 = np.asarray(quats2, dtype=np.float64).T
+    return np.array([w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+                     w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+                     w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+                     w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2]).T
+
+
+def quat_to_matrix(quats):
+    """Convert an array of unit quaternions to rotation matrices, as
+    :meth:`mathutils.Quaternion.to_matrix` does.
+
+    :param quats: Quaternions as (w, x, y, z), of shape (n, 4).
+    :return: The matrices, of shape (n, 3, 3).
+    """
+    w, x, y, z = np.asarray(quats, dtype=np.float64).reshape(-1, 4).T
+    return np.array(
+        [[1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)],
+         [2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)],
+         [2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)]]
+        ).transpose(2, 0, 1)
+
+
+def euler_to_quat(eulers):
+    """Convert an array of XYZ euler angles to quaternions, as
+    :meth:`mathutils.Euler.to_quaternion` does.
+
+    :param eulers: The angles in radians, of shape (n, 3).
+    :return: Quaternions as (w, x, y, z), of shape (n, 4).
+    """
+    half = 0.5 * np.asarray(eulers, dtype=np.float64).reshape(-1, 3)
+    cos = np.cos(half)
+    sin = np.sin(half)
+    zeros = np.zeros(len(half))
+    quat_x = np.array([cos[:, 0], sin[:, 0], zeros, zeros]).T
+    quat_y = np.array([cos[:, 1], zeros, sin[:, 1], zeros]).T
+    quat_z = np.array([cos[:, 2], zeros, zeros, sin[:, 2]]).T
+    return quat_multiply(quat_multiply(quat_z, quat_y), quat_x)
+
+
+def _get_segments(frames, sample_frames):
+    """Find the keys around every sample frame, and the relative
+    position between them, clamped at the first and last key.
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    sample_frames = np.asarray(sample_frames, dtype=np.float64)
+    if len(frames) == 1:
+        zeros = np.zeros(len(sample_frames), dtype=np.int64)
+        return zeros, zeros, np.zeros(len(sample_frames))
+    index = np.searchsorted(frames, sample_frames, side='right') - 1
+    index = np.clip(index, 0, len(frames) - 2)
+    factor = (sample_frames - frames[index]) / (frames[index + 1] - frames[index])
+    return index, index + 1, np.clip(factor, 0.0, 1.0)
+
+
+def lerp_keys(frames, values, sample_frames):
+    """Linearly interpolate keys at given frames.
+
+    :param frames: Sorted unique key frames, of shape (n,).
+    :param values: Key values, of shape (n,) or (n, k).
+    :param sample_frames: The frames to sample, of shape (m,).
+    :return: The values at the sample frames, of shape (m,) or (m, k).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    index0, index1, factor = _get_segments(frames, sample_frames)
+    if values.ndim > 1:
+        factor = factor[:, np.newaxis]
+    return values[index0] * (1.0 - factor) + values[index1] * factor
+
+
+def slerp_keys(frames, quats, sample_frames):
+    """Spherically interpolate quaternion keys at given frames, along
+    the shortest path.
+
+    :param frames: Sorted unique key frames, of shape (n,).
+    :param quats: Quaternions as (w, x, y, z), of shape (n, 4).
+    :param sample_frames: The frames to sample, of shape (m,).
+    :return: The quaternions at the sample frames, of shape (m, 4).
+    """
+    quats = np.asarray(quats, dtype=np.float64)
+    index0, index1, factor = _get_segments(frames, sample_frames)
+    quats0 = quats[index0]
+    quats1 = quats[index1]
+    cos_angle = np.einsum('ij,ij->i', quats0, quats1)
+    # q and -q are the same rotation, take the shortest path
+    quats1[cos_angle < 0] *= -1
+    cos_angle = np.abs(cos_angle)
+    angle = np.arccos(np.clip(cos_angle, -1.0, 1.0))
+    sin_angle = np.sin(angle)
+    # fall back on linear interpolation for (nearly) equal keys
+    linear = sin_angle < 1e-6
+    safe_sin = np.where(linear, 1.0, sin_angle)
+    weight0 = np.where(linear, 1.0 - factor,
+                       np.sin((1.0 - factor) * angle) / safe_sin)
+    weight1 = np.where(linear, factor, np.sin(factor * angle) / safe_sin)
+    result = quats0 * weight0[:, np.newaxis] + quats1 * weight1[:, np.newaxis]
+    return result / np.linalg.norm(result, axis=1)[:, np.newaxis]
+
+
+def set_fcurve_keys(action, data_path, frames, values, group=None,
+                    interpolation='BEZIER', extrapolation='CONSTANT'):
+    """Create F-curves for all components of a channel and fill them
+    with keys in one go.
+
+    :param action: The action to add the F-curves to.
+    :type action: :class:`bpy.types.Action`
+    :param data_path: For instance ``'pose.bones["Bip01"].location'``.
+    :param frames: The frames, of shape (n,).
+    :param values: The values, of shape (n,) for a single component or
+        (n, k) for k components.
+    :param group: Name of the action group, for instance the bone name.
+    :param interpolation: Interpolation of the keys.
+    :param extrapolation: ``'CONSTANT'``, ``'LINEAR'``, or ``'CYCLIC'``,
+        the latter being realized through a cycles modifier.
+    :return: The F-curves, one per component.
+    """
+    frames, values = unique_frames(frames, values)
+    values = np.asarray(values, dtype=np.float32)
+    if values.ndim == 1:
+        values = values[:, np.newaxis]
+    num_keys = len(frames)
+    co = np.empty((num_keys, 2), dtype=np.float32)
+    co[:, 0] = frames
+    fcurves = []
+    for index in range(values.shape[1]):
+        if group is not None:
+            fcurve = action.fcurves.new(data_path, index, group)
+        else:
+            fcurve = action.fcurves.new(data_path, index)
+        co[:, 1] = values[:, index]
+        fcurve.keyframe_points.add(num_keys)
+        fcurve.keyframe_points.foreach_set("co", co.ravel())
+        # keyframe_points.add creates bezier keys, enums cannot be
+        # set with foreach_set
+        if interpolation != 'BEZIER':
+            for b_key in fcurve.keyframe_points:
+                b_key.interpolation = interpolation
+        if extrapolation == 'CYCLIC':
+            fcurve.modifiers.new('CYCLES')
+        else:
+            fcurve.extrapolation = extrapolation
+        fcurve.update()
+        fcurves.append(fcurve)
+    return fcurves
+
+
+def get_times(frames, fps):
+    """Convert Blender frames to key times, frame 1 being time 0.0.
+
+    :param frames: The frames.
+    :param fps: Frames per second.
+    :return: The key times, in seconds, as float array.
+    """
+    return (np.asarray(frames, dtype=np.float64) - 1) / fps
+
+
+def get_fcurve_frames(fcurves):
+    """Return the sorted union of the key frames of F-curves.
+
+    :param fcurves: The F-curves.
+    :return: The frames, as float array.
+    """
+    frames = [np.empty(0, dtype=np.float32)]
+    for fcurve in fcurves:
+        co = np.empty(2 * len(fcurve.keyframe_points), dtype=np.float32)
+        fcurve.keyframe_points.foreach_get("co", co)
+        frames.append(co[::2])
+    return np.unique(np.concatenate(frames))
+
+
+def sample_fcurves(fcurves, frames):
+    """Evaluate F-curves at given frames, every curve at every frame
+    exactly once.
+
+    :param fcurves: The F-curves, for instance the components of a
+        channel.
+    :param frames: The frames to sample, of shape (n,).
+    :return: The values, of shape (n, number of F-curves).
+    """
+    frames = np.asarray(frames, dtype=np.float64).tolist()
+    values = np.empty((len(frames), len(fcurves)), dtype=np.float64)
+    for index, fcurve in enumerate(fcurves):
+        values[:, index] = [fcurve.evaluate(frame) for frame in frames]
+    return values
+
+
+def find_fcurve(action, data_path, index=0):
+    """Return the F-curve of an action for a data path and index.
+
+    :param action: The action.
+    :type action: :class:`bpy.types.Action`
+    :param data_path: For instance ``'key_blocks["Key 1"].value'``.
+    :param index: The component of the data path.
+    :return: The F-curve, or ``None`` if the action has none.
+    """
+    for fcurve in action.fcurves:
+        if fcurve.data_path == data_path and fcurve.array_index == index:
+            return fcurve
+    return None
+
+
+def get_fcurve_extend(fcurve):
+    """Return the extend mode of an F-curve, ``'CYCLIC'`` if it has a
+    cycles modifier, as :func:`set_fcurve_keys` writes it, or else its
+    extrapolation.
+    """
+    if any(b_mod.type == 'CYCLES' for b_mod in fcurve.modifiers):
+        return 'CYCLIC'
+    return fcurve.extrapolation
+
+
+def get_fcurve_keys(fcurve, fps):
+    """Return the times and values of the keys of an F-curve.
+
+    :param fcurve: The F-curve.
+    :param fps: Frames per second.
+    :return: The key times, frame 1 being time 0.0, and the values at
+        these times, both of shape (n,).
+    """
+    frames = get_fcurve_frames([fcurve])
+    return get_times(frames, fps), sample_fcurves([fcurve], frames)[:, 0]
+
+
+def get_key_errors(values, sampled_values, rotation=False):
+    """Distance between keys and their interpolated values.
+
+    :param values: The key values, of shape (n,) or (n, k).
+    :param sampled_values: The interpolated values, of the same shape.
+    :param rotation: Whether the values are quaternions as (w, x, y, z),
+        in which case the distance is the rotation angle between them.
+    :return: The distances, of shape (n,).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    sampled_values = np.asarray(sampled_values, dtype=np.float64)
+    if rotation:
+        dots = np.abs(np.sum(values * sampled_values, axis=1))
+        return 2 * np.arccos(np.clip(dots, 0.0, 1.0))
+    if values.ndim > 1:
+        return np.sqrt(np.sum((values - sampled_values) ** 2, axis=1))
+    return np.abs(values - sampled_values)
+
+
+def reduce_keys(frames, values, tolerance, rotation=False):
+    """Find the keys to keep so that interpolating between them
+    reproduces every key within a tolerance: linear interpolation, or
+    spherical linear interpolation for rotations.
+
+    The first and last keys are always kept. Every pass then adds, for
+    every interval between kept keys, the key with the largest error,
+    until no key is off by more than the tolerance.
+
+    :param frames: Sorted unique key frames, of shape (n,).
+    :param values: The key values, of shape (n,) or (n, k).
+    :param tolerance: The largest allowed error, an angle in radians
+        for rotations, a distance otherwise.
+    :param rotation: Whether the values are quaternions as (w, x, y, z).
+    :return: The mask of the kept keys, and the largest error of the
+        reduced keys.
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    keep = np.ones(len(frames), dtype=bool)
+    if len(frames) <= 2:
+        return keep, 0.0
+    interpolate = slerp_keys if rotation else lerp_keys
+    keep[1:-1] = False
+    while True:
+        errors = get_key_errors(
+            values, interpolate(frames[keep], values[keep], frames),
+            rotation=rotation)
+        bad_keys = np.flatnonzero((errors > tolerance) & ~keep)
+        if not len(bad_keys):
+            return keep, float(errors.max())
+        # the interval of a key is the index of the kept key before it
+        intervals = (np.cumsum(keep) - 1)[bad_keys]
+        order = np.lexsort((-errors[bad_keys], intervals))
+        bad_keys = bad_keys[order]
+        intervals = intervals[order]
+        worst = np.ones(len(bad_keys), dtype=bool)
+        worst[1:] = intervals[1:] != intervals[:-1]
+        keep[bad_keys[worst]] = True
@@ -0,0 +1,260 @@
+"""Array based helpers for building and reading Blender mesh data in bulk."""
+
+# ***** BEGIN LICENSE BLOCK *****
+# 
+# Copyright © 2005-2015, NIF File Format Library and Tools contributors.
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+# 
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+# 
+#    * Neither the name of the NIF File Format Library and Tools
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import numpy as np
+
+
+def vectors_as_array(vectors, dtype=np.float32):
+    """Convert a sequence of pyffi vectors into an (n, 3) array.
+
+    :param vectors: The vectors, for instance ``NiTriShapeData.vertices``.
+    :return: The coordinates as :class:`numpy.ndarray` of shape (n, 3).
+    """
+    return np.array([(v.x, v.y, v.z) for v in vectors],
+                    dtype=dtype).reshape(-1, 3)
+
+
+def transform_coords(coords, matrix):
+    """Apply a 4x4 transform on an (n, 3) array of coordinates, in the
+    same way as ``matrix * vector`` does for a single vector.
+
+    :param coords: The coordinates.
+    :type coords: :class:`numpy.ndarray`
+    :param matrix: The transform.
+    :type matrix: :class:`mathutils.Matrix`
+    :return: The transformed coordinates.
+    """
+    n_mat = np.array(matrix, dtype=np.float64)
+    return (np.dot(coords, n_mat[:3, :3].T) + n_mat[:3, 3]).astype(coords.dtype)
+
+
+def get_collection_array(collection, attr, width=1, dtype=np.float32):
+    """Read an attribute of all elements of a Blender collection in one
+    ``foreach_get`` call.
+
+    :param collection: For instance ``b_mesh.vertices``.
+    :param attr: For instance ``"co"``.
+    :param width: Number of values per element.
+    :return: The values, of shape (n,) or (n, width).
+    """
+    if dtype is bool:
+        values = [False] * (len(collection) * width)
+        collection.foreach_get(attr, values)
+        values = np.array(values, dtype=bool)
+    else:
+        values = np.empty(len(collection) * width, dtype=dtype)
+        collection.foreach_get(attr, values)
+    if width > 1:
+        return values.reshape(-1, width)
+    return values
+
+
+def set_collection_array(collection, attr, values, start=0, dtype=np.float32):
+    """Write an attribute of the elements of a Blender collection,
+    starting at element *start*, leaving earlier elements untouched.
+
+    :param collection: For instance ``b_mesh.loops``.
+    :param attr: For instance ``"vertex_index"``.
+    :param values: One row of values for every element from *start* on.
+    :param start: Index of the first element to write.
+    """
+    values = np.ascontiguousarray(values, dtype=dtype).ravel()
+    num_elems = len(collection) - start
+    if num_elems <= 0:
+        return
+    if start:
+        width = values.size // num_elems
+        buf = get_collection_array(collection, attr, width, dtype).ravel()
+        buf[start * width:] = values
+        values = buf
+    if dtype is bool:
+        collection.foreach_set(attr, values.tolist())
+    else:
+        collection.foreach_set(attr, values)
+
+
+def append_vertices(b_mesh, coords):
+    """Append vertices to a mesh.
+
+    :param b_mesh: The mesh.
+    :type b_mesh: :class:`bpy.types.Mesh`
+    :param coords: The vertex coordinates, of shape (n, 3).
+    :return: Index of the first new vertex.
+    """
+    b_v_start = len(b_mesh.vertices)
+    b_mesh.vertices.add(len(coords))
+    set_collection_array(b_mesh.vertices, "co", coords, start=b_v_start)
+    return b_v_start
+
+
+def append_polygons(b_mesh, faces):
+    """Append polygons to a mesh, along with their loops.
+
+    :param b_mesh: The mesh.
+    :type b_mesh: :class:`bpy.types.Mesh`
+    :param faces: Blender vertex indices of each polygon, either as an
+        (n, k) array or as a list of index sequences of any length.
+    :return: Index of the first new polygon and of the first new loop.
+    """
+    if isinstance(faces, np.ndarray) and faces.ndim == 2:
+        loop_totals = np.full(len(faces), faces.shape[1], dtype=np.int32)
+        loop_verts = faces.ravel()
+    else:
+        loop_totals = np.array([len(face) for face in faces], dtype=np.int32)
+        loop_verts = np.array([v for face in faces for v in face],
+                              dtype=np.int32)
+    b_p_start = len(b_mesh.polygons)
+    b_l_start = len(b_mesh.loops)
+    b_mesh.loops.add(len(loop_verts))
+    b_mesh.polygons.add(len(loop_totals))
+    set_collection_array(b_mesh.loops, "vertex_index", loop_verts,
+                         start=b_l_start, dtype=np.int32)
+    loop_starts = np.empty(len(loop_totals), dtype=np.int32)
+    if len(loop_totals):
+        loop_starts[0] = b_l_start
+        np.cumsum(loop_totals[:-1], out=loop_starts[1:])
+        loop_starts[1:] += b_l_start
+    set_collection_array(b_mesh.polygons, "loop_start", loop_starts,
+                         start=b_p_start, dtype=np.int32)
+    set_collection_array(b_mesh.polygons, "loop_total", loop_totals,
+                         start=b_p_start, dtype=np.int32)
+    return b_p_start, b_l_start
+
+
+def unique_faces(faces):
+    """Find the faces to keep when adding *faces* to a mesh, skipping
+    degenerate faces (a vertex used more than once) and duplicates (same
+    vertices as an earlier face, in any order). Blender rejects both.
+
+    Faces are compared through a canonical key, their sorted vertex
+    indices, so this runs in linear time.
+
+    :param faces: Vertex indices of each face, either as an (n, k) array
+        or as a list of index sequences of any length.
+    :return: Indices of the faces to keep, in their original order, the
+        number of duplicate faces, and the number of degenerate faces.
+    """
+    if isinstance(faces, np.ndarray) and faces.ndim == 2:
+        num_faces = len(faces)
+        if not num_faces:
+            return np.empty(0, dtype=np.int32), 0, 0
+        f_keys = np.sort(faces, axis=1)
+        f_degenerate = np.any(f_keys[:, 1:] == f_keys[:, :-1], axis=1)
+        f_valid = np.flatnonzero(~f_degenerate)
+        # view every row as a single opaque value, so np.unique can hash it
+        f_keys = np.ascontiguousarray(f_keys[f_valid])
+        f_keys = f_keys.view(
+            np.dtype((np.void, f_keys.dtype.itemsize * f_keys.shape[1])))
+        f_first = np.unique(f_keys.ravel(), return_index=True)[1]
+        f_keep = f_valid[np.sort(f_first)].astype(np.int32)
+        num_degenerate = num_faces - len(f_valid)
+    else:
+        num_faces = len(faces)
+        f_keys = set()
+        f_keep = []
+        num_degenerate = 0
+        for i, face in enumerate(faces):
+            f_key = tuple(sorted(face))
+            if len(set(f_key)) < len(f_key):
+                num_degenerate += 1
+            elif f_key not in f_keys:
+                f_keys.add(f_key)
+                f_keep.append(i)
+        f_keep = np.array(f_keep, dtype=np.int32)
+    num_duplicate = num_faces - num_degenerate - len(f_keep)
+    return f_keep, num_duplicate, num_degenerate
+
+
+def get_polygon_corners(b_mesh):
+    """For every corner of every polygon of a mesh, in polygon order, get
+    its polygon and loop.
+
+    :param b_mesh: The mesh.
+    :type b_mesh: :class:`bpy.types.Mesh`
+    :return: Polygon index and loop index of each corner.
+    """
+    loop_starts = get_collection_array(b_mesh.polygons, "loop_start",
+                                       dtype=np.int32)
+    loop_totals = get_collection_array(b_mesh.polygons, "loop_total",
+                                       dtype=np.int32)
+    corner_polys = np.repeat(np.arange(len(loop_totals), dtype=np.int32),
+                             loop_totals)
+    return corner_polys, get_corner_loops(loop_starts, loop_totals)
+
+
+def get_corner_loops(loop_starts, loop_totals):
+    """Get the loop of every corner of the given polygons, in order.
+
+    :param loop_starts: First loop of each polygon.
+    :param loop_totals: Number of loops of each polygon.
+    :return: The loop indices.
+    """
+    corner_firsts = np.repeat(np.cumsum(loop_totals) - loop_totals,
+                              loop_totals)
+    return (np.repeat(loop_starts, loop_totals)
+            + np.arange(len(corner_firsts), dtype=np.int32)
+            - corner_firsts).astype(np.int32)
+
+
+def set_vertex_group_weights(v_group, vertices, weights):
+    """Assign weights to the vertices of a vertex group, with one
+    ``add`` call per distinct weight. Where a vertex is listed more than
+    once, its last weight wins, as when adding the vertices one by one.
+
+    :param v_group: The vertex group.
+    :type v_group: :class:`bpy.types.VertexGroup`
+    :param vertices: The vertex indices.
+    :param weights: The weight of each vertex, or one weight for all.
+    """
+    vertices = np.asarray(vertices, dtype=np.int64).ravel()
+    weights = np.asarray(weights, dtype=np.float32)
+    if weights.ndim == 0:
+        weights = np.full(vertices.shape, weights, dtype=np.float32)
+    if not vertices.size:
+        return
+    # np.unique picks the first occurrence, so search the reversed list
+    vertices, rev_index = np.unique(vertices[::-1], return_index=True)
+    weights = weights[::-1][rev_index]
+    unique_weights, weight_index = np.unique(weights, return_inverse=True)
+    order = np.argsort(weight_index, kind='mergesort')
+    bounds = np.searchsorted(weight_index[order],
+                             np.arange(len(unique_weights) + 1))
+    for weight, start, stop in zip(unique_weights.tolist(),
+                                   bounds[:-1], bounds[1:]):
+        v_group.add(vertices[order[start:stop]].tolist(), weight, 'REPLACE')
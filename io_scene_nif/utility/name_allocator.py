@@ -0,0 +1,103 @@
+"""Allocation of unique names, shared by import and export."""
+
+# ***** BEGIN LICENSE BLOCK *****
+# 
+# Copyright © 2005-2015, NIF File Format Library and Tools contributors.
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+# 
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+# 
+#    * Neither the name of the NIF File Format Library and Tools
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+
+class NameAllocator():
+    """Hands out names which are not in use yet.
+
+    Candidate names are generated from a base name and an index, and the
+    first free candidate is returned. Names are never released, so for
+    each base name the allocator remembers where the previous search
+    stopped, and the next search for the same base continues from there.
+    """
+
+    def __init__(self, is_used=None):
+        """
+        :param is_used: Optional check for names which are in use
+            elsewhere, for instance in Blender's data. Names it reports
+            must stay in use during the lifetime of the allocator.
+        :type is_used: callable taking a :class:`str`
+        """
+        self.names = set()
+        self.is_used = is_used
+        self.next_index = {}
+
+    def __contains__(self, name):
+        return name in self.names or (
+            self.is_used is not None and self.is_used(name))
+
+    def reserve(self, name):
+        """Mark a name as in use."""
+        self.names.add(name)
+
+    def allocate(self, key, make_name, first=-1, stop=None):
+        """Return the first free name among ``make_name(first)``,
+        ``make_name(first + 1)``, ..., and mark it as in use.
+
+        :param key: Identifies the base name of the candidates.
+        :param make_name: Returns the candidate name for an index.
+        :type make_name: callable taking an :class:`int`
+        :param first: Index of the first candidate.
+        :param stop: Index after the last candidate, or ``None`` for no
+            limit.
+        :return: The name.
+        :raise RuntimeError: If all candidates are in use.
+        """
+        index = self.next_index.get(key, first)
+        while stop is None or index < stop:
+            name = make_name(index)
+            index += 1
+            if name not in self:
+                self.next_index[key] = index
+                self.names.add(name)
+                return name
+        self.next_index[key] = index
+        raise RuntimeError("Ran out of names.")
+
+    def get_unique_name(self, name):
+        """Return *name* if it is free, else the first free name of the form
+        ``"%s.%02d" % (name, index)``, and mark it as in use.
+
+        :param name: The base name.
+        :type name: :class:`str`
+        :return: The unique name.
+        """
+        return self.allocate(
+            name,
+            lambda index: name if index < 0 else "%s.%02d" % (name, index))
@@ -0,0 +1,156 @@
+"""On-disk cache of nif files that have been prepared for import."""
+
+# ***** BEGIN LICENSE BLOCK *****
+# 
+# Copyright © 2005-2015, NIF File Format Library and Tools contributors.
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+# 
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+# 
+#    * Neither the name of the NIF File Format Library and Tools
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+
+import hashlib
+import os
+import tempfile
+
+#: Bump when the way the cached files are prepared changes.
+CACHE_VERSION = 1
+
+
+class NifCache():
+    """Cache of nif files, keyed by the content of the original file and
+    the options used to prepare it. Least recently used files are
+    removed once the cache grows beyond its size limit.
+    """
+
+    #: Extension of the files in the cache.
+    EXTENSION = ".nif"
+
+    def __init__(self, directory, max_size):
+        """
+        :param directory: Folder where the files are stored.
+        :param max_size: Size limit of the cache, in bytes.
+        """
+        self.directory = directory
+        self.max_size = max_size
+
+    def get_key(self, filepath, options, version=""):
+        """Return the cache key for a file.
+
+        :param filepath: Path of the original file.
+        :param options: Dictionary of options that affect the prepared file.
+        :param version: Version of the library that prepares the file.
+        :return: The key, as hexadecimal string.
+        """
+        key = hashlib.sha1()
+        with open(filepath, "rb") as stream:
+            for chunk in iter(lambda: stream.read(1 << 20), b""):
+                key.update(chunk)
+        key.update(repr((CACHE_VERSION, version,
+                         sorted(options.items()))).encode())
+        return key.hexdigest()
+
+    def get_path(self, key):
+        """Return the path where the file for a key is stored."""
+        return os.path.join(self.directory, key + self.EXTENSION)
+
+    def get(self, key):
+        """Look up a file in the cache, and mark it as recently used.
+
+        :return: Path of the cached file, or ``None`` if not cached.
+        """
+        path = self.get_path(key)
+        try:
+            os.utime(path, None)
+        except OSError:
+            return None
+        return path
+
+    def put(self, key, data):
+        """Store a file in the cache, and trim the cache to its size limit.
+
+        :param data: Object with a ``write(stream)`` method, such as
+            :class:`pyffi.formats.nif.NifFormat.Data`.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        # write to a temporary file first, so a failed write never
+        # leaves a truncated file in the cache
+        handle, temp_path = tempfile.mkstemp(
+            suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(handle, "wb") as stream:
+                data.write(stream)
+            os.replace(temp_path, self.get_path(key))
+        except BaseException:
+            self.remove_file(temp_path)
+            raise
+        self.evict()
+
+    def discard(self, key):
+        """Remove the file for a key from the cache, if it is there."""
+        self.remove_file(self.get_path(key))
+
+    def remove_file(self, path):
+        """Remove a file, ignoring files that are already gone."""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def get_entries(self):
+        """Return (last use, size, path) of all cached files, least
+        recently used first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.EXTENSION):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # removed by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        """Remove least recently used files until the cache fits its
+        size limit."""
+        entries = self.get_entries()
+        total_size = sum(size for mtime, size, path in entries)
+        for mtime, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            # another process may have removed it already
+            self.remove_file(path)
+            total_size -= size
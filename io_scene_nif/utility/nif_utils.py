@@ -90,6 +90,34 @@ def decompose_srt(matrix):
     b_trans = trans_vec
     return [b_scale, b_rot, b_trans]
 
+def index_block_names(niBlock):
+    """Index the named blocks in the tree of niBlock by name. Blocks with
+    the same name are listed in the order in which niBlock.find visits
+    them, so the first one is the block that find would return.
+
+    :return: Dictionary mapping names, as bytes, to lists of blocks.
+    """
+    dict_named_blocks = {}
+    visited = set()
+    for block in niBlock.tree():
+        if id(block) in visited:
+            continue
+        visited.add(id(block))
+        name = getattr(block, "name", None)
+        if name:
+            dict_named_blocks.setdefault(name, []).append(block)
+    return dict_named_blocks
+
+def find_indexed_block(dict_named_blocks, name, block_type=None):
+    """Find the first block with the given name, and optionally of the
+    given type, in an index built by index_block_names."""
+    if isinstance(name, str):
+        name = name.encode()
+    for block in dict_named_blocks.get(name, ()):
+        if block_type is None or isinstance(block, block_type):
+            return block
+    return None
+
 def find_property(niBlock, property_type):
     """Find a property."""
     for prop in niBlock.properties:
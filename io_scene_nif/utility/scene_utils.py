@@ -0,0 +1,74 @@
+"""Helpers for the Blender scene, shared by the tools and the tests."""
+
+# ***** BEGIN LICENSE BLOCK *****
+# 
+# Copyright © 2005-2015, NIF File Format Library and Tools contributors.
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+# 
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+# 
+#    * Neither the name of the NIF File Format Library and Tools
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import bpy
+
+
+def clear_bpy_data():
+    """Remove all objects and data from blender, so the next file
+    starts from an empty scene."""
+
+    def clear_bpy_prop_collection(collection):
+        for elem in collection[:]:
+            collection.remove(elem)
+    
+    def clear_users(collection):
+        for elem in collection[:]:
+            collection[elem.name].user_clear()
+            collection.remove(collection[elem.name])
+    
+    # unlink objects
+    for b_obj in bpy.data.objects[:]:
+        bpy.context.scene.objects.unlink(b_obj)
+    
+    # remove all data
+    for collection in (
+        "actions", "objects", "meshes", "armatures", "lamps", "lattices",
+        "particles", "metaballs", "shape_keys", "texts", "curves",
+        "cameras", "grease_pencil", "groups", "libraries",
+        "node_groups",
+        "materials",
+        ):
+        clear_bpy_prop_collection(getattr(bpy.data, collection))
+    
+    # need to remove any users first    
+    for collection in (
+        "brushes", "textures", "images",
+        ):
+        clear_users(getattr(bpy.data, collection))
@@ -0,0 +1,161 @@
+"""Welding of duplicate vertices, shared by import and export."""
+
+# ***** BEGIN LICENSE BLOCK *****
+# 
+# Copyright © 2005-2015, NIF File Format Library and Tools contributors.
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+# 
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+# 
+#    * Neither the name of the NIF File Format Library and Tools
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import itertools
+
+import numpy as np
+
+
+def weld(attrs, epsilon, ids=None, hash_dims=3):
+    """Weld vertices whose attributes are all within *epsilon* of each
+    other.
+
+    Vertices are visited in order, and each vertex is welded to the first
+    earlier unique vertex that matches it, or else becomes a new unique
+    vertex itself. Candidates are found through a grid hash on the first
+    *hash_dims* attributes, whose cells are *epsilon* wide, so only the
+    neighbouring cells need to be checked.
+
+    :param attrs: The vertex attributes, of shape (n, d).
+    :param epsilon: Largest difference allowed on each attribute, either a
+        single float or one float per attribute. Zero means exact match.
+    :param ids: Optional integer per vertex; vertices with different ids
+        are never welded.
+    :param hash_dims: Number of attributes used for the grid hash.
+    :return: The indices of the unique vertices, in order, and for every
+        vertex, the index of its unique vertex in that list.
+    """
+    attrs = np.asarray(attrs, dtype=np.float64)
+    if attrs.ndim == 1:
+        attrs = attrs.reshape(-1, 1)
+    num_verts, num_attrs = attrs.shape
+    epsilon = np.broadcast_to(
+        np.asarray(epsilon, dtype=np.float64), (num_attrs,))
+    hash_dims = min(hash_dims, num_attrs)
+
+    # grid cells of the hashed attributes; exact attributes are hashed on
+    # their value, and need no neighbour lookup
+    cell_keys = []
+    cell_offsets = []
+    for dim in range(hash_dims):
+        if epsilon[dim] > 0:
+            cell_keys.append(
+                np.floor(attrs[:, dim] / epsilon[dim]).astype(np.int64))
+            cell_offsets.append((0, -1, 1))
+        else:
+            cell_keys.append(attrs[:, dim])
+            cell_offsets.append((0,))
+    if ids is not None:
+        cell_keys.append(np.asarray(ids, dtype=np.int64))
+        cell_offsets.append((0,))
+    cell_keys = list(zip(*[key.tolist() for key in cell_keys])) \
+        if cell_keys else [()] * num_verts
+    cell_offsets = list(itertools.product(*cell_offsets))
+
+    rows = attrs.tolist()
+    eps = epsilon.tolist()
+    cells = {}
+    unique = []
+    remap = np.empty(num_verts, dtype=np.int32)
+    for i, (cell_key, row) in enumerate(zip(cell_keys, rows)):
+        match = None
+        for offset in cell_offsets:
+            neighbour_key = tuple(k + o for k, o in zip(cell_key, offset))
+            for j in cells.get(neighbour_key, ()):
+                if match is not None and j >= match:
+                    break
+                if all(abs(a - b) <= e
+                       for a, b, e in zip(row, rows[unique[j]], eps)):
+                    match = j
+                    break
+        if match is None:
+            match = len(unique)
+            unique.append(i)
+            cells.setdefault(cell_key, []).append(match)
+        remap[i] = match
+    return np.array(unique, dtype=np.int32), remap
+
+
+def weld_vertices(coords=None, normals=None, uvs=(), colors=None, ids=None,
+                  coord_epsilon=0.0, normal_epsilon=0.0, uv_epsilon=0.0,
+                  color_epsilon=0.0):
+    """Weld vertices on position, normal, any number of uv layers, and
+    color; see :func:`weld`. Any of these can be left out.
+
+    :param coords: Positions, of shape (n, 3).
+    :param normals: Normals, of shape (n, 3).
+    :param uvs: A sequence of uv layers, each of shape (n, 2).
+    :param colors: Colors, of shape (n, 3) or (n, 4).
+    :param ids: Optional integer per vertex; vertices with different ids
+        are never welded.
+    :return: The indices of the unique vertices, and for every vertex, the
+        index of its unique vertex.
+    """
+    columns = []
+    epsilon = []
+    for values, value_epsilon in itertools.chain(
+            ((coords, coord_epsilon), (normals, normal_epsilon)),
+            ((uv, uv_epsilon) for uv in uvs),
+            ((colors, color_epsilon),)):
+        if values is None:
+            continue
+        values = np.asarray(values, dtype=np.float64)
+        # explicit column count, as -1 is ambiguous without rows
+        values = values.reshape(
+            len(values), int(np.prod(values.shape[1:], dtype=np.int64)))
+        columns.append(values)
+        epsilon.extend([value_epsilon] * values.shape[1])
+    if not columns:
+        if ids is None:
+            raise ValueError("nothing to weld on")
+        columns.append(np.zeros((len(ids), 0)))
+    return weld(np.hstack(columns), epsilon, ids=ids)
+
+
+def group_by_remap(remap):
+    """Group vertices which were welded together.
+
+    :param remap: The remap array returned by :func:`weld`.
+    :return: For every unique vertex, the indices of all its vertices.
+    """
+    if not len(remap):
+        return []
+    order = np.argsort(remap, kind="mergesort")
+    bounds = np.flatnonzero(np.diff(remap[order])) + 1
+    return np.split(order, bounds)
@@ -9,37 +9,7 @@ import os.path
 
 from pyffi.formats.nif import NifFormat
 
-def clear_bpy_data():
-    """Remove all objects from blender."""
-
-    def clear_bpy_prop_collection(collection):
-        for elem in collection[:]:
-            collection.remove(elem)
-    
-    def clear_users(collection):
-        for elem in collection[:]:
-            collection[elem.name].user_clear()
-            collection.remove(collection[elem.name])
-    
-    # unlink objects
-    for b_obj in bpy.data.objects[:]:
-        bpy.context.scene.objects.unlink(b_obj)
-    
-    # remove all data
-    for collection in (
-        "actions", "objects", "meshes", "armatures", "lamps", "lattices",
-        "particles", "metaballs", "shape_keys", "texts", "curves",
-        "cameras", "grease_pencil", "groups", "libraries",
-        "node_groups",
-        "materials",
-        ):
-        clear_bpy_prop_collection(getattr(bpy.data, collection))
-    
-    # need to remove any users first    
-    for collection in (
-        "brushes", "textures", "images",
-        ):
-        clear_users(getattr(bpy.data, collection))
+from io_scene_nif.utility.scene_utils import clear_bpy_data
 
 def setup():
     """Enables the nif scripts addon, so all tests can use it."""
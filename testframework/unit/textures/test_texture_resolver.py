@@ -0,0 +1,87 @@
+import nose
+
+import os
+import shutil
+import struct
+import tempfile
+
+from io_scene_nif.texturesys.texture_resolver import TextureResolver, is_image_file
+
+
+class Test_Texture_Resolver:
+    """Tests the TextureResolver class"""
+
+    def setup(self):
+        self.texdir = os.path.join(tempfile.mkdtemp(), "Textures")
+        os.makedirs(os.path.join(self.texdir, "Armor"))
+        for name in ("Armor/Iron.TGA", "Armor/iron.dds", "Armor/iron_n.dds"):
+            open(os.path.join(self.texdir, *name.split("/")), "wb").close()
+
+    def teardown(self):
+        shutil.rmtree(os.path.dirname(self.texdir))
+
+    def get_path(self, name):
+        return os.path.join(self.texdir, *name.split("/"))
+
+    def test_find_ignore_case(self):
+        '''Expect own extension first, then alternate extensions'''
+        paths = TextureResolver().find(self.texdir, os.path.join("armor", "IRON.tga"))
+        nose.tools.assert_equal(
+            paths, [self.get_path("Armor/Iron.TGA"), self.get_path("Armor/iron.dds")])
+
+    def test_find_textures_prefix(self):
+        '''Expect a leading textures folder to match the search directory'''
+        paths = TextureResolver().find(
+            self.texdir, os.path.join("textures", "armor", "iron_n.dds"))
+        nose.tools.assert_equal(paths, [self.get_path("Armor/iron_n.dds")])
+
+    def test_find_missing(self):
+        '''Expect no paths for missing files and folders'''
+        resolver = TextureResolver()
+        nose.tools.assert_equal(resolver.find(self.texdir, "steel.dds"), [])
+        nose.tools.assert_equal(
+            resolver.find(self.texdir, os.path.join("clothes", "iron.dds")), [])
+
+    def test_find_refresh(self):
+        '''Expect new files to be found by later resolvers'''
+        nose.tools.assert_equal(TextureResolver().find(self.texdir, "steel.dds"), [])
+        open(self.get_path("steel.dds"), "wb").close()
+        # make sure the modification time changes
+        os.utime(self.texdir, (0, 0))
+        nose.tools.assert_equal(
+            TextureResolver().find(self.texdir, "steel.dds"),
+            [self.get_path("steel.dds")])
+
+
+class Test_Image_Header:
+    """Tests the image header check"""
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def write_file(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as stream:
+            stream.write(content)
+        return path
+
+    def test_dds(self):
+        '''Expect DDS files with a valid header size'''
+        nose.tools.assert_true(is_image_file(
+            self.write_file("a.dds", b"DDS " + struct.pack("<I", 124) + bytes(120))))
+        nose.tools.assert_false(is_image_file(
+            self.write_file("b.dds", b"DDS " + struct.pack("<I", 12) + bytes(120))))
+
+    def test_tga(self):
+        '''Expect TGA files with sensible header fields'''
+        header = bytes([0, 0, 2]) + bytes(9) + struct.pack("<HHBB", 4, 4, 32, 8)
+        nose.tools.assert_true(is_image_file(self.write_file("a.tga", header)))
+        nose.tools.assert_false(is_image_file(self.write_file("b.tga", bytes(18))))
+
+    def test_other(self):
+        '''Expect files that are not images to fail'''
+        nose.tools.assert_false(is_image_file(self.write_file("a.txt", b"text file")))
+        nose.tools.assert_false(is_image_file(os.path.join(self.directory, "none.dds")))
@@ -0,0 +1,177 @@
+import nose
+
+import numpy as np
+
+from io_scene_nif.utility import anim_utils
+
+
+class Test_Anim_Utils:
+    """Tests the animation key array helpers"""
+
+    def test_get_frames(self):
+        '''Expect time 0.0 at frame 1 and rounding to the nearest frame'''
+        frames = anim_utils.get_frames([0.0, 0.04, 0.5], 30)
+        nose.tools.assert_equal(frames.tolist(), [1, 2, 16])
+
+    def test_unique_frames(self):
+        '''Expect sorted frames, keeping the last key of each frame'''
+        frames, values = anim_utils.unique_frames(
+            np.array([3, 1, 3, 2]), np.array([1.0, 2.0, 3.0, 4.0]))
+        nose.tools.assert_equal(frames.tolist(), [1, 2, 3])
+        nose.tools.assert_equal(values.tolist(), [2.0, 4.0, 3.0])
+
+    def test_quat_multiply(self):
+        '''Expect products to match the product of rotation matrices'''
+        quats = anim_utils.euler_to_quat([[0.1, 0.2, 0.3], [-1.0, 0.5, 2.0]])
+        mats = anim_utils.quat_to_matrix(quats)
+        product = anim_utils.quat_to_matrix(
+            anim_utils.quat_multiply(quats[0], quats[1]))
+        nose.tools.assert_true(np.allclose(product[0], np.dot(mats[0], mats[1])))
+
+    def test_euler_to_quat(self):
+        '''Expect a rotation about z for an euler angle about z'''
+        quats = anim_utils.euler_to_quat([[0.0, 0.0, np.pi / 2]])
+        expected = [np.cos(np.pi / 4), 0.0, 0.0, np.sin(np.pi / 4)]
+        nose.tools.assert_true(np.allclose(quats[0], expected))
+
+    def test_slerp_keys(self):
+        '''Expect halfway rotations between keys, clamped outside'''
+        quats = anim_utils.euler_to_quat([[0.0, 0.0, 0.0], [0.0, 0.0, 1.0]])
+        result = anim_utils.slerp_keys([1, 5], quats, [0, 3, 9])
+        expected = anim_utils.euler_to_quat(
+            [[0.0, 0.0, 0.0], [0.0, 0.0, 0.5], [0.0, 0.0, 1.0]])
+        nose.tools.assert_true(np.allclose(result, expected))
+
+    def test_lerp_keys(self):
+        '''Expect linear interpolation between keys, clamped outside'''
+        result = anim_utils.lerp_keys([1, 5], [1.0, 3.0], [0, 3, 9])
+        nose.tools.assert_equal(result.tolist(), [1.0, 2.0, 3.0])
+
+    def test_estimate_fps(self):
+        '''Expect the frame rate that fits the key times'''
+        fps, diagnostics = anim_utils.estimate_fps(np.arange(10) / 25.0)
+        nose.tools.assert_equal(fps, 25)
+        nose.tools.assert_equal(sorted(diagnostics), [20, 25, 30])
+
+    def test_estimate_fps_early_exit(self):
+        '''Expect the first fitting frame rate, without testing others'''
+        fps, diagnostics = anim_utils.estimate_fps(np.arange(10) / 10.0)
+        nose.tools.assert_equal(fps, 30)
+        nose.tools.assert_equal(list(diagnostics), [30])
+
+    def test_estimate_fps_no_fit(self):
+        '''Expect the frame rate with the smallest total residual'''
+        fps, diagnostics = anim_utils.estimate_fps([0.0, 0.049, 0.101])
+        nose.tools.assert_equal(fps, 20)
+
+    def test_estimate_fps_long(self):
+        '''Expect key times of a long animation to keep their precision'''
+        fps, diagnostics = anim_utils.estimate_fps(np.arange(90000) / 30.0)
+        nose.tools.assert_equal(fps, 30)
+        nose.tools.assert_equal(list(diagnostics), [30])
+
+    def test_get_times(self):
+        '''Expect frame 1 at time 0.0, inverse of get_frames'''
+        times = anim_utils.get_times([1, 2, 16], 30)
+        nose.tools.assert_equal(
+            anim_utils.get_frames(times, 30).tolist(), [1, 2, 16])
+
+    def test_sample_fcurves(self):
+        '''Expect every curve sampled at the union of key frames'''
+        fcurves = [_FCurve([1.0, 5.0], lambda frame: frame),
+                   _FCurve([3.0, 5.0], lambda frame: 2 * frame)]
+        frames = anim_utils.get_fcurve_frames(fcurves)
+        nose.tools.assert_equal(frames.tolist(), [1.0, 3.0, 5.0])
+        values = anim_utils.sample_fcurves(fcurves, frames)
+        nose.tools.assert_equal(
+            values.tolist(), [[1.0, 2.0], [3.0, 6.0], [5.0, 10.0]])
+
+    def test_reduce_keys_linear(self):
+        '''Expect keys on a straight line to be dropped'''
+        frames = np.arange(1, 11)
+        values = np.array([0, 1, 2, 3, 4, 5, 4, 3, 2, 1], dtype=float)
+        keep, error = anim_utils.reduce_keys(frames, values, 0.01)
+        nose.tools.assert_equal(frames[keep].tolist(), [1, 6, 10])
+        nose.tools.assert_true(error <= 0.01)
+
+    def test_reduce_keys_tolerance(self):
+        '''Expect every key within tolerance of the reduced keys'''
+        frames = np.arange(1, 101)
+        values = np.array([np.sin(frames / 10.0), np.cos(frames / 7.0)]).T
+        keep, error = anim_utils.reduce_keys(frames, values, 0.05)
+        nose.tools.assert_true(keep.sum() < 100)
+        result = anim_utils.lerp_keys(frames[keep], values[keep], frames)
+        nose.tools.assert_true(
+            np.all(np.sqrt(np.sum((result - values) ** 2, axis=1)) <= 0.05))
+        nose.tools.assert_true(error <= 0.05)
+
+    def test_reduce_keys_rotation(self):
+        '''Expect rotations at constant speed to be dropped'''
+        frames = np.arange(1, 11)
+        quats = anim_utils.euler_to_quat(
+            [[0.0, 0.0, 0.1 * i] for i in range(10)])
+        keep, error = anim_utils.reduce_keys(
+            frames, quats, 0.001, rotation=True)
+        nose.tools.assert_equal(frames[keep].tolist(), [1, 10])
+        nose.tools.assert_true(error <= 0.001)
+
+    def test_get_fcurve_keys(self):
+        '''Expect shape key influence keys as times and values'''
+        b_action = _Action([
+            _FCurve([1.0], lambda frame: 0.0,
+                    data_path='key_blocks["Basis"].value'),
+            _FCurve([1.0, 16.0, 31.0], lambda frame: (frame - 1) / 30.0,
+                    data_path='key_blocks["Smile"].value')])
+        fcurve = anim_utils.find_fcurve(b_action, 'key_blocks["Smile"].value')
+        nose.tools.assert_is(fcurve, b_action.fcurves[1])
+        nose.tools.assert_is_none(
+            anim_utils.find_fcurve(b_action, 'key_blocks["Frown"].value'))
+        times, values = anim_utils.get_fcurve_keys(fcurve, 30)
+        nose.tools.assert_true(np.allclose(times, [0.0, 0.5, 1.0]))
+        nose.tools.assert_true(np.allclose(values, [0.0, 0.5, 1.0]))
+
+    def test_get_fcurve_extend(self):
+        '''Expect a cycles modifier to mean cyclic extend'''
+        fcurve = _FCurve([1.0], lambda frame: 0.0)
+        nose.tools.assert_equal(anim_utils.get_fcurve_extend(fcurve), 'CONSTANT')
+        fcurve.modifiers.append(_Modifier('CYCLES'))
+        nose.tools.assert_equal(anim_utils.get_fcurve_extend(fcurve), 'CYCLIC')
+
+class _KeyframePoints:
+    """Minimal stand-in for the keyframe points of an F-curve."""
+
+    def __init__(self, frames):
+        self.frames = frames
+
+    def __len__(self):
+        return len(self.frames)
+
+    def foreach_get(self, attr, values):
+        values[::2] = self.frames
+        values[1::2] = 0.0
+
+
+class _FCurve:
+    """Minimal stand-in for an F-curve."""
+
+    def __init__(self, frames, evaluate, data_path="", array_index=0):
+        self.keyframe_points = _KeyframePoints(frames)
+        self.evaluate = evaluate
+        self.data_path = data_path
+        self.array_index = array_index
+        self.modifiers = []
+        self.extrapolation = 'CONSTANT'
+
+
+class _Modifier:
+    """Minimal stand-in for an F-curve modifier."""
+
+    def __init__(self, type):
+        self.type = type
+
+
+class _Action:
+    """Minimal stand-in for an action."""
+
+    def __init__(self, fcurves):
+        self.fcurves = fcurves
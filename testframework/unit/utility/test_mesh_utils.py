@@ -0,0 +1,150 @@
+import nose
+
+import numpy as np
+
+from io_scene_nif.utility import mesh_utils
+
+
+class Test_Mesh_Utils:
+    """Tests the bulk mesh array helpers"""
+
+    def test_get_collection_array(self):
+        '''Expect all elements read at once, one row per element'''
+        collection = _Collection({"co": 3}, 2)
+        collection.values["co"][:] = [[1, 2, 3], [4, 5, 6]]
+        coords = mesh_utils.get_collection_array(collection, "co", 3)
+        nose.tools.assert_equal(coords.tolist(), [[1, 2, 3], [4, 5, 6]])
+
+    def test_set_collection_array_start(self):
+        '''Expect elements before start to be left untouched'''
+        collection = _Collection({"co": 3}, 3)
+        collection.values["co"][0] = [7, 7, 7]
+        mesh_utils.set_collection_array(
+            collection, "co", [[1, 2, 3], [4, 5, 6]], start=1)
+        nose.tools.assert_equal(collection.values["co"].tolist(),
+                                [[7, 7, 7], [1, 2, 3], [4, 5, 6]])
+
+    def test_append_vertices(self):
+        '''Expect new vertices after the existing ones'''
+        b_mesh = _Mesh()
+        nose.tools.assert_equal(
+            mesh_utils.append_vertices(b_mesh, np.zeros((2, 3))), 0)
+        nose.tools.assert_equal(
+            mesh_utils.append_vertices(b_mesh, np.ones((1, 3))), 2)
+        nose.tools.assert_equal(b_mesh.vertices.values["co"].tolist(),
+                                [[0, 0, 0], [0, 0, 0], [1, 1, 1]])
+
+    def test_append_polygons(self):
+        '''Expect loop starts and totals to follow the existing loops'''
+        b_mesh = _Mesh()
+        mesh_utils.append_polygons(b_mesh, np.array([[0, 1, 2]]))
+        b_p_start, b_l_start = mesh_utils.append_polygons(
+            b_mesh, [(0, 2, 3), (3, 4, 5, 6)])
+        nose.tools.assert_equal((b_p_start, b_l_start), (1, 3))
+        nose.tools.assert_equal(
+            b_mesh.polygons.values["loop_start"].ravel().tolist(), [0, 3, 6])
+        nose.tools.assert_equal(
+            b_mesh.polygons.values["loop_total"].ravel().tolist(), [3, 3, 4])
+        nose.tools.assert_equal(
+            b_mesh.loops.values["vertex_index"].ravel().tolist(),
+            [0, 1, 2, 0, 2, 3, 3, 4, 5, 6])
+
+    def test_get_polygon_corners(self):
+        '''Expect the polygon and loop of every corner, in polygon order'''
+        b_mesh = _Mesh()
+        b_mesh.polygons.add(2)
+        b_mesh.polygons.values["loop_start"][:] = [[4], [0]]
+        b_mesh.polygons.values["loop_total"][:] = [[3], [4]]
+        corner_polys, corner_loops = mesh_utils.get_polygon_corners(b_mesh)
+        nose.tools.assert_equal(corner_polys.tolist(), [0, 0, 0, 1, 1, 1, 1])
+        nose.tools.assert_equal(corner_loops.tolist(), [4, 5, 6, 0, 1, 2, 3])
+
+    def test_get_corner_loops_empty(self):
+        '''Expect no corners without polygons'''
+        corner_loops = mesh_utils.get_corner_loops(
+            np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32))
+        nose.tools.assert_equal(corner_loops.tolist(), [])
+
+
+    def test_unique_faces_duplicates(self):
+        '''Expect faces with rotated or reversed winding to be duplicates'''
+        faces = np.array([[0, 1, 2], [1, 2, 0], [2, 1, 0], [1, 2, 3]])
+        f_keep, num_duplicate, num_degenerate = mesh_utils.unique_faces(faces)
+        nose.tools.assert_equal(f_keep.tolist(), [0, 3])
+        nose.tools.assert_equal((num_duplicate, num_degenerate), (2, 0))
+
+    def test_unique_faces_degenerate(self):
+        '''Expect faces using a vertex more than once to be dropped'''
+        faces = np.array([[0, 0, 1], [0, 1, 2], [3, 3, 3]])
+        f_keep, num_duplicate, num_degenerate = mesh_utils.unique_faces(faces)
+        nose.tools.assert_equal(f_keep.tolist(), [1])
+        nose.tools.assert_equal((num_duplicate, num_degenerate), (0, 2))
+
+    def test_unique_faces_mixed_sizes(self):
+        '''Expect the same result for faces of different sizes'''
+        faces = [(0, 1, 2, 3), (3, 2, 1, 0), (0, 1, 1), (4, 5, 6)]
+        f_keep, num_duplicate, num_degenerate = mesh_utils.unique_faces(faces)
+        nose.tools.assert_equal(f_keep.tolist(), [0, 3])
+        nose.tools.assert_equal((num_duplicate, num_degenerate), (1, 1))
+
+    def test_set_vertex_group_weights(self):
+        '''Expect one add per distinct weight, the last weight winning'''
+        v_group = _VertexGroup()
+        mesh_utils.set_vertex_group_weights(
+            v_group, [0, 1, 2, 3, 1], [0.5, 0.25, 0.5, 1.0, 1.0])
+        nose.tools.assert_equal(
+            sorted(v_group.calls),
+            [([0, 2], 0.5, 'REPLACE'), ([1, 3], 1.0, 'REPLACE')])
+
+    def test_set_vertex_group_weights_single(self):
+        '''Expect a single weight to be used for all vertices'''
+        v_group = _VertexGroup()
+        mesh_utils.set_vertex_group_weights(v_group, [4, 2, 4], 1.0)
+        nose.tools.assert_equal(v_group.calls, [([2, 4], 1.0, 'REPLACE')])
+        v_group = _VertexGroup()
+        mesh_utils.set_vertex_group_weights(v_group, [], 1.0)
+        nose.tools.assert_equal(v_group.calls, [])
+
+
+class _Collection:
+    """Minimal stand-in for a Blender collection, such as the vertices
+    of a mesh, storing every attribute as an array."""
+
+    def __init__(self, widths, size=0):
+        self.widths = widths
+        self.values = dict(
+            (attr, np.zeros((size, width))) for attr, width in widths.items())
+
+    def __len__(self):
+        return len(next(iter(self.values.values())))
+
+    def add(self, count):
+        for attr, width in self.widths.items():
+            self.values[attr] = np.vstack(
+                (self.values[attr], np.zeros((count, width))))
+
+    def foreach_get(self, attr, values):
+        values[:] = self.values[attr].ravel()
+
+    def foreach_set(self, attr, values):
+        self.values[attr] = np.array(values, dtype=np.float64).reshape(
+            len(self), self.widths[attr])
+
+
+class _Mesh:
+    """Minimal stand-in for a Blender mesh."""
+
+    def __init__(self):
+        self.vertices = _Collection({"co": 3})
+        self.loops = _Collection({"vertex_index": 1})
+        self.polygons = _Collection({"loop_start": 1, "loop_total": 1})
+
+
+class _VertexGroup:
+    """Minimal stand-in for a vertex group, recording its add calls."""
+
+    def __init__(self):
+        self.calls = []
+
+    def add(self, index, weight, type):
+        self.calls.append((index, weight, type))
@@ -0,0 +1,33 @@
+import nose
+
+from io_scene_nif.utility.name_allocator import NameAllocator
+
+
+class Test_Name_Allocator:
+    """Tests the NameAllocator class"""
+
+    def setup(self):
+        self.allocator = NameAllocator()
+
+    def test_unique_name(self):
+        '''Expect numbered names once the base name is taken'''
+        names = [self.allocator.get_unique_name("Tri Rock") for i in range(3)]
+        nose.tools.assert_equal(names, ["Tri Rock", "Tri Rock.00", "Tri Rock.01"])
+
+    def test_unique_name_reserved(self):
+        '''Expect reserved names to be skipped'''
+        self.allocator.reserve("Tri Rock")
+        self.allocator.reserve("Tri Rock.01")
+        names = [self.allocator.get_unique_name("Tri Rock") for i in range(2)]
+        nose.tools.assert_equal(names, ["Tri Rock.00", "Tri Rock.02"])
+
+    def test_unique_name_is_used(self):
+        '''Expect names in use elsewhere to be skipped'''
+        allocator = NameAllocator(is_used=lambda name: name == "Rock")
+        nose.tools.assert_equal(allocator.get_unique_name("Rock"), "Rock.00")
+
+    @nose.tools.raises(RuntimeError)
+    def test_allocate_out_of_names(self):
+        '''Expect an error once all candidates are taken'''
+        for i in range(3):
+            self.allocator.allocate("Rock", str, first=0, stop=2)
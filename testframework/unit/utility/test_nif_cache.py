@@ -0,0 +1,99 @@
+import nose
+
+import os
+import shutil
+import tempfile
+
+from io_scene_nif.utility.nif_cache import NifCache
+
+
+class Data:
+    """Stand-in for a nif data object, writing fixed content"""
+
+    def __init__(self, content):
+        self.content = content
+
+    def write(self, stream):
+        stream.write(self.content)
+
+
+class BrokenData:
+    """Stand-in for a nif data object failing halfway its write"""
+
+    def write(self, stream):
+        stream.write(b"01234")
+        raise AttributeError("broken block")
+
+
+class Test_Nif_Cache:
+    """Tests the NifCache class"""
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = NifCache(os.path.join(self.directory, "cache"), 25)
+        self.filepath = os.path.join(self.directory, "test.nif")
+        with open(self.filepath, "wb") as stream:
+            stream.write(b"nif content")
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get_key_options(self):
+        '''Expect different keys for different options'''
+        key1 = self.cache.get_key(self.filepath, {"scale": 10.0})
+        key2 = self.cache.get_key(self.filepath, {"scale": 1.0})
+        nose.tools.assert_equal(
+            key1, self.cache.get_key(self.filepath, {"scale": 10.0}))
+        nose.tools.assert_not_equal(key1, key2)
+
+    def test_get_key_content(self):
+        '''Expect a different key once the file content changes'''
+        key1 = self.cache.get_key(self.filepath, {})
+        with open(self.filepath, "ab") as stream:
+            stream.write(b"more")
+        nose.tools.assert_not_equal(key1, self.cache.get_key(self.filepath, {}))
+
+    def test_put_get(self):
+        '''Expect a stored file to be found with its content'''
+        nose.tools.assert_is_none(self.cache.get("a"))
+        self.cache.put("a", Data(b"0123456789"))
+        with open(self.cache.get("a"), "rb") as stream:
+            nose.tools.assert_equal(stream.read(), b"0123456789")
+
+    def test_evict_least_recently_used(self):
+        '''Expect the least recently used file to go beyond the size limit'''
+        self.cache.put("a", Data(b"0123456789"))
+        self.cache.put("b", Data(b"0123456789"))
+        os.utime(self.cache.get_path("a"), (0, 0))
+        os.utime(self.cache.get_path("b"), (1, 1))
+        # using a marks it as recently used
+        self.cache.get("a")
+        self.cache.put("c", Data(b"0123456789"))
+        nose.tools.assert_is_not_none(self.cache.get("a"))
+        nose.tools.assert_is_none(self.cache.get("b"))
+        nose.tools.assert_is_not_none(self.cache.get("c"))
+
+    def test_put_failure(self):
+        '''Expect a failed write to leave no file in the cache'''
+        nose.tools.assert_raises(
+            AttributeError, self.cache.put, "a", BrokenData())
+        nose.tools.assert_is_none(self.cache.get("a"))
+        nose.tools.assert_equal(os.listdir(self.cache.directory), [])
+
+    def test_discard(self):
+        '''Expect a discarded file to be gone, and no error if absent'''
+        self.cache.put("a", Data(b"0123456789"))
+        self.cache.discard("a")
+        nose.tools.assert_is_none(self.cache.get("a"))
+        self.cache.discard("a")
+
+    def test_evict_removed_file(self):
+        '''Expect no error when another process removed a file first'''
+        self.cache.put("a", Data(b"0123456789"))
+        self.cache.put("b", Data(b"0123456789"))
+        entries = self.cache.get_entries()
+        os.remove(self.cache.get_path("a"))
+        self.cache.max_size = 0
+        self.cache.get_entries = lambda: entries
+        self.cache.evict()
+        nose.tools.assert_equal(os.listdir(self.cache.directory), [])
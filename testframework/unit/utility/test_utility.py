@@ -196,4 +196,44 @@ class Test_Find_Block_Properties:
         nose.tools.assert_true(prop == self.nimatprop)
 
 
-    
\ No newline at end of file
+    
+
+class Test_Block_Name_Index:
+    """Tests the name index of nif blocks"""
+
+    def setup(self):
+        self.root = NifFormat.NiNode()
+        self.root.name = b'Scene Root'
+        self.bones = []
+        for name in (b'Bip01', b'Bip01 Spine', b'Bip01'):
+            bone = NifFormat.NiNode()
+            bone.name = name
+            self.root.add_child(bone)
+            self.bones.append(bone)
+        self.index = nif_utils.index_block_names(self.root)
+
+    def test_find_indexed_block(self):
+        '''Expect the same block as a find on the tree'''
+        for name in (b'Bip01', b'Bip01 Spine'):
+            nose.tools.assert_is(
+                nif_utils.find_indexed_block(self.index, name),
+                self.root.find(block_name=name))
+
+    def test_find_indexed_block_str(self):
+        '''Expect str names to match the bytes names of blocks'''
+        nose.tools.assert_is(
+            nif_utils.find_indexed_block(self.index, 'Bip01 Spine'),
+            self.bones[1])
+
+    def test_find_indexed_block_duplicates(self):
+        '''Expect all blocks with a duplicate name to be indexed'''
+        nose.tools.assert_equal(self.index[b'Bip01'],
+                                [self.bones[0], self.bones[2]])
+
+    def test_find_indexed_block_missing(self):
+        '''Expect None for names and types that are not in the tree'''
+        nose.tools.assert_is_none(
+            nif_utils.find_indexed_block(self.index, 'Bip02'))
+        nose.tools.assert_is_none(
+            nif_utils.find_indexed_block(self.index, 'Bip01',
+                                         NifFormat.NiTriShape))
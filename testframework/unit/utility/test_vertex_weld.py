@@ -0,0 +1,67 @@
+import nose
+
+import numpy as np
+
+from io_scene_nif.utility import vertex_weld
+
+
+class Test_Vertex_Weld:
+    """Tests the weld and weld_vertices functions"""
+
+    def test_weld_exact(self):
+        '''Expect only identical vertices to be welded'''
+        coords = [(0, 0, 0), (1, 0, 0), (0, 0, 0), (0, 0, 0.001)]
+        unique, remap = vertex_weld.weld(coords, 0.0)
+        nose.tools.assert_equal(unique.tolist(), [0, 1, 3])
+        nose.tools.assert_equal(remap.tolist(), [0, 1, 0, 2])
+
+    def test_weld_epsilon_across_cells(self):
+        '''Expect vertices within epsilon to be welded, even across cells'''
+        coords = [(0.0009, 0, 0), (0.0011, 0, 0), (0.0021, 0, 0)]
+        unique, remap = vertex_weld.weld(coords, 0.001)
+        nose.tools.assert_equal(unique.tolist(), [0, 2])
+        nose.tools.assert_equal(remap.tolist(), [0, 0, 1])
+
+    def test_weld_first_match(self):
+        '''Expect a vertex to weld to the first matching unique vertex'''
+        coords = [(0.002, 0, 0), (0, 0, 0), (0.001, 0, 0)]
+        unique, remap = vertex_weld.weld(coords, 0.001)
+        nose.tools.assert_equal(unique.tolist(), [0, 1])
+        nose.tools.assert_equal(remap.tolist(), [0, 1, 0])
+
+    def test_weld_vertices_ids(self):
+        '''Expect vertices with different ids to stay apart'''
+        unique, remap = vertex_weld.weld_vertices(
+            uvs=[[(0, 0), (0, 0), (0.5, 0), (0, 0)]], ids=[0, 1, 0, 0])
+        nose.tools.assert_equal(unique.tolist(), [0, 1, 2])
+        nose.tools.assert_equal(remap.tolist(), [0, 1, 2, 0])
+
+    def test_weld_vertices_all_attributes(self):
+        '''Expect every attribute to be checked'''
+        coords = np.zeros((3, 3))
+        normals = [(0, 0, 1), (0, 0, 1), (0, 0, 1)]
+        uvs = [[(0, 0), (0, 0), (0, 0)], [(0, 0), (0, 0), (0, 1)]]
+        colors = [(1, 1, 1, 1), (1, 1, 1, 0.5), (1, 1, 1, 1)]
+        unique, remap = vertex_weld.weld_vertices(
+            coords=coords, normals=normals, uvs=uvs, colors=colors,
+            coord_epsilon=0.001, normal_epsilon=0.01, uv_epsilon=0.001,
+            color_epsilon=0.001)
+        nose.tools.assert_equal(unique.tolist(), [0, 1, 2])
+
+    def test_weld_vertices_empty(self):
+        '''Expect no unique vertices when there are no vertices'''
+        unique, remap = vertex_weld.weld_vertices(
+            normals=np.empty((0, 3)), uvs=[np.empty((0, 2))],
+            ids=np.empty(0))
+        nose.tools.assert_equal(unique.tolist(), [])
+        nose.tools.assert_equal(remap.tolist(), [])
+        unique, remap = vertex_weld.weld_vertices(
+            coords=np.empty((0, 3)), coord_epsilon=0.001)
+        nose.tools.assert_equal(unique.tolist(), [])
+        nose.tools.assert_equal(remap.tolist(), [])
+
+    def test_group_by_remap(self):
+        '''Expect welded vertices to be grouped together'''
+        groups = vertex_weld.group_by_remap(np.array([0, 1, 0, 2, 1]))
+        nose.tools.assert_equal([group.tolist() for group in groups],
+                                [[0, 2], [1, 4], [3]])
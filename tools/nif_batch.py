@@ -0,0 +1,347 @@
+"""Import, export, or convert many files with a pool of background
+Blender processes.
+
+Run with a regular Python 3.5 (or later) interpreter, for instance::
+
+    python tools/nif_batch.py --mode convert --workers 4 \
+        --output build/meshes --root mods/meshes "mods/meshes/**/*.nif" \
+        --export-option game=\"SKYRIM\"
+
+Each worker runs nif_batch_worker.py inside
+"blender --background --factory-startup" and handles many files.
+Every finished job is appended to a journal (json lines, with status,
+timing, and error), so an interrupted run continues where it stopped
+when started again with the same journal. A report with the latest
+result of every file is written at the end."""
+
+# ***** BEGIN LICENSE BLOCK *****
+# 
+# Copyright © 2005-2015, NIF File Format Library and Tools contributors.
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+# 
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+# 
+#    * Neither the name of the NIF File Format Library and Tools
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+
+import argparse
+import csv
+import glob
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+#: Must match nif_batch_worker.RESULT_PREFIX.
+RESULT_PREFIX = "NIFBATCH "
+
+WORKER_SCRIPT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "nif_batch_worker.py")
+
+#: Extension of the output files, per mode.
+OUTPUT_EXTENSIONS = {"import": ".blend", "export": ".nif", "convert": ".nif"}
+
+
+class WorkerError(Exception):
+    """Raised when a worker process dies or stops responding."""
+    pass
+
+
+def parse_option(option):
+    """Parse a NAME=VALUE operator option, VALUE being json, or else a
+    plain string."""
+    name, sep, value = option.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(
+            "option '%s' is not of the form NAME=VALUE" % option)
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    return name, value
+
+
+def find_inputs(patterns, manifest):
+    """Collect the input files from glob patterns and a manifest file with
+    one path or pattern per line; lines starting with # are skipped."""
+    patterns = list(patterns)
+    if manifest:
+        with open(manifest) as stream:
+            patterns.extend(line.strip() for line in stream
+                            if line.strip() and not line.startswith("#"))
+    inputs = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) or [pattern]
+        for path in matches:
+            path = os.path.abspath(path)
+            if path not in seen:
+                seen.add(path)
+                inputs.append(path)
+    return inputs
+
+
+def make_jobs(inputs, mode, root, output):
+    """Map every input to an output below the output folder, keeping
+    its path relative to root."""
+    if not root:
+        root = os.path.commonpath(inputs) if len(inputs) > 1 else ""
+        if not root or not os.path.isdir(root):
+            root = os.path.dirname(root or inputs[0])
+    jobs = []
+    for path in inputs:
+        relpath = os.path.splitext(os.path.relpath(path, root))[0]
+        jobs.append({
+            "mode": mode,
+            "input": path,
+            "output": os.path.join(output, relpath + OUTPUT_EXTENSIONS[mode]),
+            })
+    return jobs
+
+
+def read_journal(journal):
+    """Return the last journal entry of every input."""
+    entries = {}
+    if os.path.exists(journal):
+        with open(journal) as stream:
+            for line in stream:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # last line of an interrupted run
+                    continue
+                entries[entry["input"]] = entry
+    return entries
+
+
+class Worker():
+    """A background Blender process that runs jobs one at a time."""
+
+    def __init__(self, blender, options, timeout):
+        self.blender = blender
+        self.options = options
+        self.timeout = timeout
+        self.process = None
+        self.results = None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [self.blender, "--background", "--factory-startup",
+             "--python", WORKER_SCRIPT, "--", json.dumps(self.options)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT, universal_newlines=True, bufsize=1)
+        # read the output in a thread, so we can wait with a timeout
+        self.results = queue.Queue()
+        # bind the thread to this process and queue, so a reader left
+        # over from a stopped process never reports to a restarted one
+        threading.Thread(target=self.read_output,
+                         args=(self.process, self.results),
+                         daemon=True).start()
+        self.wait_result(self.timeout)
+
+    @staticmethod
+    def read_output(process, results):
+        for line in process.stdout:
+            if line.startswith(RESULT_PREFIX):
+                results.put(json.loads(line[len(RESULT_PREFIX):]))
+        results.put(None)
+
+    def wait_result(self, timeout):
+        try:
+            result = self.results.get(timeout=timeout)
+        except queue.Empty:
+            self.stop()
+            raise WorkerError("timed out after %s seconds" % timeout)
+        if result is None:
+            returncode = self.process.wait()
+            self.stop()
+            raise WorkerError("worker exited with code %s" % returncode)
+        return result
+
+    def run(self, job):
+        """Run a job, (re)starting the process when needed."""
+        if not self.process or self.process.poll() is not None:
+            self.start()
+        try:
+            self.process.stdin.write(json.dumps(job) + "\n")
+            self.process.stdin.flush()
+        except OSError:
+            self.stop()
+            raise WorkerError("worker stopped accepting jobs")
+        return self.wait_result(self.timeout)
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+
+
+def run_jobs(jobs, args, options):
+    """Run all jobs on a pool of workers, appending results to the
+    journal as they come in."""
+    jobs_queue = queue.Queue()
+    for job in jobs:
+        jobs_queue.put(job)
+    lock = threading.Lock()
+    results = []
+
+    def work(worker_index):
+        worker = Worker(args.blender, options, args.timeout)
+        try:
+            while True:
+                try:
+                    job = jobs_queue.get_nowait()
+                except queue.Empty:
+                    return
+                start = time.time()
+                try:
+                    result = worker.run(job)
+                except WorkerError as e:
+                    result = dict(job, status="failed", error=str(e),
+                                  seconds=time.time() - start)
+                result["worker"] = worker_index
+                with lock:
+                    results.append(result)
+                    journal.write(json.dumps(result) + "\n")
+                    journal.flush()
+                    print("[%i/%i] %s %s (%.1fs)%s" % (
+                        len(results), len(jobs), result["status"],
+                        result["input"], result["seconds"],
+                        (": " + result["error"]) if "error" in result else ""))
+        finally:
+            worker.stop()
+
+    with open(args.journal, "a") as journal:
+        threads = [threading.Thread(target=work, args=(i,))
+                   for i in range(min(args.workers, len(jobs)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return results
+
+
+def write_report(report, entries):
+    """Write the latest result of every file, slowest first."""
+    with open(report, "w", newline="") as stream:
+        writer = csv.writer(stream)
+        writer.writerow(["input", "output", "status", "seconds", "error"])
+        for entry in sorted(entries.values(),
+                            key=lambda entry: -entry.get("seconds", 0)):
+            writer.writerow([entry["input"], entry["output"], entry["status"],
+                             "%.3f" % entry.get("seconds", 0),
+                             entry.get("error", "")])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Import, export, or convert files with background"
+        " Blender processes.")
+    parser.add_argument("inputs", nargs="*",
+                        help="input files or glob patterns")
+    parser.add_argument("--manifest",
+                        help="file listing input files or glob patterns")
+    parser.add_argument("--mode", choices=sorted(OUTPUT_EXTENSIONS),
+                        default="convert",
+                        help="import nif to blend, export blend to nif,"
+                        " or convert nif to nif (default: convert)")
+    parser.add_argument("--output", required=True,
+                        help="folder for the output files")
+    parser.add_argument("--root",
+                        help="folder that input paths are taken relative to"
+                        " (default: common folder of the inputs)")
+    parser.add_argument("--blender", default="blender",
+                        help="blender executable (default: blender)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="number of blender processes")
+    parser.add_argument("--timeout", type=float, default=600,
+                        help="seconds before a job is abandoned")
+    parser.add_argument("--journal",
+                        help="journal of finished jobs"
+                        " (default: OUTPUT/nif_batch_journal.jsonl)")
+    parser.add_argument("--report",
+                        help="csv report of all files"
+                        " (default: OUTPUT/nif_batch_report.csv)")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="run jobs again that failed in an earlier run")
+    parser.add_argument("--import-option", action="append", default=[],
+                        type=parse_option, metavar="NAME=VALUE",
+                        help="property of the nif import operator")
+    parser.add_argument("--export-option", action="append", default=[],
+                        type=parse_option, metavar="NAME=VALUE",
+                        help="property of the nif export operator")
+    args = parser.parse_args()
+
+    args.output = os.path.abspath(args.output)
+    os.makedirs(args.output, exist_ok=True)
+    if not args.journal:
+        args.journal = os.path.join(args.output, "nif_batch_journal.jsonl")
+    if not args.report:
+        args.report = os.path.join(args.output, "nif_batch_report.csv")
+
+    inputs = find_inputs(args.inputs, args.manifest)
+    if not inputs:
+        parser.error("no input files")
+    jobs = make_jobs(inputs, args.mode, args.root, args.output)
+
+    # skip jobs that are done according to the journal
+    entries = read_journal(args.journal)
+    done_status = ("ok",) if args.retry_failed else ("ok", "failed")
+    todo = [job for job in jobs
+            if entries.get(job["input"], {}).get("status") not in done_status]
+    print("%i files, %i done before, %i to do"
+          % (len(jobs), len(jobs) - len(todo), len(todo)))
+
+    options = {"import_options": dict(args.import_option),
+               "export_options": dict(args.export_option)}
+    for result in run_jobs(todo, args, options):
+        entries[result["input"]] = result
+    entries = dict((job["input"], entries[job["input"]]) for job in jobs
+                   if job["input"] in entries)
+    write_report(args.report, entries)
+
+    failed = [entry for entry in entries.values()
+              if entry["status"] != "ok"]
+    print("%i ok, %i failed, report written to %s"
+          % (len(entries) - len(failed), len(failed), args.report))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
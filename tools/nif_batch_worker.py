@@ -0,0 +1,114 @@
+"""Worker for nif_batch.py, runs inside Blender.
+
+Assumes file is called as follows
+"blender --background --factory-startup --python nif_batch_worker.py -- OPTIONS"
+where OPTIONS is a json object with "import_options" and "export_options".
+
+Jobs are read from stdin, one json object per line, with "mode"
+("import", "export", or "convert"), "input", and "output". For every
+job, one result line is written to stdout, prefixed by RESULT_PREFIX."""
+
+# ***** BEGIN LICENSE BLOCK *****
+# 
+# Copyright © 2005-2015, NIF File Format Library and Tools contributors.
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+# 
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+# 
+#    * Neither the name of the NIF File Format Library and Tools
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+
+import json
+import os
+import sys
+import time
+import traceback
+
+import bpy
+
+from io_scene_nif.utility.scene_utils import clear_bpy_data
+
+#: Marks the lines of stdout that are meant for nif_batch.py.
+RESULT_PREFIX = "NIFBATCH "
+
+
+def send(result):
+    """Write a result line for nif_batch.py."""
+    sys.stdout.write(RESULT_PREFIX + json.dumps(result) + "\n")
+    sys.stdout.flush()
+
+
+def run_job(job, import_options, export_options):
+    """Import and/or export one file."""
+    if job["mode"] == "export":
+        bpy.ops.wm.open_mainfile(filepath=job["input"])
+    else:
+        clear_bpy_data()
+        bpy.ops.import_scene.nif(filepath=job["input"], **import_options)
+    output_dir = os.path.dirname(job["output"])
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    if job["mode"] == "import":
+        bpy.ops.wm.save_as_mainfile(filepath=job["output"])
+    else:
+        # the exporter exports the selected objects
+        for b_obj in bpy.context.scene.objects:
+            b_obj.select = True
+        bpy.ops.export_scene.nif(filepath=job["output"], **export_options)
+
+
+def main():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    options = json.loads(argv[0]) if argv else {}
+    import_options = options.get("import_options", {})
+    export_options = options.get("export_options", {})
+    bpy.ops.wm.addon_enable(module="io_scene_nif")
+    send({"ready": True})
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        job = json.loads(line)
+        result = {"input": job["input"], "output": job["output"]}
+        start = time.time()
+        try:
+            run_job(job, import_options, export_options)
+        except Exception as e:
+            # Blender raises errors reported by the operators
+            result["status"] = "failed"
+            result["error"] = "%s: %s" % (type(e).__name__, e)
+            result["traceback"] = traceback.format_exc()
+        else:
+            result["status"] = "ok"
+        result["seconds"] = time.time() - start
+        send(result)
+
+
+main()